@@ -1,19 +1,49 @@
 import os
 import json
 from datetime import datetime
-import requests
-import boto3
 from dotenv import load_dotenv
 from logger import logger
+from resources import get_s3_client
+from metrics import span, count as count_metric
+from connectors import ApiSource, S3ParquetSink, S3NdjsonSink, transfer
 
 load_dotenv()
 
+DEFAULT_API_URL = 'https://pokeapi.co/api/v2/pokemon?limit=151'
+OUTPUT_FORMATS = ('json', 'ndjson', 'parquet')
 
-def fetch_and_upload_pokemon_data():
+# Records per Parquet row group
+ROW_GROUP_SIZE = 10_000
+
+
+def fetch_and_upload_pokemon_data(api_url=DEFAULT_API_URL, mode='list', max_records=151,
+                                  concurrency=10, rate_per_second=20, cache_dir=None,
+                                  output_format='json'):
     """
     Fetch Pokémon data from PokéAPI and upload to S3
     Simple function that performs the work - orchestration happens in main.py
+
+    Args:
+        api_url: List endpoint to start from (default: first 151 Pokémon)
+        mode: 'list' uploads the single list response (default)
+              'detail' follows `next` pagination and fetches every record's
+              detail URL concurrently with asyncio
+        max_records: Stop listing after this many records in 'detail' mode
+                     (default: 151, None for everything)
+        concurrency: Detail requests in flight at once in 'detail' mode (default: 10)
+        rate_per_second: Token-bucket request rate in 'detail' mode (default: 20)
+        cache_dir: Directory of the ETag/If-None-Match cache in 'detail' mode
+                   (default: API_CACHE_DIR or ~/.cache/de_review2/http)
+        output_format: 'json' uploads the response as one pretty-printed document (default)
+                       'ndjson' and 'parquet' (zstd) flatten the records to one row
+                       each and stream them to S3 with a multipart upload under
+                       a Hive-style pokemon/dt=YYYY-MM-DD/ partition
     """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format '{output_format}', expected one of {', '.join(OUTPUT_FORMATS)}")
+    source = ApiSource(api_url, mode=mode, max_records=max_records, concurrency=concurrency,
+                       rate_per_second=rate_per_second, cache_dir=cache_dir)
+
     # Get S3 configuration
     bucket_name = os.getenv('S3_BUCKET_NAME')
     folder_prefix = os.getenv('S3_FOLDER_PREFIX', 'Raines')
@@ -22,28 +52,41 @@ def fetch_and_upload_pokemon_data():
         raise ValueError("S3_BUCKET_NAME environment variable not set")
 
     # Fetch data from API
-    api_url = 'https://pokeapi.co/api/v2/pokemon?limit=151'
-    logger.info(f"Fetching from {api_url}")
+    data = source.fetch()
 
-    response = requests.get(api_url, timeout=30)
-    response.raise_for_status()
-    data = response.json()
+    # Initialize S3 client and create key
+    s3_client = get_s3_client()
+    now = datetime.now()
+    timestamp = now.strftime('%Y%m%d_%H%M%S')
+    suffix = '_details' if mode == 'detail' else ''
 
-    logger.info(f"Fetched {len(data.get('results', []))} Pokémon records")
+    if output_format == 'json':
+        s3_key = f"{folder_prefix}/{timestamp}_pokemon{suffix}.json"
 
-    # Initialize S3 client and create key
-    s3_client = boto3.client('s3')
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    s3_key = f"{folder_prefix}/{timestamp}_pokemon.json"
+        # Upload to S3
+        logger.info(f"Uploading to s3://{bucket_name}/{s3_key}")
 
-    # Upload to S3
-    logger.info(f"Uploading to s3://{bucket_name}/{s3_key}")
+        with span('write', format=output_format):
+            body = json.dumps(data, indent=2)
+            s3_client.put_object(
+                Bucket=bucket_name,
+                Key=s3_key,
+                Body=body,
+                ContentType='application/json'
+            )
+        count_metric('bytes_uploaded', len(body.encode()))
+    else:
+        partition = f"{folder_prefix}/pokemon{suffix}/dt={now.strftime('%Y-%m-%d')}"
+        s3_key = f"{partition}/{timestamp}_pokemon{suffix}.{output_format}"
 
-    s3_client.put_object(
-        Bucket=bucket_name,
-        Key=s3_key,
-        Body=json.dumps(data, indent=2),
-        ContentType='application/json'
-    )
+        # The flattened records reach S3 as Arrow batches, one row each
+        logger.info(f"Streaming {output_format} to s3://{bucket_name}/{s3_key}")
+        if output_format == 'ndjson':
+            sink = S3NdjsonSink(s3_client, bucket_name, s3_key)
+        else:
+            sink = S3ParquetSink(s3_client, bucket_name, s3_key, row_group_rows=ROW_GROUP_SIZE)
+        transfer(source, sink)
+    count_metric('rows_written', len(data.get('results', [])))
 
     logger.info(f"Uploaded {len(data.get('results', []))} records")
+    return s3_key
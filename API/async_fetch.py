@@ -0,0 +1,144 @@
+import os
+import json
+import time
+import random
+import asyncio
+import hashlib
+import aiohttp
+from logger import logger
+from metrics import count as count_metric
+
+# Status codes worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Async token bucket: allows `rate` requests per second with bursts of `capacity`"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate))
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class EtagCache:
+    """On-disk cache of response bodies keyed by URL, revalidated with If-None-Match"""
+
+    def __init__(self, directory):
+        self.directory = os.path.expanduser(directory)
+        os.makedirs(self.directory, exist_ok=True)
+        self.hits = 0
+
+    def _path(self, url):
+        return os.path.join(self.directory, hashlib.sha256(url.encode()).hexdigest() + '.json')
+
+    def get(self, url):
+        """Return (etag, body) for a cached URL, or (None, None)"""
+        try:
+            with open(self._path(url)) as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None, None
+        return entry['etag'], entry['body']
+
+    def put(self, url, etag, body):
+        path = self._path(url)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'url': url, 'etag': etag, 'body': body}, f)
+        os.replace(tmp_path, path)
+
+
+async def fetch_json(session, url, limiter, semaphore, cache=None, retries=4, backoff=0.5):
+    """GET a JSON document with rate limiting, conditional requests and retries
+
+    A 304 answer is served from the ETag cache. Connection errors and
+    429/5xx answers are retried with exponential backoff and jitter,
+    honouring Retry-After when the server sends it.
+    """
+    etag, cached_body = cache.get(url) if cache else (None, None)
+    headers = {'If-None-Match': etag} if etag else {}
+
+    for attempt in range(retries + 1):
+        await limiter.acquire()
+        try:
+            async with semaphore:
+                async with session.get(url, headers=headers) as response:
+                    if response.status == 304 and cached_body is not None:
+                        cache.hits += 1
+                        return cached_body
+                    if response.status not in RETRY_STATUSES:
+                        response.raise_for_status()
+                        body = await response.json(content_type=None)
+                        if cache and response.headers.get('ETag'):
+                            cache.put(url, response.headers['ETag'], body)
+                        return body
+                    retry_after = response.headers.get('Retry-After')
+                    error = aiohttp.ClientResponseError(
+                        response.request_info, response.history,
+                        status=response.status, message=response.reason)
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            retry_after, error = None, e
+
+        if attempt == retries:
+            raise error
+        delay = float(retry_after) if retry_after and retry_after.isdigit() else backoff * 2 ** attempt
+        delay += random.uniform(0, backoff)
+        count_metric('retries')
+        logger.warning(f"Retrying {url} in {delay:.1f}s after {error} (attempt {attempt + 1}/{retries})")
+        await asyncio.sleep(delay)
+
+
+async def fetch_paginated_details(list_url, max_records=None, concurrency=10, rate_per_second=20,
+                                  cache_dir=None, retries=4, timeout=30):
+    """Follow `next` links of a list endpoint and fetch every item's detail `url`
+
+    Detail requests start as soon as their list page arrives, with at most
+    `concurrency` requests in flight and `rate_per_second` new requests per
+    second across the whole crawl.
+
+    Returns:
+        Tuple of (count reported by the API, detail records in list order)
+    """
+    limiter = TokenBucket(rate_per_second)
+    semaphore = asyncio.Semaphore(concurrency)
+    cache = EtagCache(cache_dir) if cache_dir else None
+
+    async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        detail_tasks = []
+        count = None
+        next_url = list_url
+        while next_url and (max_records is None or len(detail_tasks) < max_records):
+            page = await fetch_json(session, next_url, limiter, semaphore, cache, retries)
+            count = page.get('count', count)
+            for item in page.get('results', []):
+                if max_records is not None and len(detail_tasks) >= max_records:
+                    break
+                detail_tasks.append(asyncio.ensure_future(
+                    fetch_json(session, item['url'], limiter, semaphore, cache, retries)))
+            next_url = page.get('next')
+            logger.info(f"Listed {len(detail_tasks)} record(s), fetching details")
+
+        details = await asyncio.gather(*detail_tasks)
+
+    if cache:
+        logger.info(f"{cache.hits} request(s) answered 304 Not Modified from the ETag cache")
+    return count, list(details)
+
+
+def fetch_details(list_url, **kwargs):
+    """Blocking wrapper around fetch_paginated_details for synchronous callers"""
+    return asyncio.run(fetch_paginated_details(list_url, **kwargs))
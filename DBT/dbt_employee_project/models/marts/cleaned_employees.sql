@@ -1,8 +1,23 @@
+{{
+    config(
+        materialized='incremental',
+        unique_key='id',
+        incremental_strategy='delete+insert'
+    )
+}}
+
 -- Cleaned employees model
 -- Removes nulls, drops duplicates, and trims whitespace
+-- Incremental: a run only reads rows hired on or after the latest hire_date
+-- already in the table and replaces those ids. Edits to older rows are
+-- picked up by `dbt run --full-refresh`
 
 WITH source AS (
     SELECT * FROM {{ ref('stg_employees') }}
+    {% if is_incremental() %}
+    -- >= so rows that arrive late for the latest day are not missed
+    WHERE CAST(hire_date AS DATE) >= COALESCE((SELECT MAX(hire_date) FROM {{ this }}), DATE '1900-01-01')
+    {% endif %}
 ),
 
 cleaned AS (
@@ -21,9 +36,16 @@ cleaned AS (
         AND hire_date IS NOT NULL
 ),
 
+-- One row per id, so the delete+insert on id never inserts a key twice
 deduplicated AS (
-    SELECT DISTINCT *
-    FROM cleaned
+    SELECT * EXCLUDE (row_num)
+    FROM (
+        SELECT
+            *,
+            ROW_NUMBER() OVER (PARTITION BY id ORDER BY hire_date DESC, name, department, salary) AS row_num
+        FROM cleaned
+    )
+    WHERE row_num = 1
 )
 
 SELECT * FROM deduplicated
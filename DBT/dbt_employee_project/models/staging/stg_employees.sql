@@ -1,5 +1,8 @@
 -- Staging model: reads raw data from local CSV file
 -- This acts as our external table using DuckDB's read_csv_auto()
+-- With --vars '{employees_lake_path: "s3://bucket/lake/employees"}' it reads
+-- the Parquet export of rustfs/export_to_lake.py instead; filters on
+-- department then only open that department's files
 
 SELECT
     id,
@@ -7,4 +10,8 @@ SELECT
     department,
     salary,
     hire_date
+{% if var('employees_lake_path', none) %}
+FROM read_parquet('{{ var("employees_lake_path") }}/*/*.parquet', hive_partitioning = true)
+{% else %}
 FROM read_csv_auto('/workspaces/app/sample_data.csv')
+{% endif %}
@@ -0,0 +1,5 @@
+-- NPPES dates arrive as MM/DD/YYYY text from the CSV loader, or as DATE
+-- when the column was typed on load; returns a DATE either way
+{% macro nppes_date(column) %}
+    coalesce(try_to_date(to_varchar({{ column }}), 'MM/DD/YYYY'), try_to_date(to_varchar({{ column }})))
+{% endmacro %}
@@ -1,14 +1,24 @@
 {{
     config(
-        materialized='table'
+        materialized='incremental',
+        unique_key='provider_npi',
+        incremental_strategy='merge'
     )
 }}
 
 -- Analytics-ready dimension table for providers
 -- This is the final layer for BI tools and analytics
+-- Incremental: a run merges only providers updated on or after the latest
+-- last_update_date already in the table. `dbt run --full-refresh` rebuilds it
 
 with staged_providers as (
     select * from {{ ref('stg_nppes_providers') }}
+    {% if is_incremental() %}
+    where {{ nppes_date('last_update_date') }} >= coalesce(
+        (select max({{ nppes_date('last_update_date') }}) from {{ this }}),
+        '1900-01-01'::date
+    )
+    {% endif %}
 ),
 
 final as (
@@ -51,6 +61,12 @@ final as (
 
     -- Filter out incomplete records
     where provider_npi is not null
+
+    -- MERGE needs one source row per key; keep the latest update
+    qualify row_number() over (
+        partition by provider_npi
+        order by {{ nppes_date('last_update_date') }} desc nulls last
+    ) = 1
 )
 
 select * from final
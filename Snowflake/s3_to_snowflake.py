@@ -1,15 +1,21 @@
 import os
-import io
-import boto3
 from dotenv import load_dotenv
-import polars as pl
-import snowflake.connector
-from logger import logger
+from resources import get_s3_client, get_snowflake_connection
+from compaction import compact_frame
+from data_quality import check_frame
+from s3_stream import DEFAULT_CHUNK_BYTES
+from metrics import span
+from connectors import FrameSource, S3CsvSource, SnowflakeSink, transfer
+from connectors.sinks import SNOWFLAKE_METHODS, SNOWFLAKE_CHUNK_ROWS, SNOWFLAKE_PARALLEL
 
 load_dotenv()
 
 
-def load_s3_to_snowflake(filename, table_name, drop_if_exists=True):
+def load_s3_to_snowflake(filename, table_name, drop_if_exists=True, method='insert',
+                         chunk_rows=SNOWFLAKE_CHUNK_ROWS, parallel=SNOWFLAKE_PARALLEL,
+                         compression='zstd', conn=None, use_registry=True, on_drift='raise',
+                         compact=False, stream=False, chunk_bytes=DEFAULT_CHUNK_BYTES,
+                         quality_model=None, on_quality='fail'):
     """Retrieve CSV from S3, load into memory with Polars, and write to Snowflake
 
     Args:
@@ -19,7 +25,55 @@ def load_s3_to_snowflake(filename, table_name, drop_if_exists=True):
                     Will be created if it doesn't exist
         drop_if_exists: Whether to drop the table if it already exists (default: True)
                         Set to False if you want to append to an existing table
+        method: How rows reach Snowflake (default: 'insert')
+                'insert' binds rows through cursor.executemany
+                'stage' writes compressed Parquet chunks, PUTs them to the table
+                stage in parallel and loads them with a single COPY INTO
+        chunk_rows: Rows per Parquet chunk ('stage') or executemany call ('insert')
+                    (default: 500,000)
+        parallel: Number of chunks uploaded concurrently when method='stage' (default: 4)
+        compression: Parquet compression codec for staged chunks (default: 'zstd')
+        conn: Snowflake connection to use instead of the shared process-wide
+              connection (e.g. a stand-in that records the PUT/COPY calls).
+              It is left open when the load finishes.
+        use_registry: Parse with the types registered for this file's header in
+                      the schema registry instead of scanning the whole file to
+                      infer them (default: True)
+        on_drift: What to do when the header differs from the registered one
+                  (default: 'raise'). 'evolve' registers the new header and,
+                  when appending, adds the new columns to the table.
+        compact: Narrow the frame's dtypes before loading and create the table
+                 with the column types this finds, e.g. INTEGER, VARCHAR or
+                 DECIMAL(38,2) (default: False). The column types are only
+                 used when drop_if_exists creates a fresh table.
+        stream: Read the object in chunks and load each parsed batch as it
+                arrives instead of materializing the whole file, so files
+                larger than memory can be loaded (default: False). Download,
+                parsing and loading run concurrently with bounded queues in
+                between. Cannot be combined with compact.
+        chunk_bytes: Bytes of CSV per batch when stream=True (default: 64 MiB)
+        quality_model: dbt model whose schema.yml tests the frame must pass
+                       before anything reaches Snowflake, e.g.
+                       'stg_nppes_providers' (default: None, no checks).
+                       Cannot be combined with stream.
+        on_quality: What happens to rows failing those tests (default: 'fail')
+                    'fail' raises DataQualityError and loads nothing
+                    'quarantine' writes them to DATA_QUALITY_QUARANTINE_DIR
+                    and loads the rest
+                    'warn' logs them and loads every row
+
+    Returns:
+        For method='stage', a list with one dict per chunk holding the COPY INTO
+        result (file, status, rows_parsed, rows_loaded, errors_seen, first_error).
+        None for method='insert'. A chunk that did not load completely raises
+        ValueError before the load is committed.
     """
+    if method not in SNOWFLAKE_METHODS:
+        raise ValueError(f"Unknown load method '{method}', expected 'insert' or 'stage'")
+    if stream and compact:
+        raise ValueError("compact=True needs the whole frame and cannot be combined with stream=True")
+    if stream and quality_model:
+        raise ValueError("quality_model needs the whole frame and cannot be combined with stream=True")
 
     # Get S3 configuration from environment variables
     aws_profile = os.getenv('AWS_PROFILE')
@@ -29,101 +83,44 @@ def load_s3_to_snowflake(filename, table_name, drop_if_exists=True):
     # Build S3 key using the provided filename parameter
     s3_key = f"{s3_prefix}/{filename}" if s3_prefix else filename
 
-    # Download from S3 to memory
-    session = boto3.Session(profile_name=aws_profile)
-    s3_client = session.client('s3')
-
-    logger.info(f"Downloading s3://{s3_bucket}/{s3_key} to memory")
-
-    csv_buffer = io.BytesIO()
-    s3_client.download_fileobj(s3_bucket, s3_key, csv_buffer)
-    csv_buffer.seek(0)
-
-    logger.info(f"Downloaded {csv_buffer.getbuffer().nbytes:,} bytes")
-
-    # Read CSV with Polars
-    df = pl.read_csv(csv_buffer, infer_schema_length=None)
-    logger.info(f"Loaded {len(df):,} rows x {len(df.columns)} columns")
-
-    # Connect to Snowflake
-    conn = snowflake.connector.connect(
-        user=os.getenv('SNOWFLAKE_USER'),
-        password=os.getenv('SNOWFLAKE_PASSWORD'),
-        account=os.getenv('SNOWFLAKE_ACCOUNT'),
-        warehouse=os.getenv('SNOWFLAKE_WAREHOUSE'),
-        database=os.getenv('SNOWFLAKE_DATABASE'),
-        schema=os.getenv('SNOWFLAKE_SCHEMA'),
-        role=os.getenv('SNOWFLAKE_ROLE')
-    )
-    cursor = conn.cursor()
-
-    logger.info("Connected to Snowflake")
-
-    # Clean column names for Snowflake
-    df = df.rename({
-        col: col.replace(' ', '_').replace(
-            '(', '').replace(')', '').replace('.', '_')
-        for col in df.columns
-    })
-
-    # Map Polars types to Snowflake types
-    type_map = {
-        'Int64': 'INTEGER',
-        'Float64': 'FLOAT',
-        'Boolean': 'BOOLEAN',
-        'Utf8': 'VARCHAR',
-        'String': 'VARCHAR',
-        'Date': 'DATE',
-        'Datetime': 'TIMESTAMP'
-    }
-
-    # Generate CREATE TABLE statement
-    columns = []
-    for col_name, col_type in df.schema.items():
-        col_type_str = str(col_type)
-        sf_type = 'VARCHAR'
-        for pl_type, sf in type_map.items():
-            if pl_type in col_type_str:
-                sf_type = sf
-                break
-        columns.append(f'"{col_name}" {sf_type}')
-
-    # Use the table_name parameter passed to the function
-    # If drop_if_exists is True, drop the table before creating it
-    if drop_if_exists:
-        cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
-        logger.info(f"Dropped table '{table_name}' if it existed")
-
-    # Create table with the provided table_name
-    create_sql = f"CREATE TABLE {table_name} ({', '.join(columns)})"
-    cursor.execute(create_sql)
-    logger.info(f"Created table '{table_name}'")
-
-    # Insert data
-    placeholders = ', '.join(['%s'] * len(df.columns))
-    insert_sql = f"INSERT INTO {table_name} VALUES ({placeholders})"
-
-    data = df.rows()
-    cursor.executemany(insert_sql, data)
-    conn.commit()
-
-    logger.info(f"Inserted {len(df):,} rows")
-
-    # Verify
-    cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
-    count = cursor.fetchone()[0]
-    logger.info(f"Verified {count:,} rows in '{table_name}'")
-
-    cursor.close()
-    conn.close()
-    logger.info("Connection closed")
+    # Reuse the shared Snowflake connection unless the caller handed us one
+    if conn is None:
+        conn = get_snowflake_connection()
+
+    # Polars reads the object, reusing the cached download and parsed frame
+    # when its ETag has not changed; stream=True overlaps download, parsing
+    # and loading with only a few batches in memory
+    source = S3CsvSource(get_s3_client(aws_profile), s3_bucket, s3_key,
+                         dataset=os.path.splitext(filename)[0] if use_registry else None,
+                         on_drift=on_drift, stream=stream, chunk_bytes=chunk_bytes)
+
+    type_hints = None
+    if not stream:
+        df = source.frame()
+        if quality_model:
+            df, _ = check_frame(df, quality_model, on_quality)
+        if compact:
+            with span('compact'):
+                df, type_hints = compact_frame(df)
+        source = FrameSource(df)
+
+    return transfer(source, SnowflakeSink(conn, table_name, drop_if_exists, method, chunk_rows, parallel,
+                                          compression, type_hints,
+                                          evolve=use_registry and on_drift == 'evolve'))
 
 
 if __name__ == "__main__":
     # Example 1: Load a single file
     load_s3_to_snowflake('nppes_sample.csv', 'NPPES_SAMPLE')
 
-    # Example 2: Load multiple files in a loop
+    # Example 2: Bulk load through the table stage with tuned chunking
+    # load_s3_to_snowflake('nppes_sample.csv', 'NPPES_SAMPLE', method='stage',
+    #                      chunk_rows=250_000, parallel=8)
+
+    # Example 3: Stream a file larger than memory through the table stage
+    # load_s3_to_snowflake('nppes_full.csv', 'NPPES', method='stage', stream=True)
+
+    # Example 4: Load multiple files in a loop
     # Uncomment the code below to load multiple files
     # files_to_load = [
     #     ('file1.csv', 'TABLE1'),
@@ -0,0 +1,342 @@
+import os
+import sys
+import json
+import math
+import socket
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+import polars as pl
+import duckdb
+from dotenv import load_dotenv
+from logger import logger
+from benchmarks.datasets import SCALES, DATASETS, dataset_path
+from benchmarks.cases import CASES
+
+load_dotenv()
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARK_DIR = os.path.join(REPO_DIR, 'benchmarks')
+DEFAULT_SCALES = '1k,10k,100k'
+# A case is reported as regressed when its median latency or peak RSS grows by more than this
+DEFAULT_THRESHOLD = 0.15
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks',
+        description="Benchmark the loaders on synthetic datasets at several scale factors")
+    parser.add_argument('--scales', default=DEFAULT_SCALES,
+                        help=f"Comma separated scale factors from {', '.join(SCALES)} (default: {DEFAULT_SCALES})")
+    parser.add_argument('--datasets', default=','.join(DATASETS),
+                        help=f"Comma separated datasets (default: {','.join(DATASETS)})")
+    parser.add_argument('--cases', default=','.join(CASES),
+                        help=f"Comma separated cases (default: all of {','.join(CASES)})")
+    parser.add_argument('--iterations', type=int, default=5, help="Timed iterations per case (default: 5)")
+    parser.add_argument('--warmup', type=int, default=1, help="Untimed iterations per case (default: 1)")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the synthetic data (default: 0)")
+    parser.add_argument('--timeout', type=float, default=3600, help="Seconds allowed per iteration (default: 3600)")
+    parser.add_argument('--moto', action='store_true',
+                        help="Run against an in-process moto S3 server instead of the configured endpoints")
+    parser.add_argument('--data-dir', default=os.path.join(BENCHMARK_DIR, 'data'),
+                        help="Where generated CSVs are kept between runs")
+    parser.add_argument('--history', default=os.path.join(BENCHMARK_DIR, 'results', 'history.jsonl'),
+                        help="JSON lines file every run is appended to")
+    parser.add_argument('--baseline', default=os.path.join(BENCHMARK_DIR, 'baseline.json'),
+                        help="Baseline results to compare against")
+    parser.add_argument('--save-baseline', action='store_true', help="Make this run the new baseline")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f"Allowed relative slowdown before a case counts as regressed (default: {DEFAULT_THRESHOLD})")
+    parser.add_argument('--fail-on-regression', action='store_true',
+                        help="Exit with status 1 when any case regressed against the baseline")
+    args = parser.parse_args(argv)
+
+    args.scales = _split(args.scales)
+    args.datasets = _split(args.datasets)
+    args.cases = _split(args.cases)
+    for values, known, kind in ((args.scales, SCALES, 'scale'), (args.datasets, DATASETS, 'dataset'),
+                                (args.cases, CASES, 'case')):
+        unknown = [value for value in values if value not in known]
+        if unknown:
+            parser.error(f"Unknown {kind}(s): {', '.join(unknown)}; expected {', '.join(known)}")
+    return args
+
+
+def main(argv=None):
+    """Run every selected case, record the results and compare them with the baseline
+
+    Each iteration runs in its own interpreter with an empty S3 cache and
+    schema registry, so iterations are independent cold loads and peak RSS
+    is that of a single load.
+    """
+    args = parse_args(argv)
+
+    moto_server = _start_moto() if args.moto else None
+    try:
+        results = run_benchmarks(args)
+    finally:
+        if moto_server is not None:
+            moto_server.stop()
+
+    for line in format_results(results):
+        print(line)
+
+    run = {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'polars': pl.__version__,
+        'duckdb': duckdb.__version__,
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'iterations': args.iterations,
+        's3': 'moto' if args.moto else os.getenv('AWS_ENDPOINT_URL') or 'aws',
+        'results': results,
+    }
+    os.makedirs(os.path.dirname(args.history), exist_ok=True)
+    with open(args.history, 'a') as f:
+        f.write(json.dumps(run) + '\n')
+    logger.info(f"Appended results to {args.history}")
+
+    regressions = []
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        lines, regressions = compare(baseline, results, args.threshold)
+        print(f"\nCompared with baseline from {baseline.get('timestamp')} ({baseline.get('commit')}):")
+        for line in lines:
+            print(line)
+    else:
+        logger.info(f"No baseline at {args.baseline}; run with --save-baseline to create one")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(run, f, indent=2)
+        logger.info(f"Saved baseline to {args.baseline}")
+
+    failed = [r for r in results if r.get('error')]
+    if failed:
+        sys.exit(1)
+    if regressions and args.fail_on_regression:
+        logger.error(f"{len(regressions)} case(s) regressed by more than {args.threshold:.0%}")
+        sys.exit(1)
+
+
+def run_benchmarks(args):
+    """Generate and stage the datasets, then time each case at each scale"""
+    from resources import get_s3_client, get_rustfs_client
+    from rustfs.upload_to_rustfs import ensure_bucket
+
+    s3_bucket, rustfs_bucket = os.getenv('S3_BUCKET_NAME'), os.getenv('RUSTFS_BUCKET')
+    s3_prefix = os.getenv('S3_FOLDER_PREFIX', '')
+    # Cases with fixed input (startup, setup_duckdb) run without any S3 endpoint
+    if any(CASES[name].datasets for name in args.cases):
+        s3 = get_s3_client(os.getenv('AWS_PROFILE'))
+        rustfs = get_rustfs_client()
+        ensure_bucket(s3, s3_bucket)
+        ensure_bucket(rustfs, rustfs_bucket)
+
+    results = []
+    run_dir = tempfile.mkdtemp(prefix='de_review2_bench_')
+    try:
+        for case_name in args.cases:
+            case = CASES[case_name]
+            if not case.datasets:
+                results.append(run_case(args, case, None, 0, None, run_dir))
+                continue
+            for dataset in args.datasets:
+                if dataset not in case.datasets:
+                    continue
+                for scale in args.scales:
+                    rows = SCALES[scale]
+                    if case.max_rows and rows > case.max_rows:
+                        logger.info(f"Skipping {case.name} on {dataset} at {scale}: "
+                                    f"above its limit of {case.max_rows:,} rows")
+                        continue
+                    path = dataset_path(args.data_dir, dataset, rows, args.seed)
+                    filename = os.path.basename(path)
+                    _stage(rustfs, rustfs_bucket, filename, path)
+                    _stage(s3, s3_bucket, f"{s3_prefix}/{filename}" if s3_prefix else filename, path)
+                    results.append(run_case(args, case, dataset, rows, path, run_dir))
+    finally:
+        shutil.rmtree(run_dir, ignore_errors=True)
+    return results
+
+
+def run_case(args, case, dataset, rows, path, run_dir):
+    """Run the warmup and timed iterations of one case and summarize them"""
+    label = f"{case.name} [{dataset or '-'}, {rows:,} rows]"
+    size = os.path.getsize(path) if path else 0
+    timings, peaks = [], []
+    for iteration in range(args.warmup + args.iterations):
+        workdir = tempfile.mkdtemp(dir=run_dir)
+        spec = {
+            'case': case.name,
+            'dataset': dataset,
+            'rows': rows,
+            'path': path,
+            'filename': os.path.basename(path) if path else None,
+            'table': f"bench_{dataset}" if dataset else None,
+            'workdir': workdir,
+            'env': {
+                'S3_CACHE_DIR': os.path.join(workdir, 's3_cache'),
+                'SCHEMA_REGISTRY_DIR': os.path.join(workdir, 'schemas'),
+            },
+        }
+        try:
+            outcome = _run_worker(spec, args.timeout)
+        except RuntimeError as e:
+            logger.error(f"{label} failed: {e}")
+            return {'case': case.name, 'dataset': dataset, 'rows': rows, 'error': str(e)}
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        if iteration >= args.warmup:
+            timings.append(outcome['seconds'])
+            peaks.append(outcome['peak_rss_bytes'])
+
+    p50 = percentile(timings, 50)
+    result = {
+        'case': case.name,
+        'dataset': dataset,
+        'rows': rows,
+        'bytes': size,
+        'iterations': len(timings),
+        'p50_seconds': p50,
+        'p95_seconds': percentile(timings, 95),
+        'max_seconds': max(timings),
+        'rows_per_second': rows / p50 if p50 and rows else None,
+        'mb_per_second': size / 1e6 / p50 if p50 and size else None,
+        'peak_rss_mb': max(peaks) / 1e6,
+    }
+    logger.info(f"{label}: p50 {p50:.3f}s, peak RSS {result['peak_rss_mb']:,.0f} MB")
+    return result
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile, so every reported latency was actually observed"""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def format_results(results):
+    header = (f"{'case':<24} {'dataset':<10} {'rows':>12} {'p50 s':>9} {'p95 s':>9} {'max s':>9} "
+              f"{'rows/s':>12} {'MB/s':>8} {'RSS MB':>8}")
+    lines = [header, '-' * len(header)]
+    for r in results:
+        if r.get('error'):
+            lines.append(f"{r['case']:<24} {r['dataset'] or '-':<10} {r['rows']:>12,} FAILED: {r['error']}")
+            continue
+        lines.append(
+            f"{r['case']:<24} {r['dataset'] or '-':<10} {r['rows']:>12,} {r['p50_seconds']:>9.3f} "
+            f"{r['p95_seconds']:>9.3f} {r['max_seconds']:>9.3f} "
+            f"{_format_rate(r['rows_per_second'], ',.0f'):>12} {_format_rate(r['mb_per_second'], '.1f'):>8} "
+            f"{r['peak_rss_mb']:>8,.0f}")
+    return lines
+
+
+def compare(baseline, results, threshold):
+    """Compare median latency and peak RSS with the baseline run
+
+    Returns:
+        Tuple of (report lines, list of regressed result keys)
+    """
+    previous = {_result_key(r): r for r in baseline.get('results', []) if not r.get('error')}
+    lines, regressions = [], []
+    for r in results:
+        key = _result_key(r)
+        base = previous.get(key)
+        if r.get('error') or base is None:
+            continue
+        latency = r['p50_seconds'] / base['p50_seconds'] - 1 if base['p50_seconds'] else 0.0
+        memory = r['peak_rss_mb'] / base['peak_rss_mb'] - 1 if base['peak_rss_mb'] else 0.0
+        regressed = latency > threshold or memory > threshold
+        if regressed:
+            regressions.append(key)
+        lines.append(f"{'REGRESSED' if regressed else 'ok':<10} {key:<48} "
+                     f"p50 {base['p50_seconds']:.3f}s -> {r['p50_seconds']:.3f}s ({latency:+.1%}), "
+                     f"RSS {base['peak_rss_mb']:,.0f} -> {r['peak_rss_mb']:,.0f} MB ({memory:+.1%})")
+    return lines, regressions
+
+
+def _result_key(result):
+    return f"{result['case']}/{result['dataset'] or '-'}/{result['rows']}"
+
+
+def _format_rate(value, spec):
+    return '-' if value is None else format(value, spec)
+
+
+def _split(value):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def _run_worker(spec, timeout):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [REPO_DIR, env.get('PYTHONPATH')]))
+    try:
+        completed = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.worker', json.dumps(spec)],
+            cwd=spec['workdir'], env=env, capture_output=True, text=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        raise RuntimeError(f"timed out after {timeout:.0f}s")
+    if completed.returncode != 0:
+        tail = completed.stderr.strip().splitlines()[-1:] or [f"exit status {completed.returncode}"]
+        raise RuntimeError(tail[0])
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def _stage(s3, bucket, key, path):
+    """Upload a generated dataset unless the same file is already there"""
+    size = os.path.getsize(path)
+    try:
+        if s3.head_object(Bucket=bucket, Key=key)['ContentLength'] == size:
+            return
+    except s3.exceptions.ClientError:
+        pass
+    logger.info(f"Uploading {path} ({size / 1e6:,.1f} MB) to s3://{bucket}/{key}")
+    s3.upload_file(path, bucket, key)
+
+
+def _start_moto():
+    """Start an in-process moto S3 server and point both S3 clients at it"""
+    try:
+        from moto.server import ThreadedMotoServer
+    except ImportError:
+        raise SystemExit("--moto needs the moto package: pip install 'moto[server]'")
+
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    server = ThreadedMotoServer(ip_address='127.0.0.1', port=port, verbose=False)
+    server.start()
+
+    endpoint = f"http://127.0.0.1:{port}"
+    os.environ.update({
+        'AWS_ENDPOINT_URL': endpoint,
+        'RUSTFS_ENDPOINT': endpoint,
+        'AWS_ACCESS_KEY_ID': 'benchmark',
+        'AWS_SECRET_ACCESS_KEY': 'benchmark',
+        'AWS_DEFAULT_REGION': 'us-east-1',
+        'RUSTFS_ROOT_USER': 'benchmark',
+        'RUSTFS_ROOT_PASSWORD': 'benchmark',
+    })
+    os.environ.setdefault('S3_BUCKET_NAME', 'benchmarks')
+    os.environ.setdefault('RUSTFS_BUCKET', 'benchmarks-rustfs')
+    os.environ.pop('AWS_PROFILE', None)
+    logger.info(f"Started moto S3 server at {endpoint}")
+    return server
+
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+import os
+import sys
+import json
+import subprocess
+from dataclasses import dataclass
+
+# Loader modules read their configuration at import time, so they are
+# imported inside the case functions, after the worker has set up the
+# iteration's environment.
+
+ALL_DATASETS = ('employees', 'nppes')
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Dependencies that main.py must not import before a step that needs them runs
+STARTUP_FORBIDDEN = ('polars', 'duckdb', 'boto3', 'psycopg2', 'pyarrow', 'aiohttp', 'requests', 'snowflake')
+
+
+@dataclass
+class Case:
+    """One benchmarked loader call
+
+    Args:
+        name: Case name used for --cases and in the results
+        run: Timed callable taking the iteration spec
+        setup: Untimed callable run before it in the same process, or None
+        datasets: Datasets the case can load; () for cases with fixed input
+        max_rows: Largest scale the case is run at (row-by-row paths get slow)
+        description: Human readable title for the report
+    """
+    name: str
+    run: object
+    setup: object = None
+    datasets: tuple = ALL_DATASETS
+    max_rows: int = None
+    description: str = ''
+
+
+def upload_rustfs(spec):
+    from rustfs.upload_to_rustfs import upload_data
+    upload_data(spec['path'], f"upload_{spec['filename']}", list_after=False)
+
+
+def upload_rustfs_zstd(spec):
+    from rustfs.upload_to_rustfs import upload_data
+    upload_data(spec['path'], f"upload_{spec['filename']}", list_after=False, codec='zstd')
+
+
+def drop_postgres_table(spec):
+    from resources import postgres_connection
+    with postgres_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"DROP TABLE IF EXISTS {spec['table']}")
+        conn.commit()
+
+
+def load_postgres(spec):
+    from rustfs.load_to_postgres import load_data
+    load_data(spec['filename'], spec['table'],
+              local_file_path=os.path.join(spec['workdir'], spec['filename']))
+
+
+def load_postgres_bulk(spec):
+    from rustfs.load_to_postgres import load_data
+    load_data(spec['filename'], spec['table'], bulk=True)
+
+
+def s3_to_duckdb(spec):
+    from s3_duckdb.s3_to_duckdb import load_s3_to_duckdb
+    load_s3_to_duckdb(spec['filename'], spec['table'], db_path=os.path.join(spec['workdir'], 'bench.duckdb'),
+                      mode='replace')
+
+
+def s3_to_duckdb_stream(spec):
+    from s3_duckdb.s3_to_duckdb import load_s3_to_duckdb
+    load_s3_to_duckdb(spec['filename'], spec['table'], db_path=os.path.join(spec['workdir'], 'bench.duckdb'),
+                      mode='replace', stream=True)
+
+
+def s3_to_snowflake(spec, method='stage'):
+    from Snowflake.s3_to_snowflake import load_s3_to_snowflake
+    from benchmarks.stub_snowflake import StubConnection
+    conn = StubConnection()
+    load_s3_to_snowflake(spec['filename'], spec['table'].upper(), method=method, conn=conn)
+    if conn.rows != spec['rows']:
+        raise RuntimeError(f"Stub connection received {conn.rows:,} rows, expected {spec['rows']:,}")
+
+
+def s3_to_snowflake_insert(spec):
+    s3_to_snowflake(spec, method='insert')
+
+
+def setup_duckdb(spec):
+    from duck_db.setup import setup_duckdb
+    os.makedirs(os.path.join(spec['workdir'], 'duck_db'), exist_ok=True)
+    setup_duckdb()
+
+
+def startup(spec):
+    """Cold start of `main.py --dry-run` in a new interpreter, as cron and containers see it"""
+    script = ("import sys, json, main; main.main(['--dry-run']); "
+              f"print(json.dumps([name for name in {STARTUP_FORBIDDEN!r} if name in sys.modules]))")
+    completed = subprocess.run([sys.executable, '-c', script], cwd=REPO_DIR, capture_output=True,
+                               text=True, check=True)
+    imported = json.loads(completed.stdout.strip().splitlines()[-1])
+    if imported:
+        raise RuntimeError(f"main.py --dry-run imported {', '.join(imported)}")
+
+
+CASES = {case.name: case for case in [
+    Case('upload_rustfs', upload_rustfs, description='upload_data to RustFS'),
+    Case('upload_rustfs_zstd', upload_rustfs_zstd, description="upload_data to RustFS, codec='zstd'"),
+    Case('load_postgres', load_postgres, setup=drop_postgres_table, datasets=('employees',),
+         description='load_data, Arrow batches through COPY'),
+    Case('load_postgres_bulk', load_postgres_bulk, setup=drop_postgres_table, datasets=('employees',),
+         description='load_data, bulk COPY'),
+    Case('s3_to_duckdb', s3_to_duckdb, description='load_s3_to_duckdb'),
+    Case('s3_to_duckdb_stream', s3_to_duckdb_stream, description='load_s3_to_duckdb, stream=True'),
+    Case('s3_to_snowflake', s3_to_snowflake, description="load_s3_to_snowflake, method='stage' (stub)"),
+    Case('s3_to_snowflake_insert', s3_to_snowflake_insert, max_rows=100_000,
+         description="load_s3_to_snowflake, method='insert' (stub)"),
+    Case('setup_duckdb', setup_duckdb, datasets=(), description='setup_duckdb'),
+    Case('startup', startup, datasets=(), description='main.py --dry-run cold start'),
+]}
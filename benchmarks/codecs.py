@@ -0,0 +1,130 @@
+import os
+import json
+import time
+import argparse
+from benchmarks.datasets import SCALES, DATASETS, dataset_path
+from benchmarks.__main__ import BENCHMARK_DIR, percentile, _split
+from object_codec import CODECS, compress_bytes, decompress_bytes
+
+DEFAULT_SCALES = '10k,100k'
+DEFAULT_LEVELS = 'gzip:1,6,9;zstd:1,3,9,19'
+# Link speeds the transfer estimate is reported for, in MB/s
+DEFAULT_BANDWIDTHS = '100,1000'
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m benchmarks.codecs',
+        description="Measure compression ratio against CPU time for the object codecs")
+    parser.add_argument('--scales', default=DEFAULT_SCALES,
+                        help=f"Comma separated scale factors from {', '.join(SCALES)} (default: {DEFAULT_SCALES})")
+    parser.add_argument('--datasets', default=','.join(DATASETS),
+                        help=f"Comma separated datasets (default: {','.join(DATASETS)})")
+    parser.add_argument('--levels', default=DEFAULT_LEVELS,
+                        help=f"Levels per codec as 'codec:level,level;codec:level' (default: {DEFAULT_LEVELS})")
+    parser.add_argument('--bandwidths', default=DEFAULT_BANDWIDTHS,
+                        help=f"Comma separated link speeds in MB/s to estimate transfer time for "
+                             f"(default: {DEFAULT_BANDWIDTHS})")
+    parser.add_argument('--iterations', type=int, default=3, help="Timed iterations per level (default: 3)")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the synthetic data (default: 0)")
+    parser.add_argument('--data-dir', default=os.path.join(BENCHMARK_DIR, 'data'),
+                        help="Where generated CSVs are kept between runs")
+    parser.add_argument('--json', action='store_true', help="Print the results as JSON instead of a table")
+    args = parser.parse_args(argv)
+
+    args.scales = _split(args.scales)
+    args.datasets = _split(args.datasets)
+    args.bandwidths = [float(value) for value in _split(args.bandwidths)]
+    levels = []
+    for group in filter(None, (part.strip() for part in args.levels.split(';'))):
+        codec, _, values = group.partition(':')
+        if codec not in CODECS:
+            parser.error(f"Unknown codec '{codec}'; expected {', '.join(CODECS)}")
+        levels += [(codec, int(value)) for value in _split(values)]
+    args.levels = levels
+    for values, known, kind in ((args.scales, SCALES, 'scale'), (args.datasets, DATASETS, 'dataset')):
+        unknown = [value for value in values if value not in known]
+        if unknown:
+            parser.error(f"Unknown {kind}(s): {', '.join(unknown)}; expected {', '.join(known)}")
+    return args
+
+
+def main(argv=None):
+    """Compress every selected dataset at every codec level and report the trade-off
+
+    For each level this prints the compression ratio, compress and
+    decompress throughput, and the estimated wall time of moving the file
+    (compress + transfer + decompress) at each bandwidth next to sending it
+    raw, which is what decides whether a level pays for its CPU.
+    """
+    args = parse_args(argv)
+    results = []
+    for dataset in args.datasets:
+        for scale in args.scales:
+            rows = SCALES[scale]
+            with open(dataset_path(args.data_dir, dataset, rows, args.seed), 'rb') as f:
+                data = f.read()
+            for codec, level in args.levels:
+                results.append(measure(data, dataset, rows, codec, level, args.iterations, args.bandwidths))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for line in format_results(results, args.bandwidths):
+            print(line)
+
+
+def measure(data, dataset, rows, codec, level, iterations, bandwidths):
+    """Time compress and decompress of data; returns one result row"""
+    compress_seconds, decompress_seconds = [], []
+    for _ in range(max(1, iterations)):
+        started = time.perf_counter()
+        compressed = compress_bytes(data, codec, level)
+        compress_seconds.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        restored = decompress_bytes(compressed, codec)
+        decompress_seconds.append(time.perf_counter() - started)
+    if restored != data:
+        raise RuntimeError(f"{codec} level {level} did not round-trip {dataset} at {rows:,} rows")
+
+    compress_p50 = percentile(compress_seconds, 50)
+    decompress_p50 = percentile(decompress_seconds, 50)
+    megabytes = len(data) / 1e6
+    return {
+        'dataset': dataset,
+        'rows': rows,
+        'codec': codec,
+        'level': level,
+        'raw_bytes': len(data),
+        'compressed_bytes': len(compressed),
+        'ratio': len(data) / max(len(compressed), 1),
+        'compress_seconds': compress_p50,
+        'decompress_seconds': decompress_p50,
+        'compress_mb_per_second': megabytes / max(compress_p50, 1e-9),
+        'decompress_mb_per_second': megabytes / max(decompress_p50, 1e-9),
+        # End-to-end seconds to move the object, and the same raw, per link speed
+        'transfer_seconds': {str(bandwidth): compress_p50 + len(compressed) / 1e6 / bandwidth + decompress_p50
+                             for bandwidth in bandwidths},
+        'raw_transfer_seconds': {str(bandwidth): megabytes / bandwidth for bandwidth in bandwidths},
+    }
+
+
+def format_results(results, bandwidths):
+    transfer_headers = ''.join(f" {f'@{bandwidth:g}MB/s':>13}" for bandwidth in bandwidths)
+    header = (f"{'dataset':<10} {'rows':>10} {'codec':<6} {'level':>5} {'raw MB':>9} {'comp MB':>9} "
+              f"{'ratio':>6} {'comp MB/s':>10} {'decomp MB/s':>12}{transfer_headers}")
+    lines = [header, '-' * len(header),
+             '(@ columns: compress + transfer + decompress seconds, raw transfer in parentheses)']
+    for r in results:
+        transfers = ''.join(
+            f" {r['transfer_seconds'][str(bandwidth)]:>5.2f} ({r['raw_transfer_seconds'][str(bandwidth)]:>5.2f})"
+            for bandwidth in bandwidths)
+        lines.append(
+            f"{r['dataset']:<10} {r['rows']:>10,} {r['codec']:<6} {r['level']:>5} {r['raw_bytes'] / 1e6:>9.1f} "
+            f"{r['compressed_bytes'] / 1e6:>9.2f} {r['ratio']:>6.1f} {r['compress_mb_per_second']:>10.0f} "
+            f"{r['decompress_mb_per_second']:>12.0f}{transfers}")
+    return lines
+
+
+if __name__ == '__main__':
+    main()
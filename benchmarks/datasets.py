@@ -0,0 +1,167 @@
+import os
+from datetime import date
+import polars as pl
+from logger import logger
+
+# Named scale factors accepted on the command line
+SCALES = {
+    '1k': 1_000,
+    '10k': 10_000,
+    '100k': 100_000,
+    '1m': 1_000_000,
+    '10m': 10_000_000,
+}
+
+FIRST_NAMES = ['Alice', 'Bob', 'Carol', 'David', 'Eve', 'Frank', 'Grace', 'Henry', 'Ivy', 'Jack',
+               'Maria', 'Wei', 'Fatima', 'Olu', 'Priya', 'Diego', 'Hannah', 'Yuki']
+LAST_NAMES = ['Johnson', 'Smith', 'Williams', 'Brown', 'Davis', 'Miller', 'Lee', 'Wilson',
+              'Martinez', 'Anderson', 'Nguyen', 'Patel', 'Garcia', 'Kim', 'Okafor', 'Rossi']
+DEPARTMENTS = ['Engineering', 'Marketing', 'Sales', 'HR', 'Finance', 'Operations', 'Legal']
+CITIES = ['SPRINGFIELD', 'RIVERSIDE', 'FRANKLIN', 'GREENVILLE', 'BRISTOL', 'CLINTON', 'SALEM',
+          'MADISON', 'GEORGETOWN', 'ARLINGTON']
+STATES = ['CA', 'TX', 'FL', 'NY', 'PA', 'IL', 'OH', 'GA', 'NC', 'MI', 'NJ', 'VA', 'WA', 'AZ',
+          'MA', 'TN', 'IN', 'MO', 'MD', 'WI', 'CO', 'MN', 'SC', 'AL', 'LA', 'KY', 'OR', 'PR']
+CREDENTIALS = ['MD', 'DO', 'NP', 'PA-C', 'RN', 'DDS', 'PT', 'LCSW', 'PHARMD', None]
+TAXONOMIES = ['207Q00000X', '208D00000X', '363L00000X', '363A00000X', '163W00000X',
+              '122300000X', '225100000X', '1041C0700X', '183500000X', '261QM1300X']
+
+# NPPES repeats these column groups with a _1.._N suffix
+TAXONOMY_GROUPS = 15
+OTHER_IDENTIFIER_GROUPS = 50
+
+
+def employees(rows, seed=0):
+    """Employee-shaped frame with the columns of sample_data.csv"""
+    ids = pl.int_range(1, rows + 1, eager=True).alias('id')
+    return pl.DataFrame({
+        'id': ids,
+        'name': _pick(ids, FIRST_NAMES, seed, 1) + ' ' + _pick(ids, LAST_NAMES, seed, 2),
+        'department': _pick(ids, DEPARTMENTS, seed, 3),
+        'salary': (40_000 + (_hash(ids, seed, 4) % 120) * 1_000).cast(pl.Int64),
+        'hire_date': _dates(ids, seed, 5, date(2010, 1, 1), 5_000).dt.strftime('%Y-%m-%d'),
+    })
+
+
+def nppes(rows, seed=0):
+    """NPPES-shaped frame: the 330 columns of the public file, sparsely filled
+
+    Individuals (entity type 1) get names and credentials, organizations
+    (type 2) get an organization name. Only the first taxonomy and other
+    identifier groups are populated, like most rows of the real file.
+    """
+    ids = pl.int_range(0, rows, eager=True)
+    individual = (_hash(ids, seed, 1) % 5) != 0
+    null = pl.Series([None] * rows, dtype=pl.String)
+
+    def when_individual(values):
+        return pl.select(pl.when(individual).then(values).otherwise(None)).to_series()
+
+    def when_organization(values):
+        return pl.select(pl.when(~individual).then(values).otherwise(None)).to_series()
+
+    street = (100 + _hash(ids, seed, 2) % 9_900).cast(pl.String) + ' MAIN ST'
+    city, state = _pick(ids, CITIES, seed, 3), _pick(ids, STATES, seed, 4)
+    postal = 100_000_000 + _hash(ids, seed, 5) % 899_999_999
+    phone = 2_000_000_000 + _hash(ids, seed, 6) % 7_999_999_999
+
+    columns = {
+        'NPI': 1_000_000_000 + ids,
+        'Entity Type Code': pl.select(pl.when(individual).then(1).otherwise(2)).to_series(),
+        'Replacement NPI': null,
+        'Employer Identification Number (EIN)': null,
+        'Provider Organization Name (Legal Business Name)':
+            when_organization(_pick(ids, LAST_NAMES, seed, 7) + ' MEDICAL GROUP'),
+        'Provider Last Name (Legal Name)': when_individual(_pick(ids, LAST_NAMES, seed, 8).str.to_uppercase()),
+        'Provider First Name': when_individual(_pick(ids, FIRST_NAMES, seed, 9).str.to_uppercase()),
+        'Provider Middle Name': null,
+        'Provider Name Prefix Text': null,
+        'Provider Name Suffix Text': null,
+        'Provider Credential Text': when_individual(_pick(ids, CREDENTIALS, seed, 10)),
+    }
+    for name in ('Provider Other Organization Name', 'Provider Other Organization Name Type Code',
+                 'Provider Other Last Name', 'Provider Other First Name', 'Provider Other Middle Name',
+                 'Provider Other Name Prefix Text', 'Provider Other Name Suffix Text',
+                 'Provider Other Credential Text', 'Provider Other Last Name Type Code'):
+        columns[name] = null
+    for kind in ('Mailing Address', 'Practice Location Address'):
+        columns['Provider First Line Business ' + kind] = street
+        columns['Provider Second Line Business ' + kind] = null
+        columns[f'Provider Business {kind} City Name'] = city
+        columns[f'Provider Business {kind} State Name'] = state
+        columns[f'Provider Business {kind} Postal Code'] = postal
+        columns[f'Provider Business {kind} Country Code (If outside U.S.)'] = pl.Series(['US'] * rows)
+        columns[f'Provider Business {kind} Telephone Number'] = phone
+        columns[f'Provider Business {kind} Fax Number'] = null
+    columns.update({
+        'Provider Enumeration Date': _dates(ids, seed, 11, date(2005, 5, 23), 6_500).dt.strftime('%m/%d/%Y'),
+        'Last Update Date': _dates(ids, seed, 12, date(2018, 1, 1), 2_500).dt.strftime('%m/%d/%Y'),
+        'NPI Deactivation Reason Code': null,
+        'NPI Deactivation Date': null,
+        'NPI Reactivation Date': null,
+        'Provider Sex Code': when_individual(_pick(ids, ['M', 'F'], seed, 13)),
+        'Authorized Official Last Name': when_organization(_pick(ids, LAST_NAMES, seed, 14).str.to_uppercase()),
+        'Authorized Official First Name': when_organization(_pick(ids, FIRST_NAMES, seed, 15).str.to_uppercase()),
+        'Authorized Official Middle Name': null,
+        'Authorized Official Title or Position': when_organization(pl.Series(['ADMINISTRATOR'] * rows)),
+        'Authorized Official Telephone Number': when_organization(phone),
+    })
+    for group in range(1, TAXONOMY_GROUPS + 1):
+        first = group == 1
+        columns[f'Healthcare Provider Taxonomy Code_{group}'] = _pick(ids, TAXONOMIES, seed, 16) if first else null
+        columns[f'Provider License Number_{group}'] = (
+            'L' + (_hash(ids, seed, 17) % 999_999).cast(pl.String) if first else null)
+        columns[f'Provider License Number State Code_{group}'] = state if first else null
+        columns[f'Healthcare Provider Primary Taxonomy Switch_{group}'] = (
+            pl.Series(['Y'] * rows) if first else null)
+    for group in range(1, OTHER_IDENTIFIER_GROUPS + 1):
+        first = group == 1
+        columns[f'Other Provider Identifier_{group}'] = (
+            (_hash(ids, seed, 18) % 99_999_999).cast(pl.String) if first else null)
+        columns[f'Other Provider Identifier Type Code_{group}'] = pl.Series(['05'] * rows) if first else null
+        columns[f'Other Provider Identifier State_{group}'] = state if first else null
+        columns[f'Other Provider Identifier Issuer_{group}'] = null
+    columns.update({
+        'Is Sole Proprietor': when_individual(_pick(ids, ['Y', 'N', 'X'], seed, 19)),
+        'Is Organization Subpart': when_organization(pl.Series(['N'] * rows)),
+        'Parent Organization LBN': null,
+        'Parent Organization TIN': null,
+        'Authorized Official Name Prefix Text': null,
+        'Authorized Official Name Suffix Text': null,
+        'Authorized Official Credential Text': null,
+    })
+    for group in range(1, TAXONOMY_GROUPS + 1):
+        columns[f'Healthcare Provider Taxonomy Group_{group}'] = null
+    columns['Certification Date'] = null
+
+    return pl.DataFrame({name: values.alias(name) for name, values in columns.items()})
+
+
+DATASETS = {
+    'employees': employees,
+    'nppes': nppes,
+}
+
+
+def dataset_path(directory, name, rows, seed=0):
+    """Write the dataset as CSV once and return its path; later calls reuse the file"""
+    path = os.path.join(directory, f"{name}_{rows}_{seed}.csv")
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        logger.info(f"Generating {rows:,} {name} rows at {path}")
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        DATASETS[name](rows, seed).write_csv(tmp_path)
+        os.replace(tmp_path, path)
+    return path
+
+
+def _hash(ids, seed, salt):
+    """Deterministic pseudo-random non-negative integers, one per id"""
+    return (ids.hash(seed * 1_000 + salt) % (2 ** 62)).cast(pl.Int64)
+
+
+def _pick(ids, values, seed, salt):
+    return pl.Series(values, dtype=pl.String).gather(_hash(ids, seed, salt) % len(values))
+
+
+def _dates(ids, seed, salt, start, days):
+    return pl.select(pl.lit(start) + pl.duration(days=_hash(ids, seed, salt) % days)).to_series()
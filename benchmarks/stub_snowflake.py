@@ -0,0 +1,110 @@
+import io
+import re
+import time
+import threading
+import pyarrow.parquet as pq
+
+
+class StubConnection:
+    """In-process stand-in for a snowflake.connector connection
+
+    Accepts the statements load_s3_to_snowflake issues and does the client
+    side of the work a real connection would: PUT reads the whole Parquet
+    stream and keeps its row count, COPY INTO reports those files as loaded,
+    executemany consumes every row. No network time is included, so the
+    benchmark measures the loader itself.
+
+    Every statement is recorded in self.log, so tests can assert on the
+    PUT/COPY calls a load issued.
+
+    Args:
+        put_seconds: Time each PUT takes, to make concurrent PUTs overlap (default: 0)
+        fail_chunks: Indexes of staged chunks (the _00003 in their file name)
+                     that COPY INTO reports as LOAD_FAILED
+    """
+
+    def __init__(self, put_seconds=0.0, fail_chunks=()):
+        self._lock = threading.Lock()
+        self.put_seconds = put_seconds
+        self.fail_chunks = set(fail_chunks)
+        self.staged = {}
+        self.rows = 0
+        self.bytes_staged = 0
+        self.statements = 0
+        self.log = []
+        self.puts_in_flight = 0
+        self.max_puts_in_flight = 0
+        self.closed = False
+
+    def cursor(self):
+        return StubCursor(self)
+
+    def commit(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def is_closed(self):
+        return self.closed
+
+
+class StubCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.description = None
+        self._rows = []
+
+    def execute(self, sql, params=None, file_stream=None):
+        conn = self.conn
+        statement = sql.strip()
+        with conn._lock:
+            conn.statements += 1
+            conn.log.append(statement)
+        if statement.startswith('PUT'):
+            with conn._lock:
+                conn.puts_in_flight += 1
+                conn.max_puts_in_flight = max(conn.max_puts_in_flight, conn.puts_in_flight)
+            time.sleep(conn.put_seconds)
+            data = file_stream.read()
+            name = re.match(r"PUT file://(\S+)", statement).group(1)
+            rows = pq.ParquetFile(io.BytesIO(data)).metadata.num_rows
+            with conn._lock:
+                conn.staged[name] = rows
+                conn.bytes_staged += len(data)
+                conn.puts_in_flight -= 1
+        elif statement.startswith('DROP TABLE'):
+            with conn._lock:
+                conn.rows = 0
+        elif statement.startswith('COPY INTO'):
+            pattern = re.search(r"PATTERN = '([^']+)'", statement).group(1)
+            with conn._lock:
+                loaded = {name: rows for name, rows in conn.staged.items() if re.fullmatch(pattern, name)}
+                for name in loaded:
+                    del conn.staged[name]
+                failed = {name for name in loaded
+                          if int(re.search(r"_(\d+)[.]parquet$", name).group(1)) in conn.fail_chunks}
+                conn.rows += sum(rows for name, rows in loaded.items() if name not in failed)
+            self.description = [('file',), ('status',), ('rows_parsed',), ('rows_loaded',),
+                                ('errors_seen',), ('first_error',)]
+            self._rows = [(name, 'LOAD_FAILED', rows, 0, rows, 'Numeric value is not recognized')
+                          if name in failed else (name, 'LOADED', rows, rows, 0, None)
+                          for name, rows in sorted(loaded.items())]
+        elif statement.startswith('SELECT COUNT(*)'):
+            self._rows = [(conn.rows,)]
+
+    def executemany(self, sql, rows):
+        count = sum(1 for _ in rows)
+        with self.conn._lock:
+            self.conn.rows += count
+            self.conn.statements += 1
+            self.conn.log.append(sql.strip())
+
+    def fetchall(self):
+        return self._rows
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def close(self):
+        pass
@@ -0,0 +1,33 @@
+import os
+import sys
+import json
+import time
+
+
+def main(argv=None):
+    """Run one benchmark iteration and print its timing as a JSON line
+
+    Invoked by the runner as `python -m benchmarks.worker '<spec json>'` in a
+    fresh interpreter. The spec's environment is applied before any loader
+    is imported and the case's setup runs untimed. Logs go to stderr, so
+    stdout only carries the result.
+    """
+    spec = json.loads((argv or sys.argv[1:])[0])
+    os.environ.update(spec['env'])
+    os.chdir(spec['workdir'])
+
+    from metrics import peak_rss_bytes
+    from benchmarks.cases import CASES
+    case = CASES[spec['case']]
+    if case.setup is not None:
+        case.setup(spec)
+
+    started = time.perf_counter()
+    case.run(spec)
+    seconds = time.perf_counter() - started
+
+    print(json.dumps({'seconds': seconds, 'peak_rss_bytes': peak_rss_bytes()}), flush=True)
+
+
+if __name__ == '__main__':
+    main()
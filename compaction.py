@@ -0,0 +1,118 @@
+import os
+import math
+import polars as pl
+from dotenv import load_dotenv
+from logger import logger
+
+load_dotenv()
+
+# A string column becomes an Enum when it has at most this many distinct
+# values and they make up at most this share of its non-null rows
+CATEGORY_MAX_UNIQUE = int(os.getenv("COMPACT_CATEGORY_MAX_UNIQUE", "1000"))
+CATEGORY_MAX_RATIO = float(os.getenv("COMPACT_CATEGORY_MAX_RATIO", "0.5"))
+# Largest number of decimal places a float column may have to get a DECIMAL hint
+DECIMAL_MAX_SCALE = 6
+
+# Narrowest first; unsigned types are avoided because no sink has them
+INTEGER_TYPES = (
+    (pl.Int8, -2 ** 7, 2 ** 7 - 1),
+    (pl.Int16, -2 ** 15, 2 ** 15 - 1),
+    (pl.Int32, -2 ** 31, 2 ** 31 - 1),
+    (pl.Int64, -2 ** 63, 2 ** 63 - 1),
+)
+# Integer hints follow the source dtype, not the narrowed one, so a later
+# load with larger values still fits the table
+WIDE_INTEGER_TYPES = (pl.Int64, pl.UInt32, pl.UInt64)
+# Decimal hints keep the scale seen but take the largest precision every sink allows
+DECIMAL_PRECISION = 38
+
+
+def compact_frame(df, category_max_unique=CATEGORY_MAX_UNIQUE, category_max_ratio=CATEGORY_MAX_RATIO, keep=()):
+    """Narrow a frame's dtypes and derive tighter SQL types for its columns
+
+    - integers are cast to the smallest signed width that holds their range
+      and hinted as BIGINT when they were 64-bit, INTEGER otherwise
+    - floats become Float32 when that round-trips every value, and are
+      hinted as DECIMAL(38,s) when no value has more than s <= 6 decimal places
+    - low-cardinality strings become an Enum of their values and are hinted
+      as VARCHAR, so the table stores text rather than an enum type
+
+    The hints are plain SQL types understood by Postgres, Snowflake and
+    DuckDB; pass them to type_maps.column_definitions or create_table_sql.
+
+    The hints are for the first load only: the sinks use them when the
+    load creates or replaces the table, which then keeps them for every
+    later load, so they are no tighter than the source dtypes. Pass the
+    key columns in keep: they are left at their original dtype without a
+    hint.
+
+    Returns:
+        Tuple of (compacted DataFrame, dict of column name -> SQL type)
+    """
+    if df.is_empty():
+        return df, {}
+
+    schema = {name: dtype for name, dtype in df.schema.items() if name not in keep}
+    exprs = _stat_exprs(schema)
+    stats = df.select(exprs).row(0, named=True) if exprs else {}
+    casts, hints = [], {}
+
+    for name, dtype in schema.items():
+        if dtype.is_integer():
+            low, high = stats[f"{name}__min"], stats[f"{name}__max"]
+            if low is None:
+                continue
+            narrow = next(t for t, t_min, t_max in INTEGER_TYPES if t_min <= low and high <= t_max)
+            if narrow != dtype:
+                casts.append(pl.col(name).cast(narrow))
+            hints[name] = 'BIGINT' if dtype in WIDE_INTEGER_TYPES else 'INTEGER'
+
+        elif dtype.is_float():
+            if dtype == pl.Float64 and stats[f"{name}__f32_exact"]:
+                casts.append(pl.col(name).cast(pl.Float32))
+            scale = next((s for s in range(DECIMAL_MAX_SCALE + 1) if stats[f"{name}__scale_{s}"]), None)
+            high = stats[f"{name}__abs_max"]
+            if scale is not None and high is not None and math.isfinite(high):
+                if len(str(int(high))) + scale <= DECIMAL_PRECISION:
+                    hints[name] = f"DECIMAL({DECIMAL_PRECISION},{scale})"
+
+        elif dtype == pl.String:
+            unique, count = stats[f"{name}__n_unique"], stats[f"{name}__count"]
+            if not count or unique > category_max_unique or unique > count * category_max_ratio:
+                continue
+            categories = df.get_column(name).drop_nulls().unique().sort()
+            casts.append(pl.col(name).cast(pl.Enum(categories)))
+            hints[name] = "VARCHAR"
+
+    before = df.estimated_size()
+    if casts:
+        df = df.with_columns(casts)
+    after = df.estimated_size()
+    saved = before - after
+    logger.info(f"Compacted {len(casts)} of {df.width} column(s): {before:,} -> {after:,} bytes "
+                f"in memory (saved {saved:,} bytes, {saved / before:.0%})")
+    return df, hints
+
+
+def _stat_exprs(schema):
+    """One expression per statistic so the whole frame is scanned in a single select"""
+    exprs = []
+    for name, dtype in schema.items():
+        col = pl.col(name)
+        if dtype.is_integer():
+            exprs += [col.min().alias(f"{name}__min"), col.max().alias(f"{name}__max")]
+        elif dtype.is_float():
+            values = col.drop_nulls()
+            exprs.append((values.cast(pl.Float32).cast(pl.Float64) == values).all()
+                         .alias(f"{name}__f32_exact"))
+            exprs.append(values.abs().max().alias(f"{name}__abs_max"))
+            for scale in range(DECIMAL_MAX_SCALE + 1):
+                shifted = values * 10 ** scale
+                exprs.append(((shifted - shifted.round()).abs() < 1e-6).all()
+                             .alias(f"{name}__scale_{scale}"))
+        elif dtype == pl.String:
+            exprs += [
+                col.drop_nulls().n_unique().alias(f"{name}__n_unique"),
+                col.count().alias(f"{name}__count"),
+            ]
+    return exprs
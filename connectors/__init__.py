@@ -0,0 +1,4 @@
+from connectors.base import (Source, Sink, FrameSource, BatchQueue, transfer, rebatch, regroup,
+                             BATCH_ROWS, QUEUE_DEPTH)
+from connectors.sources import S3CsvSource, LocalFileSource, S3DownloadSource, ApiSource
+from connectors.sinks import PostgresSink, DuckDBSink, SnowflakeSink, S3ParquetSink, S3NdjsonSink
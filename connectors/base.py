@@ -0,0 +1,215 @@
+import os
+import queue
+import itertools
+import threading
+import contextvars
+import pyarrow as pa
+import polars as pl
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Most rows in one batch handed from a source to a sink, and batches a
+# source may run ahead of its sink. Longer batches are sliced, which shares
+# their buffers instead of copying them.
+BATCH_ROWS = int(os.getenv("CONNECTOR_BATCH_ROWS", str(128 * 1024)))
+QUEUE_DEPTH = int(os.getenv("CONNECTOR_QUEUE_DEPTH", "2"))
+
+_DONE = object()
+
+
+class Source:
+    """Yields the rows of a dataset as pyarrow RecordBatches
+
+    Every source yields at least one batch, an empty one when there are no
+    rows, so a sink always learns the schema. frame() returns all rows as
+    one Polars DataFrame for the steps that need the whole dataset at once
+    (quality checks, compaction, diffing).
+    """
+
+    def batches(self):
+        raise NotImplementedError
+
+    def frame(self):
+        return frame_from_batches(self.batches())
+
+
+class Sink:
+    """Consumes an iterable of RecordBatches; write() returns the sink's result"""
+
+    def write(self, batches):
+        raise NotImplementedError
+
+
+class FrameSource(Source):
+    """A Polars DataFrame already in memory, handed on as Arrow without copying"""
+
+    def __init__(self, df):
+        self.df = df
+
+    def batches(self):
+        return frame_batches(self.df)
+
+    def frame(self):
+        return self.df
+
+
+def transfer(source, sink, batch_rows=BATCH_ROWS, queue_depth=QUEUE_DEPTH):
+    """Stream every batch of a source into a sink and return the sink's result
+
+    Any source composes with any sink. Batches are passed by reference and
+    only sliced, never copied, on the way. The source runs on its own
+    thread at most queue_depth batches ahead of the sink, so reading and
+    writing overlap while a slow sink holds the source back instead of
+    letting batches pile up in memory. queue_depth=0 runs both on the
+    calling thread.
+
+    Example:
+        transfer(S3CsvSource(s3, bucket, 'Raines/nppes_full.csv', stream=True),
+                 DuckDBSink(conn, 'nppes', mode='replace'))
+    """
+    batches = rebatch(source.batches(), batch_rows)
+    if queue_depth <= 0:
+        return sink.write(batches)
+    with BatchQueue(batches, queue_depth) as queued:
+        return sink.write(queued)
+
+
+def rebatch(batches, batch_rows=BATCH_ROWS):
+    """Slice batches longer than batch_rows; shorter ones pass through as they are"""
+    batches = iter(batches)
+    try:
+        for batch in batches:
+            if batch.num_rows <= batch_rows:
+                yield batch
+                continue
+            for offset in range(0, batch.num_rows, batch_rows):
+                yield batch.slice(offset, batch_rows)
+    finally:
+        # Stops the source (e.g. its download threads) when the sink stops early
+        if hasattr(batches, "close"):
+            batches.close()
+
+
+def regroup(batches, rows):
+    """Gather batches into tables of exactly rows rows, the last one shorter
+
+    The tables are made of slices of the batches, so nothing is copied.
+    Yields one empty table when there are no rows at all.
+    """
+    pending, pending_rows, schema, yielded = [], 0, None, False
+    for batch in batches:
+        schema = batch.schema
+        offset = 0
+        while offset < batch.num_rows:
+            take = min(rows - pending_rows, batch.num_rows - offset)
+            pending.append(batch.slice(offset, take))
+            pending_rows += take
+            offset += take
+            if pending_rows == rows:
+                yield pa.Table.from_batches(pending, schema)
+                pending, pending_rows, yielded = [], 0, True
+    if pending or (not yielded and schema is not None):
+        yield pa.Table.from_batches(pending, schema)
+
+
+def first_batch(batches):
+    """Return (first batch, iterator over all batches including it)"""
+    batches = iter(batches)
+    first = next(batches, None)
+    if first is None:
+        raise ValueError("No batches to write; a source yields at least one, possibly empty, batch")
+    return first, itertools.chain([first], batches)
+
+
+class BatchQueue:
+    """Iterate over batches that a background thread pulls from a source
+
+    The thread stays at most depth batches ahead. Errors of the source are
+    raised in the iterating thread, and closing the queue stops the source
+    even if the sink did not read every batch.
+    """
+
+    def __init__(self, batches, depth=QUEUE_DEPTH):
+        self._batches = batches
+        self._queue = queue.Queue(maxsize=max(1, depth))
+        self._stop = threading.Event()
+        self._thread = None
+        self.rows = 0
+
+    def __enter__(self):
+        # The source records its spans and counters into the caller's step
+        context = contextvars.copy_context()
+        self._thread = threading.Thread(target=context.run, args=(self._produce,), daemon=True,
+                                        name="connector-source")
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def __iter__(self):
+        while True:
+            item = self._get()
+            if item is _DONE:
+                return
+            self.rows += item.num_rows
+            yield item
+
+    def close(self):
+        """Stop the source thread; safe to call more than once"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _produce(self):
+        try:
+            for batch in self._batches:
+                if not self._put(batch):
+                    return
+            self._put(_DONE)
+        except BaseException as e:
+            self._put(e)
+        finally:
+            if hasattr(self._batches, "close"):
+                self._batches.close()
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self):
+        while not self._stop.is_set():
+            try:
+                item = self._queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if isinstance(item, BaseException):
+                raise item
+            return item
+        return _DONE
+
+
+def frame_batches(df):
+    """The Arrow batches of a frame, or one empty batch when it has no rows"""
+    table = df.to_arrow()
+    return table.to_batches() or [empty_batch(table.schema)]
+
+
+def frame_from_batches(batches):
+    return pl.from_arrow(pa.Table.from_batches(list(batches)))
+
+
+def empty_batch(schema):
+    return pa.RecordBatch.from_pylist([], schema=schema)
+
+
+def polars_schema(schema):
+    """Polars schema of an Arrow schema, for the type mappings in type_maps"""
+    return pl.from_arrow(schema.empty_table()).schema
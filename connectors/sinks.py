@@ -0,0 +1,583 @@
+import io
+import uuid
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+import polars as pl
+from logger import logger
+from metrics import span, count, submit_in_context
+from s3_writer import MultipartUploadWriter
+from type_maps import postgres_type, column_definitions
+from connectors.base import Sink, polars_schema, regroup, first_batch
+
+# Bytes COPY reads from the CSV stream per round trip
+COPY_CHUNK_SIZE = 1024 * 1024
+DUCKDB_WRITE_MODES = ('create', 'replace', 'append', 'upsert')
+SNOWFLAKE_METHODS = ('insert', 'stage')
+# Rows per Parquet chunk and concurrent PUTs for the staged Snowflake path
+SNOWFLAKE_CHUNK_ROWS = 500_000
+SNOWFLAKE_PARALLEL = 4
+# Rows per Parquet row group written to S3
+ROW_GROUP_ROWS = 128 * 1024
+
+
+class PostgresSink(Sink):
+    """Upsert batches into a PostgreSQL table through a staging table
+
+    The table is created from the first batch's schema if it does not
+    exist. All batches go into one COPY ... FROM STDIN, serialized to CSV
+    by pyarrow as COPY reads them, so about one batch is in memory at a
+    time, and are merged with one INSERT ... ON CONFLICT statement. The
+    last occurrence of a duplicated key wins.
+
+    Args:
+        conn: psycopg2 connection
+        table_name: Table to create/upsert into (e.g., 'employees')
+        primary_key_column: The column to use as primary key for upserts (default: 'id')
+        type_hints: Column name -> SQL type replacing the default mapping,
+                    as returned by compaction.compact_frame; only used when
+                    this write creates the table
+        commit: Commit once the rows are merged (default: True)
+        chunk_size: Bytes read by COPY per round trip (default: 1 MiB)
+    """
+
+    def __init__(self, conn, table_name, primary_key_column='id', type_hints=None, commit=True,
+                 chunk_size=COPY_CHUNK_SIZE):
+        self.conn = conn
+        self.table_name = table_name
+        self.primary_key_column = primary_key_column
+        self.type_hints = type_hints
+        self.commit = commit
+        self.chunk_size = chunk_size
+
+    def write(self, batches):
+        first, batches = first_batch(batches)
+        columns = first.schema.names
+        cur = self.conn.cursor()
+
+        with span('ddl'):
+            type_hints = None if postgres_table_exists(cur, self.table_name) else self.type_hints
+            cur.execute(create_table_sql(self.table_name, polars_schema(first.schema), self.primary_key_column,
+                                         type_hints))
+        logger.info(f"Table '{self.table_name}' created/verified")
+
+        with span('write', table=self.table_name):
+            staging_table = copy_to_staging(cur, self.table_name, columns,
+                                            CsvBatchStream(batches), self.chunk_size)
+            merged = merge_from_staging(cur, self.table_name, staging_table, columns, self.primary_key_column)
+            if self.commit:
+                self.conn.commit()
+        count('rows_written', merged)
+        logger.info(f"Merged {merged:,} rows into '{self.table_name}' table")
+
+        cur.close()
+        return merged
+
+
+class DuckDBSink(Sink):
+    """Write batches to a DuckDB table with one statement over an Arrow stream
+
+    The batches are registered as a RecordBatchReader that DuckDB scans as
+    they arrive, without copying them, so a stream larger than memory is
+    written by a single CREATE TABLE AS / INSERT. DDL only looks at the
+    first batch.
+
+    Args:
+        conn: DuckDB connection or cursor
+        table_name: Table to write (e.g., 'nppes_sample')
+        mode: 'create', 'replace', 'append' or 'upsert', as in write_table (default: 'create')
+        key_columns: Columns identifying a row, required when mode='upsert'
+        type_hints: Column name -> SQL type the columns are cast to,
+                    as returned by compaction.compact_frame; only used when
+                    this write creates or replaces the table
+        evolve: Add columns of the batches that an existing table does not
+                have yet, for mode='append' or 'upsert' (default: False)
+    """
+
+    def __init__(self, conn, table_name, mode='create', key_columns=None, type_hints=None, evolve=False):
+        if mode not in DUCKDB_WRITE_MODES:
+            raise ValueError(f"Unknown write mode '{mode}', expected one of {', '.join(DUCKDB_WRITE_MODES)}")
+        if mode == 'upsert' and not key_columns:
+            raise ValueError("key_columns is required when mode='upsert'")
+        self.conn = conn
+        self.table_name = table_name
+        self.mode = mode
+        self.key_columns = key_columns
+        self.type_hints = type_hints
+        self.evolve = evolve
+
+    def write(self, batches):
+        first, batches = first_batch(batches)
+        conn = self.conn
+        conn.register('source_first', first)
+        conn.register('source_data', pa.RecordBatchReader.from_batches(first.schema, batches))
+        creates = self.mode == 'replace' or not duckdb_table_exists(conn, self.table_name)
+        type_hints = self.type_hints if creates else None
+        try:
+            if self.evolve and self.mode in ('append', 'upsert'):
+                with span('ddl'):
+                    add_missing_columns(conn, self.table_name,
+                                        self._select('source_first', first.schema, type_hints))
+            # Tables are created by CREATE TABLE AS, so the DDL is part of the write
+            with span('write', table=self.table_name, mode=self.mode):
+                written = write_table(conn, self.table_name, self._select('source_data', first.schema, type_hints),
+                                      self.mode, self.key_columns,
+                                      like_sql=self._select('source_first', first.schema, type_hints))
+        finally:
+            conn.unregister('source_data')
+            conn.unregister('source_first')
+
+        if written is not None:
+            count('rows_written', written)
+            logger.info(f"Wrote {written:,} rows to '{self.table_name}' (mode={self.mode})")
+        return written
+
+    def _select(self, view, schema, type_hints):
+        if not type_hints:
+            return f'SELECT * FROM {view}'
+        select_list = ', '.join(
+            f'CAST("{col}" AS {type_hints[col]}) AS "{col}"' if col in type_hints else f'"{col}"'
+            for col in schema.names
+        )
+        return f'SELECT {select_list} FROM {view}'
+
+
+class SnowflakeSink(Sink):
+    """Load batches into a Snowflake table
+
+    Column names are cleaned with clean_column_name and the table is
+    created from the first batch's schema. 'stage' gathers the batches
+    into Parquet chunks, PUTs them to the table stage in parallel and
+    loads them with a single COPY INTO; 'insert' gathers them the same way
+    and binds each chunk through cursor.executemany, which takes Python
+    values.
+
+    Args:
+        conn: Snowflake connection
+        table_name: Table to create/insert into (e.g., 'NPPES_SAMPLE')
+        drop_if_exists: Drop the table before creating it (default: True)
+        method: 'insert' or 'stage' (default: 'insert')
+        chunk_rows: Rows per Parquet chunk ('stage') or executemany call ('insert')
+                    (default: 500,000)
+        parallel: Chunks uploaded concurrently when method='stage' (default: 4)
+        compression: Parquet compression codec for staged chunks (default: 'zstd')
+        type_hints: Column name -> SQL type replacing the default mapping,
+                    as returned by compaction.compact_frame; only used when
+                    drop_if_exists recreates the table
+        evolve: Add columns of the batches that an existing table does not
+                have yet when it is kept (default: False)
+    """
+
+    def __init__(self, conn, table_name, drop_if_exists=True, method='insert', chunk_rows=SNOWFLAKE_CHUNK_ROWS,
+                 parallel=SNOWFLAKE_PARALLEL, compression='zstd', type_hints=None, evolve=False):
+        if method not in SNOWFLAKE_METHODS:
+            raise ValueError(f"Unknown load method '{method}', expected 'insert' or 'stage'")
+        self.conn = conn
+        self.table_name = table_name
+        self.drop_if_exists = drop_if_exists
+        self.method = method
+        self.chunk_rows = chunk_rows
+        self.parallel = parallel
+        self.compression = compression
+        self.type_hints = {clean_column_name(col): sql_type for col, sql_type in (type_hints or {}).items()}
+        self.evolve = evolve
+
+    def write(self, batches):
+        first, batches = first_batch(batches)
+        table_name = self.table_name
+        cursor = self.conn.cursor()
+
+        # Clean column names for Snowflake; renaming shares the column buffers
+        names = [clean_column_name(col) for col in first.schema.names]
+        schema = polars_schema(first.rename_columns(names).schema)
+
+        # Map Polars types to Snowflake types; a kept table outlives this
+        # load, so it is never shaped by the hints of one file
+        type_hints = self.type_hints if self.drop_if_exists else None
+        columns = column_definitions(schema, 'snowflake', type_hints)
+
+        with span('ddl'):
+            # If drop_if_exists is True, drop the table before creating it
+            if self.drop_if_exists:
+                cursor.execute(f"DROP TABLE IF EXISTS {table_name}")
+                logger.info(f"Dropped table '{table_name}' if it existed")
+
+            cursor.execute(f"CREATE TABLE IF NOT EXISTS {table_name} ({', '.join(columns)})")
+            logger.info(f"Created table '{table_name}'")
+
+            # An appended file with new header columns adds them to the existing table
+            if self.evolve and not self.drop_if_exists:
+                cursor.execute(f"SELECT * FROM {table_name} LIMIT 0")
+                existing = {col[0] for col in cursor.description or []}
+                added = [name for name in names if name not in existing]
+                if added:
+                    added_schema = {name: schema[name] for name in added}
+                    for definition in column_definitions(added_schema, 'snowflake'):
+                        cursor.execute(f"ALTER TABLE {table_name} ADD COLUMN IF NOT EXISTS {definition}")
+                    logger.info(f"Added column(s) {', '.join(added)} to '{table_name}'")
+
+        batches = (batch.rename_columns(names) for batch in batches)
+
+        results = None
+        if self.method == 'stage':
+            with span('write', table=table_name, method=self.method):
+                results = _stage_and_copy(self.conn, batches, table_name, self.chunk_rows, self.parallel,
+                                          self.compression)
+                self.conn.commit()
+            loaded = sum(r['rows_loaded'] or 0 for r in results)
+            count('rows_written', loaded)
+            logger.info(f"Loaded {loaded:,} rows from {len(results)} staged chunk(s)")
+        else:
+            placeholders = ', '.join(['%s'] * len(names))
+            column_list = ', '.join(f'"{col}"' for col in names)
+            insert_sql = f"INSERT INTO {table_name} ({column_list}) VALUES ({placeholders})"
+
+            inserted = 0
+            with span('write', table=table_name, method=self.method):
+                for chunk in regroup(batches, self.chunk_rows):
+                    cursor.executemany(insert_sql, list(zip(*(column.to_pylist() for column in chunk.columns))))
+                    inserted += chunk.num_rows
+                self.conn.commit()
+            count('rows_written', inserted)
+            logger.info(f"Inserted {inserted:,} rows")
+
+        # Verify
+        with span('verify'):
+            cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
+            row_count = cursor.fetchone()[0]
+        logger.info(f"Verified {row_count:,} rows in '{table_name}'")
+
+        cursor.close()
+        return results
+
+
+class S3ParquetSink(Sink):
+    """Stream batches to one S3 object as Parquet through a multipart upload
+
+    Batches are gathered into row groups of row_group_rows, so memory
+    holds about one row group and one upload part. write() returns the
+    'uri', 'rows' and 'bytes' written.
+
+    Args:
+        s3_client: boto3 S3 client
+        bucket: Bucket to write to
+        key: Key of the Parquet object (e.g., 'Raines/pokemon/dt=2024-01-01/pokemon.parquet')
+        compression: Parquet compression codec (default: 'zstd')
+        row_group_rows: Rows per row group (default: 131,072)
+    """
+
+    def __init__(self, s3_client, bucket, key, compression='zstd', row_group_rows=ROW_GROUP_ROWS):
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.compression = compression
+        self.row_group_rows = row_group_rows
+
+    def write(self, batches):
+        first, batches = first_batch(batches)
+        rows = 0
+        with span('write', key=self.key), \
+                MultipartUploadWriter(self.s3, self.bucket, self.key,
+                                      ContentType='application/vnd.apache.parquet') as out:
+            with pq.ParquetWriter(out, first.schema, compression=self.compression) as writer:
+                for table in regroup(batches, self.row_group_rows):
+                    writer.write_table(table, row_group_size=self.row_group_rows)
+                    rows += table.num_rows
+            written = out.tell()
+        logger.info(f"Wrote {rows:,} rows to s3://{self.bucket}/{self.key}")
+        return {'uri': f"s3://{self.bucket}/{self.key}", 'rows': rows, 'bytes': written}
+
+
+class S3NdjsonSink(Sink):
+    """Stream batches to one S3 object as newline-delimited JSON
+
+    Each batch is serialized by Polars and written through a multipart
+    upload. write() returns the 'uri', 'rows' and 'bytes' written.
+    """
+
+    def __init__(self, s3_client, bucket, key):
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.key = key
+
+    def write(self, batches):
+        rows = 0
+        with span('write', key=self.key), \
+                MultipartUploadWriter(self.s3, self.bucket, self.key, ContentType='application/x-ndjson') as out:
+            for batch in batches:
+                if batch.num_rows:
+                    pl.from_arrow(batch).write_ndjson(out)
+                    rows += batch.num_rows
+            written = out.tell()
+        logger.info(f"Wrote {rows:,} rows to s3://{self.bucket}/{self.key}")
+        return {'uri': f"s3://{self.bucket}/{self.key}", 'rows': rows, 'bytes': written}
+
+
+class CsvBatchStream(io.RawIOBase):
+    """Readable file object serializing batches to CSV, with one header, as it is read
+
+    Only the batch being read is held as CSV, so a stream of batches can be
+    passed to COPY ... FROM STDIN with bounded memory.
+    """
+
+    def __init__(self, batches):
+        super().__init__()
+        self._batches = iter(batches)
+        self._data = b''
+        self._offset = 0
+        self._header = True
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while self._offset >= len(self._data):
+            batch = next(self._batches, None)
+            if batch is None:
+                return b''
+            buffer = io.BytesIO()
+            pa_csv.write_csv(batch, buffer, pa_csv.WriteOptions(include_header=self._header))
+            self._data, self._offset, self._header = buffer.getvalue(), 0, False
+        if size is None or size < 0:
+            size = len(self._data) - self._offset
+        data = self._data[self._offset:self._offset + size]
+        self._offset += len(data)
+        return data
+
+
+def create_table_sql(table_name, schema, primary_key_column, type_hints=None):
+    """Build CREATE TABLE IF NOT EXISTS for a Polars schema
+
+    type_hints maps column names to SQL types that replace the default
+    mapping, as returned by compaction.compact_frame.
+    """
+    type_hints = type_hints or {}
+    columns = []
+    for col_name, dtype in schema.items():
+        pg_type = type_hints.get(col_name) or postgres_type(dtype)
+
+        # Mark primary key column
+        if col_name == primary_key_column:
+            columns.append(f"{col_name} {pg_type} PRIMARY KEY")
+        else:
+            columns.append(f"{col_name} {pg_type}")
+
+    return f"""
+        CREATE TABLE IF NOT EXISTS {table_name} (
+            {', '.join(columns)}
+        )
+    """
+
+
+def on_conflict_sql(columns, primary_key_column):
+    """Build the ON CONFLICT clause that turns an INSERT into an upsert"""
+    update_clauses = [f"{col} = EXCLUDED.{col}" for col in columns if col != primary_key_column]
+    if not update_clauses:
+        return f"ON CONFLICT ({primary_key_column}) DO NOTHING"
+    return f"""ON CONFLICT ({primary_key_column}) DO UPDATE SET
+            {', '.join(update_clauses)}"""
+
+
+def copy_to_staging(cur, like_table, columns, fileobj, chunk_size=COPY_CHUNK_SIZE):
+    """COPY CSV rows (with a header) into a temp table shaped like like_table
+
+    The staging table gets a _load_seq column recording the load order and is
+    dropped at commit. Returns the staging table name.
+    """
+    staging_table = f"{like_table}_staging"
+    column_names = ', '.join(columns)
+
+    cur.execute(f"DROP TABLE IF EXISTS {staging_table}")
+    cur.execute(f"""
+        CREATE TEMP TABLE {staging_table}
+        (LIKE {like_table} INCLUDING DEFAULTS) ON COMMIT DROP
+    """)
+    cur.execute(f"ALTER TABLE {staging_table} ADD COLUMN _load_seq BIGSERIAL")
+
+    cur.copy_expert(
+        f"COPY {staging_table} ({column_names}) FROM STDIN WITH (FORMAT csv, HEADER true)",
+        fileobj,
+        size=chunk_size,
+    )
+    logger.info(f"Copied {cur.rowcount:,} rows into staging table '{staging_table}'")
+    return staging_table
+
+
+def merge_from_staging(cur, table_name, staging_table, columns, primary_key_column):
+    """Upsert the staged rows into table_name in one statement; returns the row count"""
+    column_names = ', '.join(columns)
+
+    # The load sequence keeps the last occurrence of a duplicated key, which
+    # is what a row-by-row upsert would end up with
+    cur.execute(f"""
+        INSERT INTO {table_name} ({column_names})
+        SELECT DISTINCT ON ({primary_key_column}) {column_names}
+        FROM {staging_table}
+        ORDER BY {primary_key_column}, _load_seq DESC
+        {on_conflict_sql(columns, primary_key_column)}
+    """)
+    return cur.rowcount
+
+
+def write_table(conn, table_name, source_sql, mode, key_columns=None, like_sql=None):
+    """Write the rows of source_sql to table_name using the given write mode
+
+    source_sql is scanned once, so it may read a registered Arrow stream.
+    like_sql, a SELECT with the same columns, shapes the table that
+    mode='append' creates when it does not exist (default: source_sql).
+    Returns the number of rows written, or None when mode='create' found an
+    existing table and left it untouched.
+    """
+    if mode == 'create':
+        if duckdb_table_exists(conn, table_name):
+            logger.info(f"Table '{table_name}' already exists, leaving it unchanged")
+            return None
+        conn.execute(f"CREATE TABLE {table_name} AS {source_sql}")
+    elif mode == 'replace':
+        conn.execute(f"CREATE OR REPLACE TABLE {table_name} AS {source_sql}")
+    elif mode == 'append':
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {table_name} AS {like_sql or source_sql} LIMIT 0")
+        return conn.execute(f"INSERT INTO {table_name} BY NAME {source_sql}").fetchone()[0]
+    else:
+        # Materialize once so an S3 scan is not repeated for the delete and the insert
+        conn.execute(f"CREATE OR REPLACE TEMP TABLE upsert_source AS {source_sql}")
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {table_name} AS SELECT * FROM upsert_source LIMIT 0")
+        match = ' AND '.join(f'{table_name}."{col}" = upsert_source."{col}"' for col in key_columns)
+        conn.execute("BEGIN TRANSACTION")
+        try:
+            conn.execute(f"DELETE FROM {table_name} USING upsert_source WHERE {match}")
+            written = conn.execute(
+                f"INSERT INTO {table_name} BY NAME SELECT * FROM upsert_source").fetchone()[0]
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.execute("DROP TABLE IF EXISTS upsert_source")
+        return written
+
+    return conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+
+
+def duckdb_table_exists(conn, table_name):
+    """Whether a DuckDB table of this name exists"""
+    return conn.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = ?",
+        [table_name]
+    ).fetchone()[0] > 0
+
+
+def postgres_table_exists(cur, table_name):
+    """Whether a PostgreSQL table of this name is visible on the search path"""
+    cur.execute("SELECT to_regclass(%s)", (table_name,))
+    return cur.fetchone()[0] is not None
+
+
+def add_missing_columns(conn, table_name, source_sql):
+    """Add columns of source_sql that an existing table does not have yet"""
+    existing = {row[0] for row in conn.execute(
+        "SELECT column_name FROM information_schema.columns WHERE table_name = ?",
+        [table_name]
+    ).fetchall()}
+    if not existing:
+        return []
+
+    added = []
+    for name, column_type, *_ in conn.execute(f"DESCRIBE {source_sql}").fetchall():
+        if name not in existing:
+            conn.execute(f'ALTER TABLE {table_name} ADD COLUMN "{name}" {column_type}')
+            added.append(name)
+    if added:
+        logger.info(f"Added column(s) {', '.join(added)} to '{table_name}'")
+    return added
+
+
+def clean_column_name(column):
+    """Make a CSV header usable as a Snowflake column name"""
+    return column.replace(' ', '_').replace('(', '').replace(')', '').replace('.', '_')
+
+
+def _table_stage(table_name):
+    """Return the table stage reference (@%TABLE or @DB.SCHEMA.%TABLE)"""
+    qualifier, _, name = table_name.rpartition('.')
+    return f"@{qualifier}.%{name}" if qualifier else f"@%{name}"
+
+
+def _stage_and_copy(conn, batches, table_name, chunk_rows, parallel, compression):
+    """Upload batches to the table stage as Parquet chunks and COPY them in
+
+    Chunks are serialized in memory and sent with PUT's file_stream argument,
+    so no temporary files are written. Every chunk name carries a per-load run
+    id, which keeps COPY INTO from picking up files left by other loads. At
+    most two chunks per PUT thread are waiting at any time, so a stream of
+    batches is staged with bounded memory. Raises ValueError when COPY INTO
+    reports a chunk that did not load completely.
+    """
+    stage = _table_stage(table_name)
+    run_id = uuid.uuid4().hex
+    # Polars' name for no compression, which callers used before the Arrow writer
+    compression = 'none' if compression == 'uncompressed' else compression
+
+    def put_chunk(index, chunk):
+        with span('serialize'):
+            buffer = io.BytesIO()
+            pq.write_table(chunk, buffer, compression=compression)
+            size = buffer.tell()
+            buffer.seek(0)
+
+        chunk_name = f"{run_id}_{index:05d}.parquet"
+        put_cursor = conn.cursor()
+        try:
+            with span('put', chunk=chunk_name):
+                put_cursor.execute(
+                    f"PUT file://{chunk_name} {stage} AUTO_COMPRESS=FALSE OVERWRITE=TRUE",
+                    file_stream=buffer
+                )
+        finally:
+            put_cursor.close()
+        count('bytes_uploaded', size)
+        logger.info(f"Staged chunk {index + 1} ({chunk.num_rows:,} rows, {size:,} bytes) as {chunk_name}")
+
+    logger.info(f"Uploading Parquet chunk(s) of up to {chunk_rows:,} rows "
+                f"to {stage} with {parallel} parallel PUT(s)")
+    parallel = max(1, parallel)
+    with ThreadPoolExecutor(max_workers=parallel) as pool:
+        pending = set()
+        for index, chunk in enumerate(regroup(batches, chunk_rows)):
+            if len(pending) >= 2 * parallel:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                # result() re-raises a failed upload
+                for future in done:
+                    future.result()
+            pending.add(submit_in_context(pool, put_chunk, index, chunk))
+        for future in pending:
+            future.result()
+
+    cursor = conn.cursor()
+    try:
+        with span('copy'):
+            cursor.execute(f"""
+                COPY INTO {table_name}
+                FROM {stage}
+                PATTERN = '.*{run_id}_[0-9]+[.]parquet'
+                FILE_FORMAT = (TYPE = PARQUET USE_LOGICAL_TYPE = TRUE)
+                MATCH_BY_COLUMN_NAME = CASE_SENSITIVE
+                PURGE = TRUE
+            """)
+        columns = [col[0].lower() for col in cursor.description or []]
+        results = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+    for result in results:
+        logger.info(f"  - {result.get('file')}: {result.get('status')}, "
+                    f"{result.get('rows_loaded') or 0:,} of {result.get('rows_parsed') or 0:,} rows loaded"
+                    + (f", first error: {result['first_error']}" if result.get('first_error') else ''))
+
+    failed = [result for result in results
+              if result.get('errors_seen') or str(result.get('status')).upper() != 'LOADED']
+    if failed:
+        raise ValueError(f"{len(failed)} of {len(results)} staged chunk(s) did not load; "
+                         f"{failed[0].get('file')}: {failed[0].get('first_error')}")
+    return results
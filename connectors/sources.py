@@ -0,0 +1,261 @@
+import os
+import json
+import polars as pl
+import pyarrow.parquet as pq
+from dotenv import load_dotenv
+from logger import logger
+from metrics import span, count
+from s3_cache import read_csv_cached
+from schema_registry import read_csv_registered, resolve_schema
+from s3_stream import CsvStream, DEFAULT_CHUNK_BYTES
+from s3_download import download_to_file
+from object_codec import EXTENSIONS, codec_from_key, detect_codec, open_decompressed
+from connectors.base import Source, BATCH_ROWS, frame_batches, empty_batch
+
+load_dotenv()
+
+FILE_FORMATS = ('csv', 'parquet', 'ndjson')
+
+
+class S3CsvSource(Source):
+    """A CSV object in S3, read whole through the ETag cache or streamed in chunks
+
+    With stream=False the object is parsed into one frame, reusing the
+    cached download and parsed frame while its ETag is unchanged. With
+    stream=True it is read chunk_bytes at a time through CsvStream, so
+    objects larger than memory can be passed on batch by batch.
+
+    Args:
+        s3_client: boto3 S3 client
+        bucket: Bucket of the object
+        key: Key of the object (e.g., 'Raines/nppes_sample.csv')
+        dataset: Schema registry dataset whose registered types the CSV is
+                 parsed with; None infers the types from the whole object
+        on_drift: What to do when the header differs from the registered one
+                  (default: 'raise'); the drift report is kept in self.drift
+        stream: Read the object in chunks instead of as one frame (default: False)
+        chunk_bytes: Bytes of CSV per batch when stream=True (default: 64 MiB)
+    """
+
+    def __init__(self, s3_client, bucket, key, dataset=None, on_drift='raise', stream=False,
+                 chunk_bytes=DEFAULT_CHUNK_BYTES):
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.dataset = dataset
+        self.on_drift = on_drift
+        self.stream = stream
+        self.chunk_bytes = chunk_bytes
+        self.drift = None
+
+    def frame(self):
+        if self.stream:
+            return super().frame()
+        with span('read'):
+            if self.dataset:
+                df, self.drift = read_csv_registered(self.s3, self.bucket, self.key, self.dataset,
+                                                     on_drift=self.on_drift)
+            else:
+                # Use infer_schema_length=None to scan entire file for accurate type detection
+                df = read_csv_cached(self.s3, self.bucket, self.key, infer_schema_length=None)
+        logger.info(f"Loaded {len(df):,} rows x {len(df.columns)} columns")
+        return df
+
+    def batches(self):
+        if not self.stream:
+            yield from frame_batches(self.frame())
+            return
+
+        # Download, parsing and the sink overlap; only a few batches are in memory
+        with CsvStream(self.s3, self.bucket, self.key, self.chunk_bytes) as csv_stream:
+            schema = None
+            if self.dataset:
+                entry, self.drift = resolve_schema(self.dataset, csv_stream.first_chunk, on_drift=self.on_drift)
+                schema = entry['schema']
+            for frame in csv_stream.batches(schema):
+                yield from frame_batches(frame)
+        logger.info(csv_stream.progress())
+
+
+class LocalFileSource(Source):
+    """A CSV, Parquet or NDJSON file on local disk
+
+    The format comes from the file extension, after any compression
+    extension ('employees.csv.zst' is zstd-compressed CSV). CSV and NDJSON
+    are parsed with Polars, inferring types like pl.read_csv does;
+    uncompressed Parquet is streamed in batches without reading it whole.
+
+    Args:
+        path: File to read
+        file_format: 'csv', 'parquet' or 'ndjson' (default: from the extension)
+        codec: Compression of the file (default: from the extension)
+        read_options: Passed on to the Polars reader (e.g. infer_schema_length=None)
+    """
+
+    def __init__(self, path, file_format=None, codec=None, **read_options):
+        self.path = path
+        self.codec = codec if codec is not None else codec_from_key(path)
+        self.file_format = file_format
+        self.read_options = read_options
+
+    def frame(self):
+        file_format = self._file_format()
+        reader = {'csv': pl.read_csv, 'parquet': pl.read_parquet, 'ndjson': pl.read_ndjson}[file_format]
+        with span('parse'):
+            if self.codec:
+                with open(self.path, 'rb') as f:
+                    df = reader(open_decompressed(f, self.codec), **self.read_options)
+            else:
+                df = reader(self.path, **self.read_options)
+        count('rows_parsed', len(df))
+        logger.info(f"Loaded {len(df)} rows with Polars")
+        return df
+
+    def batches(self):
+        if self._file_format() != 'parquet' or self.codec:
+            yield from frame_batches(self.frame())
+            return
+
+        parquet_file = pq.ParquetFile(self.path)
+        rows = 0
+        for batch in parquet_file.iter_batches(batch_size=BATCH_ROWS):
+            rows += batch.num_rows
+            yield batch
+        if not parquet_file.metadata.num_rows:
+            yield empty_batch(parquet_file.schema_arrow)
+        count('rows_parsed', rows)
+
+    def _file_format(self):
+        if self.file_format:
+            if self.file_format not in FILE_FORMATS:
+                raise ValueError(f"Unknown file format '{self.file_format}', expected one of "
+                                 f"{', '.join(FILE_FORMATS)}")
+            return self.file_format
+        base, extension = os.path.splitext(self.path.lower())
+        if extension in EXTENSIONS:
+            extension = os.path.splitext(base)[1]
+        return {'.parquet': 'parquet', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}.get(extension, 'csv')
+
+
+class S3DownloadSource(LocalFileSource):
+    """An S3/RustFS object downloaded to a local file, then read like LocalFileSource
+
+    The download uses concurrent ranged GETs and resumes an interrupted
+    one (see s3_download.download_to_file). Objects uploaded with a codec
+    are decompressed as they are parsed.
+
+    Args:
+        s3_client: boto3 S3 client
+        bucket: Bucket of the object
+        key: Key of the object (e.g., 'employee_data.csv')
+        path: Where to save the downloaded file (default: /tmp/{key})
+        read_options: Passed on to LocalFileSource
+    """
+
+    def __init__(self, s3_client, bucket, key, path=None, **read_options):
+        super().__init__(path or f"/tmp/{key}", **read_options)
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.head = None
+
+    def frame(self):
+        self._download()
+        return super().frame()
+
+    def batches(self):
+        self._download()
+        yield from super().batches()
+
+    def _download(self):
+        if self.head is not None:
+            return
+        self.head = download_to_file(self.s3, self.bucket, self.key, self.path)
+        logger.info(f"Downloaded {self.key} to {self.path}")
+        self.codec = detect_codec(self.key, self.head.get('Metadata'))
+
+
+class ApiSource(Source):
+    """Records of a paginated JSON API, flattened to one row each
+
+    Args:
+        api_url: List endpoint to start from
+        mode: 'list' reads the records of the single list response (default)
+              'detail' follows `next` pagination and fetches every record's
+              detail URL concurrently with asyncio
+        max_records: Stop listing after this many records in 'detail' mode
+                     (default: 151, None for everything)
+        concurrency: Detail requests in flight at once in 'detail' mode (default: 10)
+        rate_per_second: Token-bucket request rate in 'detail' mode (default: 20)
+        cache_dir: Directory of the ETag/If-None-Match cache in 'detail' mode
+                   (default: API_CACHE_DIR or ~/.cache/de_review2/http)
+    """
+
+    def __init__(self, api_url, mode='list', max_records=151, concurrency=10, rate_per_second=20,
+                 cache_dir=None):
+        if mode not in ('list', 'detail'):
+            raise ValueError(f"Unknown mode '{mode}', expected 'list' or 'detail'")
+        self.api_url = api_url
+        self.mode = mode
+        self.max_records = max_records
+        self.concurrency = concurrency
+        self.rate_per_second = rate_per_second
+        self.cache_dir = cache_dir
+        self.data = None
+
+    def fetch(self):
+        """Return the response document, {'count': ..., 'results': [...]}; fetched once"""
+        if self.data is not None:
+            return self.data
+
+        logger.info(f"Fetching from {self.api_url}")
+        with span('download', url=self.api_url, mode=self.mode):
+            if self.mode == 'detail':
+                # aiohttp is only needed for the concurrent detail fetch
+                from API.async_fetch import fetch_details
+                total, details = fetch_details(
+                    self.api_url,
+                    max_records=self.max_records,
+                    concurrency=self.concurrency,
+                    rate_per_second=self.rate_per_second,
+                    cache_dir=self.cache_dir or os.getenv('API_CACHE_DIR', '~/.cache/de_review2/http'),
+                )
+                self.data = {'count': total, 'results': details}
+            else:
+                import requests
+                response = requests.get(self.api_url, timeout=30)
+                response.raise_for_status()
+                count('bytes_downloaded', len(response.content))
+                self.data = response.json()
+        count('rows_parsed', len(self.data.get('results', [])))
+        logger.info(f"Fetched {len(self.data.get('results', []))} records")
+        return self.data
+
+    def batches(self):
+        records = [flatten_record(record) for record in self.fetch().get('results', [])]
+        # Records may omit keys or hold different types under one key; every key
+        # becomes a column, typed from all the records
+        df = pl.from_dicts(records, infer_schema_length=None) if records else pl.DataFrame()
+        missing = set().union(*records) - set(df.columns)
+        if missing:
+            raise ValueError(f"Record key(s) {', '.join(sorted(missing))} did not become columns")
+        return frame_batches(df)
+
+
+def flatten_record(record, parent_key='', separator='_'):
+    """Flatten nested objects into one level of columns
+
+    Nested dicts become prefixed columns (e.g. sprites_front_default). Lists
+    are kept as JSON strings so every record has scalar columns and a stable
+    schema.
+    """
+    flat = {}
+    for key, value in record.items():
+        column = f"{parent_key}{separator}{key}" if parent_key else key
+        if isinstance(value, dict):
+            flat.update(flatten_record(value, column, separator))
+        elif isinstance(value, list):
+            flat[column] = json.dumps(value, separators=(',', ':'))
+        else:
+            flat[column] = value
+    return flat
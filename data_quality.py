@@ -0,0 +1,237 @@
+import os
+import re
+import glob
+import functools
+from datetime import datetime, timezone
+import yaml
+import polars as pl
+from dotenv import load_dotenv
+from logger import logger
+from metrics import span, count
+
+load_dotenv()
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+# dbt model directories whose schema.yml files declare the tests
+MODEL_DIRS = [
+    os.path.join(ROOT_DIR, path) for path in
+    (os.getenv('DATA_QUALITY_MODEL_DIRS') or 'DBT/dbt_employee_project/models,Snowflake/Snowflake_Intro/models')
+    .split(',')
+]
+# Rows that fail a test under on_quality='quarantine' are written here as Parquet
+QUARANTINE_DIR = os.getenv('DATA_QUALITY_QUARANTINE_DIR', 'quarantine')
+QUALITY_POLICIES = ('fail', 'quarantine', 'warn')
+SUPPORTED_TESTS = ('unique', 'not_null', 'accepted_values', 'relationships')
+
+# How a model's columns are computed from the raw file, for models that
+# rename or derive them. Each entry takes a resolver returning the raw
+# column by its name in the model SQL; unlisted columns keep their name.
+MODEL_COLUMNS = {
+    'stg_nppes_providers': {
+        'provider_npi': lambda col: col('NPI'),
+        'entity_type': lambda col: (
+            pl.when(col('Entity_Type_Code').cast(pl.Int64, strict=False) == 1).then(pl.lit('Individual'))
+            .when(col('Entity_Type_Code').cast(pl.Int64, strict=False) == 2).then(pl.lit('Organization'))
+            .otherwise(pl.lit('Unknown'))
+        ),
+        'practice_state': lambda col: col('Provider_Business_Practice_Location_Address_State_Name'),
+    },
+}
+
+
+class DataQualityError(ValueError):
+    """Rows of a frame fail the dbt tests of the model they are loaded for"""
+
+
+def model_tests(model):
+    """Return the column tests declared for a dbt model in the schema.yml files
+
+    Each test is a dict with its dbt-style 'name', the 'test' type, the
+    'column', the test arguments and its 'severity' ('error' or 'warn').
+    """
+    tests = _declared_tests().get(model)
+    if tests is None:
+        raise ValueError(f"No dbt model '{model}' found in the schema.yml files under {', '.join(MODEL_DIRS)}")
+    return tests
+
+
+def check_frame(df, model, on_quality='fail', references=None):
+    """Evaluate a dbt model's schema.yml tests on a frame before it is loaded
+
+    Every test becomes a Polars expression flagging the rows it rejects, and
+    all of them are evaluated in a single select, so the whole frame is
+    checked in one vectorized pass. Tests with severity warn only log.
+    For the others, on_quality decides what happens to failing rows:
+    'fail' raises DataQualityError, 'quarantine' drops them from the frame
+    and writes them with the names of their failed tests to QUARANTINE_DIR,
+    and 'warn' logs them and loads everything.
+
+    relationships tests need the referenced model's rows, which are not
+    loaded yet; pass them in references as {model name: DataFrame}, or the
+    test is skipped.
+
+    Args:
+        df: Polars DataFrame about to be loaded, with the file's column names
+        model: dbt model whose tests apply (e.g., 'stg_employees')
+        on_quality: 'fail', 'quarantine' or 'warn' (default: 'fail')
+        references: Frames of the models named by relationships tests
+
+    Returns:
+        Tuple of (DataFrame to load, report) where the report holds the
+        'model', the 'rows' checked, the 'failed_rows', one result per test
+        under 'tests' and the 'quarantine' path when rows were quarantined
+    """
+    if on_quality not in QUALITY_POLICIES:
+        raise ValueError(f"Unknown data quality policy '{on_quality}', expected one of "
+                         f"{', '.join(QUALITY_POLICIES)}")
+
+    columns = {_normalize(col): col for col in df.columns}
+    results, flags = [], []
+    for test in model_tests(model):
+        result = {'name': test['name'], 'test': test['test'], 'column': test['column'],
+                  'severity': test['severity'], 'failures': 0, 'status': 'pass'}
+        results.append(result)
+        try:
+            value = _model_column(model, test['column'], columns)
+            expr = _failure_expr(test, value, references or {})
+        except KeyError as e:
+            result['status'] = 'skipped'
+            logger.warning(f"Skipped {test['name']}: {e.args[0]}")
+            continue
+        flags.append(expr.fill_null(False).alias(test['name']))
+
+    with span('quality', model=model) as attributes:
+        flagged = df.select(flags) if flags else pl.DataFrame()
+        failures = flagged.sum().row(0, named=True) if flags else {}
+        for result in results:
+            if result['status'] == 'skipped':
+                continue
+            result['failures'] = failures[result['name']]
+            if result['failures']:
+                result['status'] = 'warn' if result['severity'] == 'warn' or on_quality == 'warn' else 'fail'
+
+        blocking = [result['name'] for result in results if result['status'] == 'fail']
+        bad_rows = flagged.select(pl.any_horizontal(blocking)).to_series() if blocking else None
+        failed_rows = int(bad_rows.sum()) if bad_rows is not None else 0
+        attributes['failed_rows'] = failed_rows
+
+    report = {'model': model, 'rows': len(df), 'failed_rows': failed_rows, 'tests': results}
+    for result in results:
+        if result['status'] in ('warn', 'fail'):
+            logger.warning(f"{result['name']}: {result['failures']:,} failing row(s)")
+    skipped = sum(result['status'] == 'skipped' for result in results)
+    summary = (f"{sum(result['status'] == 'pass' for result in results)} of {len(results)} test(s) of "
+               f"'{model}' passed on {len(df):,} rows" + (f" ({skipped} skipped)" if skipped else ""))
+    if not blocking:
+        logger.info(summary)
+        return df, report
+
+    if on_quality == 'fail':
+        raise DataQualityError(f"{summary}; {failed_rows:,} row(s) fail {', '.join(blocking)}")
+
+    # The failed test names travel with each quarantined row
+    quarantined = df.filter(bad_rows).with_columns(
+        flagged.filter(bad_rows).select(
+            pl.concat_list(pl.when(pl.col(name)).then(pl.lit(name)) for name in blocking)
+            .list.drop_nulls().alias('_failed_tests')
+        ).to_series()
+    )
+    report['quarantine'] = _write_quarantine(model, quarantined)
+    count('rows_quarantined', failed_rows)
+    logger.warning(f"{summary}; quarantined {failed_rows:,} row(s) to {report['quarantine']}")
+    return df.filter(~bad_rows), report
+
+
+def _failure_expr(test, value, references):
+    """Expression that is true on the rows a test rejects; nulls pass, as in dbt"""
+    if test['test'] == 'not_null':
+        return value.is_null()
+    if test['test'] == 'unique':
+        return value.is_not_null() & value.is_duplicated()
+    if test['test'] == 'accepted_values':
+        return value.is_not_null() & ~value.cast(pl.String).is_in([str(v) for v in test['values']])
+
+    # relationships: every value must exist in the referenced model's field
+    parent = _ref_name(test['to'])
+    if parent not in references:
+        raise KeyError(f"relationships to '{test['to']}' needs the rows of '{parent}' in references")
+    reference = references[parent]
+    field = {_normalize(col): col for col in reference.columns}.get(_normalize(test['field']))
+    if field is None:
+        raise KeyError(f"column '{test['field']}' not found in the rows of '{parent}'")
+    return value.is_not_null() & ~value.is_in(reference.get_column(field).implode())
+
+
+def _model_column(model, column, columns):
+    """Expression for a model column over the raw frame, following MODEL_COLUMNS"""
+    def col(name):
+        raw = columns.get(_normalize(name))
+        if raw is None:
+            raise KeyError(f"column '{name}' is not in the frame")
+        return pl.col(raw)
+
+    derive = MODEL_COLUMNS.get(model, {}).get(column)
+    return derive(col) if derive else col(column)
+
+
+@functools.lru_cache(maxsize=None)
+def _declared_tests():
+    """Parse every schema.yml under MODEL_DIRS into {model: [test, ...]}"""
+    models = {}
+    for directory in MODEL_DIRS:
+        for path in sorted(glob.glob(os.path.join(directory, '**', '*.yml'), recursive=True)):
+            with open(path) as f:
+                document = yaml.safe_load(f) or {}
+            for model in document.get('models') or []:
+                tests = models.setdefault(model['name'], [])
+                for column in model.get('columns') or []:
+                    for declared in column.get('data_tests', column.get('tests')) or []:
+                        test = _parse_test(model['name'], column['name'], declared)
+                        if test:
+                            tests.append(test)
+    return models
+
+
+def _parse_test(model, column, declared):
+    """Turn one entry of a column's tests list into a test dict"""
+    if isinstance(declared, str):
+        name, options = declared, {}
+    else:
+        name, options = next(iter(declared.items()))
+        options = options or {}
+    if name not in SUPPORTED_TESTS:
+        logger.warning(f"Test '{name}' on {model}.{column} is not evaluated before loading")
+        return None
+
+    # dbt >= 1.10 nests test arguments under 'arguments'; older projects put them beside config
+    arguments = {**{k: v for k, v in options.items() if k not in ('arguments', 'config')},
+                 **(options.get('arguments') or {})}
+    config = options.get('config') or {}
+    return {
+        'name': f"{name}_{model}_{column}",
+        'test': name,
+        'column': column,
+        'severity': str(config.get('severity', options.get('severity', 'error'))).lower(),
+        **arguments,
+    }
+
+
+def _ref_name(target):
+    """'ref('stg_employees')' -> 'stg_employees'"""
+    match = re.match(r"""\s*(?:ref|source)\((.*)\)\s*$""", target)
+    if not match:
+        return target
+    return [part.strip(" '\"") for part in match.group(1).split(',')][-1]
+
+
+def _normalize(column):
+    # Snowflake loads rename 'Entity Type Code' to 'Entity_Type_Code'; both match
+    return column.replace(' ', '_').replace('(', '').replace(')', '').replace('.', '_').lower()
+
+
+def _write_quarantine(model, df):
+    directory = os.path.join(QUARANTINE_DIR, model)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S%f}.parquet")
+    df.write_parquet(path, compression='zstd')
+    return path
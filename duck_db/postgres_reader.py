@@ -0,0 +1,176 @@
+import os
+import time
+import threading
+from dotenv import load_dotenv
+from logger import logger
+from resources import get_duckdb_connection
+from metrics import span, count
+from sql_quoting import quote_identifier, sql_literal
+
+load_dotenv()
+
+# Local DuckDB file holding the attachment and the table snapshots
+CACHE_DB = os.getenv('PG_READER_CACHE_DB', 'duck_db/postgres_cache.duckdb')
+DEFAULT_TTL_SECONDS = int(os.getenv('PG_READER_TTL_SECONDS', '900'))
+OUTPUTS = ('polars', 'arrow')
+# Postgres is attached under this catalog name, snapshots live in this schema
+PG_CATALOG = 'pg'
+SNAPSHOT_SCHEMA = 'snapshots'
+SNAPSHOT_LOG = 'pg_snapshot_log'
+
+_attach_lock = threading.Lock()
+_table_locks = {}
+
+
+def read_table(table, columns=None, where=None, params=None, schema='public', snapshot=False,
+               ttl_seconds=DEFAULT_TTL_SECONDS, output='polars'):
+    """Read a Postgres table through DuckDB's postgres scanner
+
+    Only the requested columns are fetched and the where clause is pushed
+    down to Postgres, which sends the rows over its binary COPY protocol, so
+    the transfer is one columnar scan rather than a row-at-a-time cursor.
+    With snapshot=True the query runs against a local copy of the table
+    instead, refreshed when it is older than ttl_seconds, and Postgres is
+    only read once per TTL however many queries hit the table.
+
+    Args:
+        table: Table name in Postgres (e.g., 'employees')
+        columns: Columns to fetch (default: all)
+        where: SQL filter in DuckDB syntax, with ? placeholders for params
+               (e.g., 'department = ? AND salary > ?')
+        params: Values for the placeholders in where
+        schema: Postgres schema of the table (default: 'public')
+        snapshot: Read from the local snapshot of the table (default: False)
+        ttl_seconds: Maximum age of the snapshot before it is refreshed
+                     (default: PG_READER_TTL_SECONDS or 900)
+        output: 'polars' for a DataFrame or 'arrow' for a pyarrow Table
+
+    Returns:
+        The result as a Polars DataFrame or pyarrow Table
+
+    Example usage:
+        # Engineering salaries, filtered inside Postgres
+        read_table('employees', ['name', 'salary'], where='department = ?', params=['Engineering'])
+
+        # Serve repeated dashboard reads from a local copy refreshed every 5 minutes
+        read_table('employees', snapshot=True, ttl_seconds=300)
+    """
+    source = (refresh_snapshot(table, schema, ttl_seconds) if snapshot
+              else f'{PG_CATALOG}.{quote_identifier(schema)}.{quote_identifier(table)}')
+    select_list = ', '.join(quote_identifier(col) for col in columns) if columns else '*'
+    sql = f'SELECT {select_list} FROM {source}' + (f' WHERE {where}' if where else '')
+    return query(sql, params, output)
+
+
+def query(sql, params=None, output='polars'):
+    """Run an analytical query over the attached Postgres and the local snapshots
+
+    Postgres tables are addressed as pg.<schema>.<table> and snapshots as
+    snapshots.<table>, so a query can aggregate, join and filter in DuckDB
+    while Postgres only serves the scans.
+
+    Example:
+        query("SELECT department, AVG(salary) FROM pg.public.employees GROUP BY department")
+    """
+    if output not in OUTPUTS:
+        raise ValueError(f"Unknown output '{output}', expected 'polars' or 'arrow'")
+
+    conn = _connection()
+    try:
+        with span('query') as attributes:
+            result = conn.execute(sql, params or [])
+            data = result.pl() if output == 'polars' else result.to_arrow_table()
+            attributes['rows'] = len(data)
+    finally:
+        conn.close()
+    count('rows_read', len(data))
+    logger.info(f"Read {len(data):,} rows x {len(data.columns)} columns through DuckDB")
+    return data
+
+
+def refresh_snapshot(table, schema='public', ttl_seconds=DEFAULT_TTL_SECONDS, force=False):
+    """Copy a Postgres table into the local DuckDB cache unless the copy is fresh
+
+    The copy replaces the previous snapshot in one transaction, so readers
+    see either the old or the new snapshot, never a partial one. Returns
+    the qualified name of the snapshot table.
+    """
+    name = f'{SNAPSHOT_SCHEMA}.{quote_identifier(table if schema == "public" else f"{schema}__{table}")}'
+    with _attach_lock:
+        table_lock = _table_locks.setdefault(name, threading.Lock())
+
+    # Callers asking for the same stale table wait for one refresh
+    with table_lock:
+        conn = _connection()
+        try:
+            refreshed = conn.execute(
+                f"SELECT epoch(refreshed_at) FROM {SNAPSHOT_LOG} WHERE table_name = ?", [name]
+            ).fetchone()
+            age = time.time() - refreshed[0] if refreshed else None
+            if not force and age is not None and age < ttl_seconds:
+                return name
+
+            with span('snapshot', table=table) as attributes:
+                conn.execute("BEGIN TRANSACTION")
+                try:
+                    conn.execute(f"CREATE OR REPLACE TABLE {name} AS "
+                                 f"SELECT * FROM {PG_CATALOG}.{quote_identifier(schema)}.{quote_identifier(table)}")
+                    rows = conn.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
+                    conn.execute(f"INSERT OR REPLACE INTO {SNAPSHOT_LOG} VALUES (?, now(), ?)", [name, rows])
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+                attributes['rows'] = rows
+        finally:
+            conn.close()
+
+    logger.info(f"Snapshot of {schema}.{table} refreshed with {rows:,} rows"
+                + (f" ({age:,.0f}s old)" if age is not None else ""))
+    return name
+
+
+def postgres_secret_sql(name='pg_reader'):
+    """Return a CREATE SECRET statement with the POSTGRES_* connection settings
+
+    A secret keeps the password out of the ATTACH statement, which DuckDB
+    may echo in errors and logs.
+    """
+    options = {
+        'HOST': os.getenv('POSTGRES_HOST'),
+        'PORT': os.getenv('POSTGRES_PORT'),
+        'DATABASE': os.getenv('POSTGRES_DB'),
+        'USER': os.getenv('POSTGRES_USER'),
+        'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
+    }
+    settings = ', '.join(f"{key} {sql_literal(value)}" for key, value in options.items() if value)
+    return f"CREATE OR REPLACE SECRET {name} (TYPE postgres{', ' + settings if settings else ''})"
+
+
+def _connection():
+    """Cursor on the cache database with Postgres attached read-only"""
+    db = get_duckdb_connection(CACHE_DB)
+    with _attach_lock:
+        attached = db.execute(
+            "SELECT COUNT(*) FROM duckdb_databases() WHERE database_name = ?", [PG_CATALOG]
+        ).fetchone()[0]
+        if not attached:
+            db.execute("INSTALL postgres")
+            db.execute("LOAD postgres")
+            db.execute(postgres_secret_sql())
+            db.execute(f"ATTACH IF NOT EXISTS '' AS {PG_CATALOG} (TYPE postgres, SECRET pg_reader, READ_ONLY)")
+            db.execute(f"CREATE SCHEMA IF NOT EXISTS {SNAPSHOT_SCHEMA}")
+            db.execute(f"""
+                CREATE TABLE IF NOT EXISTS {SNAPSHOT_LOG} (
+                    table_name VARCHAR PRIMARY KEY,
+                    refreshed_at TIMESTAMPTZ,
+                    rows BIGINT
+                )
+            """)
+            logger.info(f"Attached PostgreSQL to DuckDB at {CACHE_DB}")
+    return db.cursor()
+
+
+if __name__ == "__main__":
+    print(query(f"SELECT department, COUNT(*) AS employees, AVG(salary) AS avg_salary "
+                f"FROM {PG_CATALOG}.public.employees GROUP BY department ORDER BY department"))
@@ -1,19 +1,88 @@
 import os
 import sys
+import time
+import argparse
 from dotenv import load_dotenv
 from logger import logger
-from rustfs.upload_to_rustfs import upload_data
-from rustfs.load_to_postgres import load_data
-from duck_db.setup import setup_duckdb
-from API.api_to_s3 import fetch_and_upload_pokemon_data
-from s3_duckdb.s3_to_duckdb import load_s3_to_duckdb
-from Snowflake.s3_to_snowflake import load_s3_to_snowflake
+from scheduler import Step, select_steps, describe_plan, run_steps, summarize, SUCCEEDED
+from metrics import breakdown, write_prometheus
+from object_codec import UPLOAD_CODEC, compressed_key
 
 load_dotenv()
 
-
-def main():
+# upload_data suffixes the key when OBJECT_CODEC compresses the upload
+EMPLOYEE_KEY = compressed_key('employee_data.csv', UPLOAD_CODEC)
+
+# The pipeline as a step graph. Only load_postgres and unload_postgres depend
+# on another step; everything else can run concurrently. Optional steps only
+# run when named with --only. Step modules are named, not imported:
+# a run only imports the modules (and polars, duckdb, boto3, ...) of the
+# steps it selects, which keeps single-step cron runs fast to start.
+STEPS = [
+    # Pass the local file path and S3 key name to the refactored function
+    Step('upload_rustfs', 'rustfs.upload_to_rustfs:upload_data', ('sample_data.csv', EMPLOYEE_KEY),
+         description='Upload to RustFS', timeout=300),
+    Step('load_postgres', 'rustfs.load_to_postgres:load_data', (EMPLOYEE_KEY, 'employees'),
+         depends_on=('upload_rustfs',), description='Load to PostgreSQL', timeout=900),
+    Step('unload_postgres', 'rustfs.unload_from_postgres:unload_to_s3', ('employees', 'exports/employees'),
+         depends_on=('load_postgres',), description='Unload PostgreSQL to Parquet', timeout=900,
+         optional=True),
+    Step('export_lake', 'rustfs.export_to_lake:export_to_lake', ('sample_data.csv', 'employees'),
+         description='Export employees to the Parquet lake', timeout=900, optional=True),
+    Step('setup_duckdb', 'duck_db.setup:setup_duckdb', description='Setup DuckDB', timeout=300),
+    Step('api_to_s3', 'API.api_to_s3:fetch_and_upload_pokemon_data',
+         description='Fetch and Upload Pokemon Data to S3', timeout=300),
+    Step('s3_to_duckdb', 's3_duckdb.s3_to_duckdb:load_s3_to_duckdb', ('nppes_sample.csv', 'nppes_sample'),
+         description='Load S3 CSV to DuckDB', timeout=1800),
+    # Pass the filename and table name as parameters to the refactored function
+    Step('s3_to_snowflake', 'Snowflake.s3_to_snowflake:load_s3_to_snowflake', ('nppes_sample.csv', 'NPPES_SAMPLE'),
+         description='Load S3 CSV to Snowflake', timeout=1800),
+]
+
+
+def parse_args(argv=None):
+    step_names = ', '.join(f"{step.name}{' (optional)' if step.optional else ''}" for step in STEPS)
+    parser = argparse.ArgumentParser(description="Run the data pipeline")
+    parser.add_argument('--only', action='append', default=[], metavar='STEP',
+                        help=f"Run only these steps (repeatable or comma separated): {step_names}")
+    parser.add_argument('--skip', action='append', default=[], metavar='STEP',
+                        help="Skip these steps (repeatable or comma separated)")
+    parser.add_argument('--dry-run', action='store_true',
+                        help="Print the planned schedule and exit")
+    parser.add_argument('--workers', type=int, default=int(os.getenv('PIPELINE_WORKERS', '4')),
+                        help="Maximum number of steps running at once (default: 4)")
+    parser.add_argument('--executor', choices=('thread', 'process'), default='thread',
+                        help="Run steps in a thread pool or a process pool (default: thread)")
+    parser.add_argument('--continue-on-error', action='store_true',
+                        help="Keep running independent steps after a failure instead of failing fast")
+    parser.add_argument('--metrics-jsonl', default=os.getenv('METRICS_JSONL'), metavar='PATH',
+                        help="Append every timed span and step as a JSON line to this file")
+    parser.add_argument('--metrics-prom', default=os.getenv('METRICS_PROMETHEUS_FILE'), metavar='PATH',
+                        help="Write per-step metrics to this Prometheus textfile at the end of the run")
+    args = parser.parse_args(argv)
+    args.only = [name.strip() for value in args.only for name in value.split(',') if name.strip()]
+    args.skip = [name.strip() for value in args.skip for name in value.split(',') if name.strip()]
+    return args
+
+
+def main(argv=None):
     """Orchestrate the complete data pipeline"""
+    args = parse_args(argv)
+
+    try:
+        steps = select_steps(STEPS, only=args.only, skip=args.skip)
+        plan = describe_plan(steps, args.workers, args.executor)
+    except ValueError as e:
+        logger.error(str(e))
+        sys.exit(2)
+
+    if args.dry_run:
+        print('\n'.join(plan))
+        return
+
+    if args.metrics_jsonl:
+        # Set in the environment so process pool workers write to it too
+        os.environ['METRICS_JSONL'] = args.metrics_jsonl
 
     logger.info("=" * 60)
     logger.info("DATA PIPELINE STARTING")
@@ -27,63 +96,48 @@ def main():
     logger.info(f"RustFS Endpoint: {rustfs_endpoint}")
     logger.info(f"Target Bucket: {bucket_name}")
     logger.info(f"PostgreSQL Host: {postgres_host}")
+    for line in plan:
+        logger.info(line)
 
-    try:
-        # Step 1: Upload to RustFS
-        logger.info("\n" + "=" * 60)
-        logger.info("STEP 1: Upload to RustFS")
-        logger.info("=" * 60)
-        # Pass the local file path and S3 key name to the refactored function
-        upload_data('sample_data.csv', 'employee_data.csv')
-
-        # Step 2: Load to PostgreSQL
-        logger.info("\n" + "=" * 60)
-        logger.info("STEP 2: Load to PostgreSQL")
-        logger.info("=" * 60)
-        load_data('employee_data.csv', 'employees')
-
-        # Step 3: Setup DuckDB
-        logger.info("\n" + "=" * 60)
-        logger.info("STEP 3: Setup DuckDB")
-        logger.info("=" * 60)
-        setup_duckdb()
-
-        # Step 4: Fetch and Upload Pokemon Data to S3
-        logger.info("\n" + "=" * 60)
-        logger.info("STEP 4: Fetch and Upload Pokemon Data to S3")
-        logger.info("=" * 60)
-        fetch_and_upload_pokemon_data()
-
-        # Step 5: Load S3 CSV to DuckDB
-        logger.info("\n" + "=" * 60)
-        logger.info("STEP 5: Load S3 CSV to DuckDB")
-        logger.info("=" * 60)
-        load_s3_to_duckdb('nppes_sample.csv', 'nppes_sample')
-
-        # Step 6: Load S3 CSV to Snowflake
-        logger.info("\n" + "=" * 60)
-        logger.info("STEP 6: Load S3 CSV to Snowflake")
-        logger.info("=" * 60)
-        # Pass the filename and table name as parameters to the refactored function
-        load_s3_to_snowflake('nppes_sample.csv', 'NPPES_SAMPLE')
-
-        logger.info("\n" + "=" * 60)
-        logger.info("PIPELINE COMPLETED SUCCESSFULLY")
-        logger.info("=" * 60)
-        logger.info(f"\nData loaded to 'employees' table (Postgres)")
-        logger.info(f"Data loaded to 'products' table (DuckDB)")
-        logger.info(f"Pokemon data uploaded to S3")
-        logger.info(f"NPPES sample data loaded to DuckDB from S3")
-        logger.info(f"NPPES sample data loaded to Snowflake from S3")
-        logger.info(f"Query using SQLTools in VSCode")
-
-    except Exception as e:
+    started = time.monotonic()
+    results = run_steps(steps, max_workers=args.workers, executor=args.executor,
+                        fail_fast=not args.continue_on_error)
+    wall_seconds = time.monotonic() - started
+
+    logger.info("\n" + "=" * 60)
+    logger.info("TIMING SUMMARY")
+    logger.info("=" * 60)
+    for line in summarize(steps, results, wall_seconds):
+        logger.info(line)
+    # Only report the cache when a step in this process used it
+    if 's3_cache' in sys.modules:
+        cache_stats = sys.modules['s3_cache'].cache_stats()
+        logger.info(f"S3 cache: {', '.join(f'{name}={value:,}' for name, value in cache_stats.items())}")
+
+    step_metrics = [{**result.metrics, 'status': result.status}
+                    for result in results.values() if result.metrics]
+    logger.info("\n" + "=" * 60)
+    logger.info("STEP BREAKDOWN")
+    logger.info("=" * 60)
+    for line in breakdown(step_metrics):
+        logger.info(line)
+    if args.metrics_prom:
+        write_prometheus(args.metrics_prom, step_metrics)
+
+    failed = [name for name, result in results.items() if result.status != SUCCEEDED]
+    if failed:
         logger.error("=" * 60)
         logger.error("PIPELINE FAILED")
         logger.error("=" * 60)
-        logger.error(f"Error: {e}", exc_info=True)
+        logger.error(f"Steps not completed: {', '.join(failed)}")
         sys.exit(1)
 
+    logger.info("\n" + "=" * 60)
+    logger.info("PIPELINE COMPLETED SUCCESSFULLY")
+    logger.info("=" * 60)
+    logger.info(f"Steps completed: {', '.join(step.description for step in steps)}")
+    logger.info(f"Query using SQLTools in VSCode")
+
 
 if __name__ == "__main__":
     main()
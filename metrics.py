@@ -0,0 +1,262 @@
+import os
+import sys
+import json
+import time
+import resource
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+from logger import logger
+
+load_dotenv()
+
+PROMETHEUS_PREFIX = 'de_review2'
+
+# The step being recorded and the names of the spans open around the caller.
+# asyncio tasks inherit both; worker threads only when started through
+# contextvars.copy_context().run, as submit_in_context does.
+_current_step = contextvars.ContextVar('metrics_step', default=None)
+_open_spans = contextvars.ContextVar('metrics_spans', default=())
+_write_lock = threading.Lock()
+
+
+class StepMetrics:
+    """Spans and counters recorded while one pipeline step runs
+
+    Spans are aggregated by their path ('write', 'write/copy', ...) into a
+    call count and total seconds, in the order they were first entered.
+    Thread-safe, so worker threads of a step can record into it.
+    """
+
+    def __init__(self, step):
+        self.step = step
+        self.spans = {}
+        self.counters = {}
+        self.seconds = 0.0
+        self.peak_rss_bytes = 0
+        self._lock = threading.Lock()
+
+    def enter_span(self, path):
+        with self._lock:
+            self.spans.setdefault(path, (0, 0.0))
+
+    def add_span(self, path, seconds):
+        with self._lock:
+            calls, total = self.spans.get(path, (0, 0.0))
+            self.spans[path] = (calls + 1, total + seconds)
+
+    def add(self, name, value):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def to_dict(self):
+        """Plain-data snapshot, safe to pickle back from a process pool worker"""
+        with self._lock:
+            return {
+                'step': self.step,
+                'seconds': self.seconds,
+                'peak_rss_bytes': self.peak_rss_bytes,
+                'spans': {path: {'calls': calls, 'seconds': seconds}
+                          for path, (calls, seconds) in self.spans.items()},
+                'counters': dict(self.counters),
+            }
+
+
+@contextmanager
+def step(name):
+    """Record every span and counter inside the block under a step name
+
+    Example:
+        with metrics.step('nightly_nppes') as recorded:
+            load_s3_to_duckdb('nppes_full.csv', 'nppes')
+        print(recorded.to_dict())
+    """
+    recorded = StepMetrics(name)
+    token = _current_step.set(recorded)
+    spans_token = _open_spans.set(())
+    started = time.perf_counter()
+    try:
+        yield recorded
+    finally:
+        recorded.seconds = time.perf_counter() - started
+        recorded.peak_rss_bytes = peak_rss_bytes()
+        _open_spans.reset(spans_token)
+        _current_step.reset(token)
+        _emit({'type': 'step', **recorded.to_dict()})
+
+
+def run_step(name, func, args=(), kwargs=None):
+    """Call func inside step(name); returns (func's result, metrics dict)
+
+    Module-level so the scheduler can submit it to a process pool.
+    """
+    with step(name) as recorded:
+        value = func(*args, **(kwargs or {}))
+    return value, recorded.to_dict()
+
+
+@contextmanager
+def span(name, **attributes):
+    """Time a phase of the current step (download, parse, ddl, write, ...)
+
+    Spans nest: a 'download' inside a 'read' span is recorded as
+    'read/download'. The yielded dict can be filled with attributes known
+    only at the end, e.g. a row count; they go to the JSON lines output.
+    """
+    names = _open_spans.get() + (name,)
+    path = '/'.join(names)
+    token = _open_spans.set(names)
+    recorded = _current_step.get()
+    if recorded is not None:
+        recorded.enter_span(path)
+    started = time.perf_counter()
+    try:
+        yield attributes
+    finally:
+        seconds = time.perf_counter() - started
+        _open_spans.reset(token)
+        if recorded is not None:
+            recorded.add_span(path, seconds)
+        _emit({'type': 'span', 'step': recorded.step if recorded else None,
+               'span': path, 'seconds': seconds, **attributes})
+
+
+def count(name, value=1):
+    """Add to a counter of the current step; a no-op outside of a step
+
+    The loaders report bytes_downloaded, bytes_uploaded, rows_parsed,
+    rows_written and retries.
+    """
+    recorded = _current_step.get()
+    if recorded is not None:
+        recorded.add(name, value)
+
+
+def submit_in_context(pool, fn, *args, **kwargs):
+    """Submit fn to an executor so that it records into the caller's step
+
+    Pool threads do not inherit context variables, so spans and counters
+    of a plain pool.submit belong to no step. fn runs in a copy of the
+    submitting thread's context instead, which also keeps the caller's
+    open spans as its parents. Returns the Future.
+    """
+    return pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def peak_rss_bytes():
+    """Peak resident set size of this process so far
+
+    With the thread executor all steps share one process, so this is the
+    peak of the run up to the end of the step rather than of the step alone.
+    On Linux ru_maxrss survives fork and exec, so a child would report its
+    parent's peak when that is higher; VmHWM belongs to this process alone.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def jsonl_path():
+    """JSON lines file spans and steps are appended to (METRICS_JSONL), or None"""
+    return os.getenv('METRICS_JSONL') or None
+
+
+def write_prometheus(path, steps):
+    """Write step metrics in the Prometheus text format for node_exporter's textfile collector
+
+    steps is a list of dicts as returned by StepMetrics.to_dict, optionally
+    with a 'status'. The file is replaced atomically so the collector never
+    reads a partial scrape.
+    """
+    def labels(**values):
+        return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in values.items()) + '}'
+
+    lines = [
+        f"# HELP {PROMETHEUS_PREFIX}_step_seconds Wall clock seconds of a pipeline step",
+        f"# TYPE {PROMETHEUS_PREFIX}_step_seconds gauge",
+    ]
+    for recorded in steps:
+        lines.append(f"{PROMETHEUS_PREFIX}_step_seconds"
+                     f"{labels(step=recorded['step'], status=recorded.get('status', 'succeeded'))} "
+                     f"{recorded['seconds']:.6f}")
+
+    lines += [
+        f"# HELP {PROMETHEUS_PREFIX}_step_peak_rss_bytes Peak resident set size at the end of a step",
+        f"# TYPE {PROMETHEUS_PREFIX}_step_peak_rss_bytes gauge",
+    ]
+    for recorded in steps:
+        lines.append(f"{PROMETHEUS_PREFIX}_step_peak_rss_bytes{labels(step=recorded['step'])} "
+                     f"{recorded['peak_rss_bytes']}")
+
+    lines += [
+        f"# HELP {PROMETHEUS_PREFIX}_span_seconds_total Seconds spent in a phase of a step",
+        f"# TYPE {PROMETHEUS_PREFIX}_span_seconds_total counter",
+    ]
+    for recorded in steps:
+        for span_path, timing in recorded['spans'].items():
+            lines.append(f"{PROMETHEUS_PREFIX}_span_seconds_total{labels(step=recorded['step'], span=span_path)} "
+                         f"{timing['seconds']:.6f}")
+    lines += [
+        f"# HELP {PROMETHEUS_PREFIX}_span_calls_total Times a phase of a step ran",
+        f"# TYPE {PROMETHEUS_PREFIX}_span_calls_total counter",
+    ]
+    for recorded in steps:
+        for span_path, timing in recorded['spans'].items():
+            lines.append(f"{PROMETHEUS_PREFIX}_span_calls_total{labels(step=recorded['step'], span=span_path)} "
+                         f"{timing['calls']}")
+
+    names = sorted({name for recorded in steps for name in recorded['counters']})
+    for name in names:
+        metric = f"{PROMETHEUS_PREFIX}_{name}_total"
+        lines += [f"# TYPE {metric} counter"]
+        for recorded in steps:
+            if name in recorded['counters']:
+                lines.append(f"{metric}{labels(step=recorded['step'])} {recorded['counters'][name]}")
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    os.replace(tmp_path, path)
+    logger.info(f"Wrote Prometheus metrics for {len(steps)} step(s) to {path}")
+
+
+def breakdown(steps):
+    """Return a per-step table of span times and counters as printable lines"""
+    lines = []
+    for recorded in steps:
+        step_seconds = recorded['seconds'] or 1e-9
+        lines.append(f"{recorded['step']}: {recorded['seconds']:.2f}s, "
+                     f"peak RSS {recorded['peak_rss_bytes'] / 1e6:,.0f} MB")
+        for span_path, timing in recorded['spans'].items():
+            indent = '  ' * span_path.count('/')
+            calls = f" x{timing['calls']}" if timing['calls'] > 1 else ''
+            lines.append(f"  {indent}{span_path.rsplit('/', 1)[-1]:<{24 - len(indent)}} {timing['seconds']:>8.2f}s "
+                         f"{timing['seconds'] / step_seconds:>5.0%}{calls}")
+        if recorded['counters']:
+            lines.append('  ' + ', '.join(f"{name}={value:,}" for name, value in sorted(recorded['counters'].items())))
+    return lines
+
+
+def _emit(record):
+    path = jsonl_path()
+    if not path:
+        return
+    line = json.dumps({'ts': datetime.now(timezone.utc).isoformat(), **record}, default=str)
+    with _write_lock:
+        with open(path, 'a') as f:
+            f.write(line + '\n')
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
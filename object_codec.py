@@ -0,0 +1,198 @@
+import io
+import os
+import gzip
+import shutil
+import tempfile
+from dotenv import load_dotenv
+from logger import logger
+
+load_dotenv()
+
+CODECS = ('gzip', 'zstd')
+EXTENSIONS = {'.gz': 'gzip', '.gzip': 'gzip', '.zst': 'zstd', '.zstd': 'zstd'}
+# Extension appended to the key of an object uploaded with a codec
+SUFFIXES = {'gzip': '.gz', 'zstd': '.zst'}
+DEFAULT_LEVELS = {'gzip': 6, 'zstd': 3}
+# Codec and level upload_data compresses with when the caller passes none;
+# unset, files are uploaded as they are
+UPLOAD_CODEC = os.getenv('OBJECT_CODEC') or None
+UPLOAD_LEVEL = int(os.getenv('OBJECT_CODEC_LEVEL')) if os.getenv('OBJECT_CODEC_LEVEL') else None
+# User metadata key (x-amz-meta-codec) recording the codec of an object
+CODEC_METADATA = 'codec'
+COPY_SIZE = 1024 * 1024
+
+# zstandard is imported inside the zstd functions, so gzip-only and raw
+# transfers work without it.
+
+
+def check_codec(codec):
+    if codec is not None and codec not in CODECS:
+        raise ValueError(f"Unknown codec '{codec}', expected one of {', '.join(CODECS)}")
+    return codec
+
+
+def codec_from_key(key):
+    """Codec implied by a key's extension ('data.csv.zst' -> 'zstd'), or None"""
+    return EXTENSIONS.get(os.path.splitext(key)[1].lower())
+
+
+def compressed_key(key, codec):
+    """Key of an object uploaded with codec ('data.csv' -> 'data.csv.zst')"""
+    if codec is None or codec_from_key(key) == codec:
+        return key
+    return key + SUFFIXES[codec]
+
+
+def detect_codec(key, metadata=None):
+    """Codec of an S3 object from its metadata or key extension
+
+    Pass the Metadata of a get_object or head_object response. Returns None
+    for objects stored as they are.
+    """
+    codec = (metadata or {}).get(CODEC_METADATA)
+    if codec in CODECS:
+        return codec
+    return codec_from_key(key)
+
+
+def head_codec(s3_client, bucket, key):
+    """Detect the codec of an object with one HEAD request"""
+    head = s3_client.head_object(Bucket=bucket, Key=key)
+    return detect_codec(key, head.get('Metadata'))
+
+
+def upload_args(codec, level=None):
+    """ExtraArgs for upload_file/put_object that record how an object is compressed
+
+    The codec only goes into user metadata (x-amz-meta-codec), never
+    Content-Encoding: HTTP clients and proxies may decode that transport
+    header on the way down, so a reader could not tell which bytes it got.
+    """
+    return {
+        'Metadata': {CODEC_METADATA: codec, f'{CODEC_METADATA}-level': str(_level(codec, level))},
+    }
+
+
+def compress_bytes(data, codec, level=None):
+    check_codec(codec)
+    if codec == 'gzip':
+        # mtime=0 keeps the output, and so the ETag, identical for identical input
+        return gzip.compress(data, compresslevel=_level(codec, level), mtime=0)
+    import zstandard
+    return zstandard.ZstdCompressor(level=_level(codec, level), threads=-1).compress(data)
+
+
+def decompress_bytes(data, codec):
+    if codec is None:
+        return data
+    with open_decompressed(io.BytesIO(data), codec) as stream:
+        return stream.read()
+
+
+def compress_file(local_file_path, codec, level=None):
+    """Compress a file into a temporary file next to it and return the temporary path
+
+    The file is streamed through the compressor, so memory use does not
+    depend on its size. The caller removes the returned file.
+    """
+    check_codec(codec)
+    directory = os.path.dirname(os.path.abspath(local_file_path))
+    fd, compressed_path = tempfile.mkstemp(prefix='.', suffix=f'.{codec}', dir=directory)
+    try:
+        with open(local_file_path, 'rb') as source, os.fdopen(fd, 'wb') as target:
+            if codec == 'gzip':
+                # filename='' and mtime=0 keep the gzip header free of the temp name and clock
+                with gzip.GzipFile(filename='', mode='wb', fileobj=target,
+                                   compresslevel=_level(codec, level), mtime=0) as compressed:
+                    shutil.copyfileobj(source, compressed, COPY_SIZE)
+            else:
+                import zstandard
+                compressor = zstandard.ZstdCompressor(level=_level(codec, level), threads=-1)
+                compressor.copy_stream(source, target, size=os.path.getsize(local_file_path),
+                                       read_size=COPY_SIZE, write_size=COPY_SIZE)
+    except BaseException:
+        os.remove(compressed_path)
+        raise
+
+    original, compressed = os.path.getsize(local_file_path), os.path.getsize(compressed_path)
+    logger.info(f"Compressed {local_file_path} with {codec} level {_level(codec, level)}: "
+                f"{original:,} -> {compressed:,} bytes ({original / max(compressed, 1):.1f}x)")
+    return compressed_path
+
+
+def open_decompressed(body, codec):
+    """Wrap a readable body (e.g. a get_object StreamingBody) in a DecodedStream"""
+    return DecodedStream(body, check_codec(codec))
+
+
+class DecodedStream(io.RawIOBase):
+    """Readable file object that decompresses a body as it is read
+
+    Nothing is buffered beyond what the codec needs, so an object of any
+    size can be streamed. With codec=None the body is passed through.
+    compressed_bytes_read counts the bytes taken from the body, i.e. what
+    crossed the network.
+    """
+
+    def __init__(self, body, codec=None):
+        super().__init__()
+        self.codec = codec
+        self._body = body
+        self.compressed_bytes_read = 0
+        if codec == 'gzip':
+            self._reader = gzip.GzipFile(fileobj=_Counting(self), mode='rb')
+        elif codec == 'zstd':
+            import zstandard
+            self._reader = zstandard.ZstdDecompressor().stream_reader(_Counting(self),
+                                                                      read_across_frames=True)
+        else:
+            self._reader = _Counting(self)
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            return self.readall()
+        return self._reader.read(size)
+
+    def readall(self):
+        chunks = []
+        while True:
+            chunk = self._reader.read(COPY_SIZE)
+            if not chunk:
+                return b''.join(chunks)
+            chunks.append(chunk)
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            try:
+                if self._reader is not None and not isinstance(self._reader, _Counting):
+                    self._reader.close()
+                self._body.close()
+            finally:
+                super().close()
+
+
+class _Counting:
+    """Read-through wrapper feeding a DecodedStream's byte count"""
+
+    def __init__(self, owner):
+        self._owner = owner
+
+    def read(self, size=-1):
+        data = self._owner._body.read(size) if size is not None and size >= 0 else self._owner._body.read()
+        self._owner.compressed_bytes_read += len(data)
+        return data
+
+    def close(self):
+        pass
+
+
+def _level(codec, level):
+    return DEFAULT_LEVELS[codec] if level is None else level
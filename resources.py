@@ -0,0 +1,192 @@
+import os
+import atexit
+import threading
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from logger import logger
+
+load_dotenv()
+
+# boto3, duckdb, psycopg2 and the Snowflake connector are imported inside the
+# functions that need them, so a step only pays for the clients it uses.
+
+# Process-wide clients and connections, created on first use
+_lock = threading.RLock()
+_sessions = {}
+_s3_clients = {}
+_duckdb_connections = {}
+_postgres_pool = None
+_snowflake_connection = None
+
+
+def _max_pool_connections():
+    return int(os.getenv("S3_MAX_POOL_CONNECTIONS", "32"))
+
+
+def get_aws_session(profile_name=None):
+    """Return the cached boto3 Session for an AWS profile (None = default chain)"""
+    import boto3
+
+    with _lock:
+        if profile_name not in _sessions:
+            _sessions[profile_name] = boto3.Session(profile_name=profile_name)
+        return _sessions[profile_name]
+
+
+def get_s3_client(profile_name=None, max_pool_connections=None):
+    """Return a cached S3 client for an AWS profile
+
+    boto3 clients are thread-safe, so one client per profile is shared by every
+    loader and worker thread. max_pool_connections sizes the urllib3 pool and
+    should be at least the number of threads transferring concurrently
+    (default: S3_MAX_POOL_CONNECTIONS or 32).
+    """
+    from botocore.client import Config
+
+    pool_size = max_pool_connections or _max_pool_connections()
+    cache_key = ("s3", profile_name, pool_size)
+    with _lock:
+        if cache_key not in _s3_clients:
+            session = get_aws_session(profile_name)
+            _s3_clients[cache_key] = session.client(
+                "s3", config=Config(max_pool_connections=pool_size)
+            )
+        return _s3_clients[cache_key]
+
+
+def get_rustfs_client(max_pool_connections=None):
+    """Return a cached S3 client configured for the RustFS endpoint"""
+    import boto3
+    from botocore.client import Config
+
+    pool_size = max_pool_connections or _max_pool_connections()
+    cache_key = ("rustfs", pool_size)
+    with _lock:
+        if cache_key not in _s3_clients:
+            _s3_clients[cache_key] = boto3.client(
+                "s3",
+                endpoint_url=os.getenv("RUSTFS_ENDPOINT"),
+                aws_access_key_id=os.getenv("RUSTFS_ROOT_USER"),
+                aws_secret_access_key=os.getenv("RUSTFS_ROOT_PASSWORD"),
+                config=Config(signature_version="s3v4", max_pool_connections=pool_size),
+                region_name="us-east-1",
+            )
+        return _s3_clients[cache_key]
+
+
+def get_postgres_pool():
+    """Return the process-wide psycopg2 ThreadedConnectionPool
+
+    Pool bounds come from POSTGRES_POOL_MIN (default 1) and
+    POSTGRES_POOL_MAX (default 8).
+    """
+    global _postgres_pool
+    from psycopg2.pool import ThreadedConnectionPool
+
+    with _lock:
+        if _postgres_pool is None or _postgres_pool.closed:
+            _postgres_pool = ThreadedConnectionPool(
+                int(os.getenv("POSTGRES_POOL_MIN", "1")),
+                int(os.getenv("POSTGRES_POOL_MAX", "8")),
+                host=os.getenv("POSTGRES_HOST"),
+                database=os.getenv("POSTGRES_DB"),
+                user=os.getenv("POSTGRES_USER"),
+                password=os.getenv("POSTGRES_PASSWORD"),
+                port=os.getenv("POSTGRES_PORT"),
+            )
+            logger.info("Opened PostgreSQL connection pool")
+        return _postgres_pool
+
+
+@contextmanager
+def postgres_connection():
+    """Borrow a connection from the pool and return it when the block exits
+
+    An exception rolls back the open transaction before the connection goes
+    back to the pool. Connections that were closed are discarded.
+
+    Example:
+        with postgres_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+    """
+    pool = get_postgres_pool()
+    conn = pool.getconn()
+    try:
+        yield conn
+    except Exception:
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        pool.putconn(conn, close=bool(conn.closed))
+
+
+def get_duckdb_connection(db_path):
+    """Return the cached DuckDB connection for a database file
+
+    Share it across threads by calling .cursor() on it per thread; the
+    cursor has its own transaction state and can be closed independently.
+    """
+    import duckdb
+
+    path = os.path.abspath(db_path)
+    with _lock:
+        if path not in _duckdb_connections:
+            _duckdb_connections[path] = duckdb.connect(path)
+            logger.info(f"Connected to DuckDB at {db_path}")
+        return _duckdb_connections[path]
+
+
+def get_snowflake_connection():
+    """Return the cached Snowflake connection, reconnecting if it was closed"""
+    global _snowflake_connection
+    import snowflake.connector
+
+    with _lock:
+        if _snowflake_connection is None or _snowflake_connection.is_closed():
+            _snowflake_connection = snowflake.connector.connect(
+                user=os.getenv('SNOWFLAKE_USER'),
+                password=os.getenv('SNOWFLAKE_PASSWORD'),
+                account=os.getenv('SNOWFLAKE_ACCOUNT'),
+                warehouse=os.getenv('SNOWFLAKE_WAREHOUSE'),
+                database=os.getenv('SNOWFLAKE_DATABASE'),
+                schema=os.getenv('SNOWFLAKE_SCHEMA'),
+                role=os.getenv('SNOWFLAKE_ROLE'),
+                client_session_keep_alive=True,
+            )
+            logger.info("Connected to Snowflake")
+        return _snowflake_connection
+
+
+def close_all():
+    """Close every cached connection and drop every cached client"""
+    global _postgres_pool, _snowflake_connection
+    with _lock:
+        for conn in _duckdb_connections.values():
+            conn.close()
+        _duckdb_connections.clear()
+        if _postgres_pool is not None and not _postgres_pool.closed:
+            _postgres_pool.closeall()
+        _postgres_pool = None
+        if _snowflake_connection is not None and not _snowflake_connection.is_closed():
+            _snowflake_connection.close()
+        _snowflake_connection = None
+        _s3_clients.clear()
+        _sessions.clear()
+
+
+def _forget_all():
+    """Drop inherited handles in a forked child without closing the parent's"""
+    global _lock, _postgres_pool, _snowflake_connection
+    _lock = threading.RLock()
+    _sessions.clear()
+    _s3_clients.clear()
+    _duckdb_connections.clear()
+    _postgres_pool = None
+    _snowflake_connection = None
+
+
+atexit.register(close_all)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_all)
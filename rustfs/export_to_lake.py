@@ -0,0 +1,179 @@
+import os
+import tempfile
+from urllib.parse import urlparse
+import polars as pl
+import pyarrow.dataset as ds
+from dotenv import load_dotenv
+from logger import logger
+from resources import get_rustfs_client, get_s3_client
+from s3_cache import read_csv_cached
+from rustfs.upload_to_rustfs import upload_many
+from metrics import span, count
+
+load_dotenv()
+
+LAKE_PREFIX = os.getenv("LAKE_PREFIX", "lake")
+ROW_GROUP_ROWS = int(os.getenv("LAKE_ROW_GROUP_ROWS", str(128 * 1024)))
+FILE_MAX_ROWS = int(os.getenv("LAKE_FILE_MAX_ROWS", str(4 * 1024 * 1024)))
+COMPRESSION_LEVEL = int(os.getenv("LAKE_ZSTD_LEVEL", "3"))
+UPLOAD_WORKERS = int(os.getenv("LAKE_UPLOAD_WORKERS", "8"))
+# Hive directory name for rows whose partition value is null
+NULL_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+# How each dataset is laid out in the lake. derive adds the partition
+# columns a dataset does not have as such; sort_by orders the rows inside a
+# partition so each row group covers a narrow range of those columns.
+LAKE_PRESETS = {
+    "employees": {
+        "partition_by": ["department"],
+        "sort_by": ["hire_date", "id"],
+    },
+    "nppes": {
+        "derive": {
+            "practice_state": pl.col("Provider Business Practice Location Address State Name"),
+            "last_update_month": pl.col("Last Update Date").str.to_date("%m/%d/%Y", strict=False)
+                                   .dt.strftime("%Y-%m"),
+        },
+        "partition_by": ["practice_state", "last_update_month"],
+        "sort_by": ["NPI"],
+    },
+}
+
+
+def export_to_lake(source, dataset, preset=None, partition_by=None, sort_by=None,
+                   prefix=None, row_group_rows=ROW_GROUP_ROWS):
+    """Write a dataset to RustFS as Hive-partitioned, zstd-compressed Parquet
+
+    Files land under s3://RUSTFS_BUCKET/{prefix}/{dataset}/col=value/...,
+    so DuckDB (read_parquet(..., hive_partitioning = true)), dbt and pyarrow
+    skip partitions a filter rules out, and the min/max statistics of the
+    sorted row groups let them skip most of the rest. The files are written
+    to a local staging directory and sent with upload_many. Partitions
+    present in the new data are replaced; other partitions are left as they are.
+
+    Args:
+        source: A Polars DataFrame, a local CSV or Parquet path
+                (e.g., 'sample_data.csv'), or an S3 URI read through the
+                S3 cache (e.g., 's3://bucket/Raines/nppes_sample.csv')
+        dataset: Name of the dataset directory in the lake (e.g., 'employees')
+        preset: Key of LAKE_PRESETS with the layout to use (default: dataset,
+                when it has a preset)
+        partition_by: Partition columns, overriding the preset's
+        sort_by: Columns rows are sorted by within a partition, overriding the preset's
+        prefix: Key prefix of the lake in the bucket (default: LAKE_PREFIX or 'lake')
+        row_group_rows: Rows per Parquet row group (default: 131072)
+
+    Returns:
+        Dict with the dataset 'uri', the 'rows' written, the object keys of the
+        'files' and their total 'bytes'
+
+    Example usage:
+        # Employees partitioned by department
+        export_to_lake('sample_data.csv', 'employees')
+
+        # NPPES partitioned by practice state and last update month
+        export_to_lake('s3://my-bucket/Raines/nppes_sample.csv', 'nppes')
+
+        # Anything else, with an explicit layout
+        export_to_lake(df, 'orders', partition_by=['order_date'], sort_by=['customer_id'])
+    """
+    if preset and preset not in LAKE_PRESETS:
+        raise ValueError(f"Unknown lake preset '{preset}', expected one of {', '.join(LAKE_PRESETS)}")
+    layout = LAKE_PRESETS.get(preset or dataset, {})
+    partition_by = partition_by if partition_by is not None else layout.get("partition_by", [])
+    sort_by = sort_by if sort_by is not None else layout.get("sort_by", [])
+
+    with span("read"):
+        df = _read_source(source)
+    if layout.get("derive"):
+        df = df.with_columns(**layout["derive"])
+    missing = [col for col in partition_by + sort_by if col not in df.columns]
+    if missing:
+        raise ValueError(f"Column(s) {', '.join(missing)} not found in the data for '{dataset}'")
+
+    with span("sort"):
+        # Partition columns first, so each partition is one contiguous slice
+        # and is written in order; the Hive directories carry their values
+        if partition_by or sort_by:
+            df = df.sort(partition_by + sort_by, nulls_last=True)
+        df = df.with_columns(pl.col(col).cast(pl.String).fill_null(NULL_PARTITION) for col in partition_by)
+        partitions = df.select(partition_by).n_unique() if partition_by else 1
+        table = df.to_arrow()
+
+    bucket = os.getenv("RUSTFS_BUCKET")
+    base_key = f"{prefix or LAKE_PREFIX}/{dataset}"
+
+    files = []
+    file_format = ds.ParquetFileFormat()
+    with tempfile.TemporaryDirectory(prefix=f"lake_{dataset}_") as staging_dir:
+        with span("write", dataset=dataset) as attributes:
+            ds.write_dataset(
+                table,
+                staging_dir,
+                format=file_format,
+                file_options=file_format.make_write_options(
+                    compression="zstd", compression_level=COMPRESSION_LEVEL, write_statistics=True
+                ),
+                partitioning=partition_by or None,
+                partitioning_flavor="hive" if partition_by else None,
+                basename_template="part-{i}.parquet",
+                max_rows_per_group=row_group_rows,
+                min_rows_per_group=min(row_group_rows, FILE_MAX_ROWS),
+                max_rows_per_file=FILE_MAX_ROWS,
+                max_partitions=max(1024, partitions),
+                preserve_order=True,
+                file_visitor=lambda written: files.append(written.path),
+            )
+            attributes["partitions"] = partitions
+            attributes["files"] = len(files)
+
+        # Files of unchanged partitions keep their ETag and are not sent again. The
+        # Parquet is already zstd-compressed, and DuckDB would not read it wrapped again
+        with span("publish"):
+            result = upload_many(staging_dir, prefix=base_key, max_workers=UPLOAD_WORKERS, codec=None)
+        size = sum(os.path.getsize(path) for path in files)
+        keys = {f"{base_key}/{os.path.relpath(path, staging_dir).replace(os.sep, '/')}" for path in files}
+
+    with span("prune"):
+        removed = _remove_stale(get_rustfs_client(), bucket, base_key, keys)
+
+    count("rows_written", len(df))
+    logger.info(f"Exported {len(df):,} rows of '{dataset}' to s3://{bucket}/{base_key} as {len(files)} "
+                f"Parquet file(s), {size:,} bytes ({len(result['uploaded'])} uploaded, "
+                f"{len(result['skipped'])} unchanged, {removed} stale removed)"
+                + (f", partitioned by {', '.join(partition_by)}" if partition_by else ""))
+    return {"uri": f"s3://{bucket}/{base_key}", "rows": len(df), "files": sorted(keys), "bytes": size}
+
+
+def _remove_stale(s3, bucket, base_key, keys):
+    """Delete objects in the written partition directories that this export did not produce
+
+    Partitions missing from the new data are left alone, so an export of
+    one month does not remove the others.
+    """
+    directories = {key.rsplit("/", 1)[0] for key in keys}
+    stale = []
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=f"{base_key}/"):
+        stale.extend(obj["Key"] for obj in page.get("Contents", [])
+                     if obj["Key"] not in keys and obj["Key"].rsplit("/", 1)[0] in directories)
+    for offset in range(0, len(stale), 1000):
+        s3.delete_objects(Bucket=bucket,
+                          Delete={"Objects": [{"Key": key} for key in stale[offset:offset + 1000]]})
+    return len(stale)
+
+
+def _read_source(source):
+    if isinstance(source, pl.DataFrame):
+        return source
+    if source.startswith("s3://"):
+        parsed = urlparse(source)
+        s3 = get_s3_client(os.getenv("AWS_PROFILE"))
+        return read_csv_cached(s3, parsed.netloc, parsed.path.lstrip("/"), infer_schema_length=None)
+    if source.endswith(".parquet"):
+        return pl.read_parquet(source)
+    return pl.read_csv(source, try_parse_dates=True, infer_schema_length=None)
+
+
+if __name__ == "__main__":
+    export_to_lake("sample_data.csv", "employees")
@@ -1,15 +1,29 @@
+import io
 import os
-import boto3
+import tempfile
 import polars as pl
-import psycopg2
-from botocore.client import Config
 from dotenv import load_dotenv
 from logger import logger
+from resources import get_rustfs_client, postgres_connection
+from type_maps import postgres_type
+from compaction import compact_frame
+from metrics import span, count
+from object_codec import detect_codec, open_decompressed
+from data_quality import check_frame
+from connectors import FrameSource, S3DownloadSource, PostgresSink, transfer
+from connectors.base import frame_batches
+from connectors.sinks import (CsvBatchStream, create_table_sql, copy_to_staging, merge_from_staging,
+                              postgres_table_exists)
 
 load_dotenv()
 
+# Bytes read from the RustFS body per COPY round trip in bulk mode
+DEFAULT_CHUNK_SIZE = 1024 * 1024
 
-def load_data(s3_key, table_name, primary_key_column="id", local_file_path=None):
+
+def load_data(s3_key, table_name, primary_key_column="id", local_file_path=None,
+              bulk=False, chunk_size=DEFAULT_CHUNK_SIZE, incremental=False, track_deletes=False,
+              compact=False, quality_model=None, on_quality="fail"):
     """
     Download data from RustFS and load into PostgreSQL
 
@@ -22,105 +36,308 @@ def load_data(s3_key, table_name, primary_key_column="id", local_file_path=None)
     primary_key_column : str, optional
         The column to use as primary key for upserts (default: 'id')
     local_file_path : str, optional
-        Where to save the downloaded file. If None, saves to /tmp/{s3_key}
+        Where to save the downloaded file. If None, saves to /tmp/{s3_key}.
+        Ignored in bulk mode, which never writes a local file.
+    bulk : bool, optional
+        Stream the object's bytes straight into COPY ... FROM STDIN on a
+        temporary staging table without parsing them into a frame, and
+        merge it with one INSERT ... ON CONFLICT statement (default: False).
+        Otherwise the file is parsed with Polars and its Arrow batches are
+        upserted through connectors.PostgresSink. Cannot be combined with
+        incremental.
+    chunk_size : int, optional
+        Bytes read from RustFS per COPY round trip in bulk mode (default: 1 MiB)
+    incremental : bool, optional
+        Hash every row's non-key columns and only send rows whose hash differs
+        from the one stored in the '{table_name}_row_hashes' sidecar table
+        (default: False). The first incremental run sends every row. Loads
+        without incremental drop the sidecar, so the next incremental run
+        after one also sends every row.
+    track_deletes : bool, optional
+        In incremental mode, also delete rows whose key is no longer in the
+        file (default: False)
+    compact : bool, optional
+        Narrow the frame's dtypes before loading and, when the load creates
+        the table, use the column types this finds, e.g. INTEGER, VARCHAR
+        or DECIMAL(38,2) (default: False). primary_key_column keeps its type.
+        Ignored in bulk mode, which never
+        builds a frame.
+    quality_model : str, optional
+        dbt model whose schema.yml tests (unique, not_null, accepted_values,
+        relationships) the frame must pass before anything is written, e.g.
+        'stg_employees' (default: None, no checks). Not available in bulk
+        mode, which never builds a frame.
+    on_quality : str, optional
+        What happens to rows failing those tests (default: 'fail')
+        'fail'       - raise DataQualityError and load nothing
+        'quarantine' - write them to DATA_QUALITY_QUARANTINE_DIR and load the rest
+        'warn'       - log them and load every row
+
+    Returns:
+    --------
+    dict or None
+        In incremental mode, counts of 'inserted', 'updated', 'unchanged' and
+        'deleted' rows
 
     Examples:
     ---------
     # Load employee data
     load_data('employee_data.csv', 'employees')
 
+    # Only send new and changed employees, removing ones no longer in the file
+    load_data('employee_data.csv', 'employees', incremental=True, track_deletes=True)
+
     # Load customer data with custom primary key
     load_data('customers.csv', 'customers', primary_key_column='customer_id')
 
     # Specify custom local path
     load_data('products.csv', 'products', local_file_path='/tmp/my_products.csv')
+
+    # Bulk load a large file with bounded memory
+    load_data('claims.csv', 'claims', primary_key_column='claim_id', bulk=True)
+
+    # Hold back employees that would fail the stg_employees dbt tests
+    load_data('employee_data.csv', 'employees', quality_model='stg_employees', on_quality='quarantine')
     """
-    # Default local path if not provided
-    if local_file_path is None:
-        local_file_path = f"/tmp/{s3_key}"
-
-    # Initialize S3 client
-    s3 = boto3.client(
-        "s3",
-        endpoint_url=os.getenv("RUSTFS_ENDPOINT"),
-        aws_access_key_id=os.getenv("RUSTFS_ROOT_USER"),
-        aws_secret_access_key=os.getenv("RUSTFS_ROOT_PASSWORD"),
-        config=Config(signature_version="s3v4"),
-        region_name="us-east-1",
-    )
-
-    # Download file from RustFS
+    if bulk and incremental:
+        raise ValueError("incremental needs a frame to hash and cannot be combined with bulk=True")
+    if bulk and quality_model:
+        raise ValueError("quality_model needs a frame and cannot be combined with bulk=True")
+
+    # Shared S3 client for RustFS
+    s3 = get_rustfs_client()
     bucket = os.getenv("RUSTFS_BUCKET")
-    s3.download_file(bucket, s3_key, local_file_path)
-    logger.info(f"Downloaded {s3_key} from RustFS to {local_file_path}")
-
-    # Read CSV with Polars
-    df = pl.read_csv(local_file_path)
-    logger.info(f"Loaded {len(df)} rows with Polars")
-
-    # Connect to Postgres
-    conn = psycopg2.connect(
-        host=os.getenv("POSTGRES_HOST"),
-        database=os.getenv("POSTGRES_DB"),
-        user=os.getenv("POSTGRES_USER"),
-        password=os.getenv("POSTGRES_PASSWORD"),
-    )
-    cur = conn.cursor()
 
-    # Generate table schema from Polars DataFrame
-    columns = []
-    for col_name, dtype in zip(df.columns, df.dtypes):
-        # Map Polars dtypes to PostgreSQL types
-        if dtype == pl.Int64 or dtype == pl.Int32:
-            pg_type = "INTEGER"
-        elif dtype == pl.Float64 or dtype == pl.Float32:
-            pg_type = "NUMERIC"
-        elif dtype == pl.Date:
-            pg_type = "DATE"
-        elif dtype == pl.Datetime:
-            pg_type = "TIMESTAMP"
-        elif dtype == pl.Boolean:
-            pg_type = "BOOLEAN"
+    # Borrow a pooled Postgres connection
+    with postgres_connection() as conn:
+        if incremental:
+            return _incremental_load(s3, bucket, s3_key, conn, table_name, primary_key_column,
+                                     track_deletes, compact, quality_model, on_quality)
+        if bulk:
+            _bulk_load(s3, bucket, s3_key, conn, table_name, primary_key_column, chunk_size)
         else:
-            pg_type = "TEXT"
+            _upsert_load(s3, bucket, s3_key, conn, table_name, primary_key_column, local_file_path,
+                      compact, quality_model, on_quality)
 
-        # Mark primary key column
-        if col_name == primary_key_column:
-            columns.append(f"{col_name} {pg_type} PRIMARY KEY")
-        else:
-            columns.append(f"{col_name} {pg_type}")
 
-    create_table_sql = f"""
-        CREATE TABLE IF NOT EXISTS {table_name} (
-            {', '.join(columns)}
-        )
-    """
-    cur.execute(create_table_sql)
+def _upsert_load(s3, bucket, s3_key, conn, table_name, primary_key_column, local_file_path,
+              compact=False, quality_model=None, on_quality="fail"):
+    """Download to a local file, read it with Polars and upsert its Arrow batches"""
+    df = S3DownloadSource(s3, bucket, s3_key, local_file_path).frame()
+
+    if quality_model:
+        df, _ = check_frame(df, quality_model, on_quality)
+
+    type_hints = None
+    if compact:
+        with span("compact"):
+            df, type_hints = compact_frame(df, keep=[primary_key_column])
+
+    transfer(FrameSource(df), PostgresSink(conn, table_name, primary_key_column, type_hints, commit=False))
+
+    cur = conn.cursor()
+    _drop_row_hashes(cur, table_name)
+    conn.commit()
+    cur.close()
+
+
+def _bulk_load(s3, bucket, s3_key, conn, table_name, primary_key_column, chunk_size):
+    """Stream the object into a staging table with COPY and merge it in one statement"""
+    response = s3.get_object(Bucket=bucket, Key=s3_key)
+    # COPY receives CSV; compressed objects are decompressed as they stream in
+    body = open_decompressed(response["Body"], detect_codec(s3_key, response.get("Metadata")))
+    logger.info(f"Streaming {s3_key} from RustFS in {chunk_size:,} byte chunks")
+
+    # Infer the schema from the leading rows exactly like pl.read_csv does
+    # (first 100 rows), then replay those bytes ahead of the rest of the body
+    with span("parse"):
+        sample = _read_sample(body, chunk_size)
+        if not sample:
+            logger.info(f"{s3_key} is empty, nothing to load")
+            return
+        schema = pl.read_csv(io.BytesIO(sample)).schema
+    columns = list(schema.keys())
+
+    cur = conn.cursor()
+
+    with span("ddl"):
+        cur.execute(create_table_sql(table_name, schema, primary_key_column))
     logger.info(f"Table '{table_name}' created/verified")
 
-    # Generate dynamic INSERT statement
-    column_names = ', '.join(df.columns)
-    placeholders = ', '.join(['%s'] * len(df.columns))
+    # The download streams into COPY, so it is timed as part of the write
+    stream = _PrefixedStream(sample, body)
+    with span("write", table=table_name):
+        staging_table = copy_to_staging(cur, table_name, columns, stream, chunk_size)
+        copied = cur.rowcount
+        merged = merge_from_staging(cur, table_name, staging_table, columns, primary_key_column)
+        _drop_row_hashes(cur, table_name)
 
-    # Build the ON CONFLICT clause for upsert
-    update_clauses = [f"{col} = EXCLUDED.{col}" for col in df.columns if col != primary_key_column]
+        conn.commit()
+    count("bytes_downloaded", body.compressed_bytes_read)
+    count("rows_parsed", copied)
+    count("rows_written", merged)
+    logger.info(f"Merged {merged:,} rows into '{table_name}' table")
+
+    cur.close()
 
-    insert_sql = f"""
-        INSERT INTO {table_name} ({column_names})
-        VALUES ({placeholders})
-        ON CONFLICT ({primary_key_column}) DO UPDATE SET
-            {', '.join(update_clauses)}
+
+def _incremental_load(s3, bucket, s3_key, conn, table_name, primary_key_column, track_deletes,
+                      compact=False, quality_model=None, on_quality="fail"):
+    """Send only inserted, changed and (optionally) deleted keys to Postgres
+
+    Row hashes are computed in Polars over the non-key columns and kept in a
+    '{table_name}_row_hashes' sidecar table. Polars does not promise stable
+    hashes across versions; after an upgrade every row is reported as
+    updated once, which is safe because the write is an upsert.
     """
+    # Polars maps the downloaded file instead of copying a response body
+    with tempfile.TemporaryDirectory(prefix="incremental_") as download_dir:
+        df = S3DownloadSource(s3, bucket, s3_key, os.path.join(download_dir, os.path.basename(s3_key))).frame()
 
-    # Insert data
-    for row in df.iter_rows():
-        cur.execute(insert_sql, row)
+    # Keep the last occurrence of a duplicated key, like the upsert of a full load
+    df = df.unique(subset=[primary_key_column], keep="last", maintain_order=True)
 
-    conn.commit()
-    logger.info(f"Inserted {len(df)} rows into '{table_name}' table")
+    # Quarantined rows are still in the file, so track_deletes leaves them in the table
+    file_keys = df.select(primary_key_column)
+    if quality_model:
+        df, _ = check_frame(df, quality_model, on_quality)
 
+    columns = df.columns
+    value_columns = [col for col in columns if col != primary_key_column]
+    hashes_table = f"{table_name}_row_hashes"
+    key_dtype = df.schema[primary_key_column]
+
+    with span("hash"):
+        hashes = df.select(
+            pl.col(primary_key_column),
+            pl.struct(value_columns or [primary_key_column]).hash(seed=0)
+            .reinterpret(signed=True).alias("row_hash"),
+        )
+
+    # Compact only after hashing so the stored hashes do not depend on it
+    type_hints = {}
+    if compact:
+        with span("compact"):
+            df, type_hints = compact_frame(df, keep=[primary_key_column])
+
+    cur = conn.cursor()
+
+    with span("ddl"):
+        # The hints only shape a table this load creates
+        if postgres_table_exists(cur, table_name):
+            type_hints = {}
+        cur.execute(create_table_sql(table_name, df.schema, primary_key_column, type_hints))
+        cur.execute(f"""
+            CREATE TABLE IF NOT EXISTS {hashes_table} (
+                {primary_key_column} {type_hints.get(primary_key_column) or postgres_type(key_dtype)} PRIMARY KEY,
+                row_hash BIGINT NOT NULL
+            )
+        """)
+    logger.info(f"Tables '{table_name}' and '{hashes_table}' created/verified")
+
+    with span("diff"):
+        stored_csv = io.BytesIO()
+        cur.copy_expert(
+            f"COPY {hashes_table} ({primary_key_column}, row_hash) TO STDOUT WITH (FORMAT csv, HEADER true)",
+            stored_csv,
+        )
+        stored_csv.seek(0)
+        stored = pl.read_csv(stored_csv, schema={primary_key_column: key_dtype, "row_hash": pl.Int64})
+
+        compared = hashes.join(stored, on=primary_key_column, how="left", suffix="_stored")
+        inserted = compared.filter(pl.col("row_hash_stored").is_null())
+        updated = compared.filter(pl.col("row_hash_stored").is_not_null()
+                                  & (pl.col("row_hash") != pl.col("row_hash_stored")))
+        deleted = (stored.join(file_keys, on=primary_key_column, how="anti")
+                   if track_deletes else stored.clear())
+
+    counts = {
+        "inserted": len(inserted),
+        "updated": len(updated),
+        "unchanged": len(df) - len(inserted) - len(updated),
+        "deleted": len(deleted),
+    }
+
+    with span("write", table=table_name):
+        changed_keys = pl.concat([inserted, updated]).select(primary_key_column)
+        if len(changed_keys):
+            changed_rows = df.join(changed_keys, on=primary_key_column, how="semi")
+            staging_table = copy_to_staging(cur, table_name, columns, _frame_to_csv(changed_rows))
+            merge_from_staging(cur, table_name, staging_table, columns, primary_key_column)
+
+            changed_hashes = hashes.join(changed_keys, on=primary_key_column, how="semi")
+            staging_table = copy_to_staging(cur, hashes_table, changed_hashes.columns,
+                                             _frame_to_csv(changed_hashes))
+            merge_from_staging(cur, hashes_table, staging_table, changed_hashes.columns,
+                                primary_key_column)
+
+        if len(deleted):
+            deleted_table = f"{table_name}_deleted_keys"
+            cur.execute(f"""
+                CREATE TEMP TABLE {deleted_table} ON COMMIT DROP AS
+                SELECT {primary_key_column} FROM {hashes_table} WITH NO DATA
+            """)
+            cur.copy_expert(
+                f"COPY {deleted_table} FROM STDIN WITH (FORMAT csv, HEADER true)",
+                _frame_to_csv(deleted.select(primary_key_column)),
+            )
+            for target in (table_name, hashes_table):
+                cur.execute(f"""
+                    DELETE FROM {target}
+                    USING {deleted_table}
+                    WHERE {target}.{primary_key_column} = {deleted_table}.{primary_key_column}
+                """)
+
+        conn.commit()
+    count("rows_written", counts["inserted"] + counts["updated"] + counts["deleted"])
     cur.close()
-    conn.close()
+
+    logger.info(f"Incremental load into '{table_name}': {counts['inserted']} inserted, "
+                f"{counts['updated']} updated, {counts['unchanged']} unchanged, "
+                f"{counts['deleted']} deleted")
+    return counts
+
+
+def _drop_row_hashes(cur, table_name):
+    """Drop the incremental sidecar of a table whose rows changed outside incremental mode
+
+    Its hashes no longer match the table, so the next incremental run would
+    skip rows the file changes back; without it that run sends every row.
+    """
+    cur.execute(f"DROP TABLE IF EXISTS {table_name}_row_hashes")
+
+
+def _frame_to_csv(df):
+    """Serialize a frame to a CSV file object for COPY, one Arrow batch at a time"""
+    return CsvBatchStream(frame_batches(df))
+
+
+def _read_sample(body, chunk_size):
+    """Read at least one chunk from the body, extended to the end of a line"""
+    sample = body.read(chunk_size)
+    while sample and not sample.endswith(b"\n"):
+        more = body.read(chunk_size)
+        if not more:
+            break
+        sample += more
+    return sample
+
+
+class _PrefixedStream:
+    """Read-only file object that replays already-read bytes before the body"""
+
+    def __init__(self, prefix, body):
+        self._prefix = prefix
+        self._body = body
+
+    def read(self, size=-1):
+        if self._prefix:
+            if size is None or size < 0:
+                data, self._prefix = self._prefix + self._body.read(), b""
+                return data
+            data, self._prefix = self._prefix[:size], self._prefix[size:]
+            return data
+        return self._body.read(size) if size and size > 0 else self._body.read()
 
 
 if __name__ == "__main__":
@@ -1,21 +1,16 @@
-import os
-import psycopg2
-from dotenv import load_dotenv
+from logger import logger
+from resources import postgres_connection
 
-# Load environment variables from .env file
-load_dotenv()
 
-conn = psycopg2.connect(
-    host=os.getenv("POSTGRES_HOST"),
-    database=os.getenv("POSTGRES_DB"),
-    user=os.getenv("POSTGRES_USER"),
-    password=os.getenv("POSTGRES_PASSWORD"),
-    port=os.getenv("POSTGRES_PORT")
-)
+def check_connection():
+    """Borrow a pooled PostgreSQL connection and log the server version"""
+    with postgres_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT version();")
+            version = cur.fetchone()[0]
+    logger.info(version)
+    return version
 
-cur = conn.cursor()
-cur.execute("SELECT version();")
-print(cur.fetchone())
 
-cur.close()
-conn.close()
+if __name__ == "__main__":
+    check_connection()
@@ -0,0 +1,301 @@
+import os
+import math
+import uuid
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+from dotenv import load_dotenv
+from logger import logger
+from resources import get_rustfs_client, get_postgres_pool, postgres_connection
+from s3_writer import MultipartUploadWriter
+from metrics import span, count, submit_in_context
+from sql_quoting import quote_identifier
+
+load_dotenv()
+
+# Rows per server-side cursor fetch, rows per Parquet row group, bytes per
+# block of COPY output parsed at a time, and splits unloaded concurrently
+BATCH_ROWS = int(os.getenv("UNLOAD_BATCH_ROWS", "50000"))
+ROW_GROUP_ROWS = int(os.getenv("UNLOAD_ROW_GROUP_ROWS", str(128 * 1024)))
+COPY_BLOCK_BYTES = int(os.getenv("UNLOAD_COPY_BLOCK_BYTES", str(8 * 1024 * 1024)))
+UNLOAD_WORKERS = int(os.getenv("UNLOAD_WORKERS", "4"))
+UNLOAD_METHODS = ("copy", "cursor")
+
+# Postgres type OIDs -> Arrow types; anything else is unloaded as text.
+# NUMERIC without a precision becomes float64, as the loaders map Float64
+# to NUMERIC on the way in.
+ARROW_TYPES = {
+    16: pa.bool_(),
+    20: pa.int64(),
+    21: pa.int16(),
+    23: pa.int32(),
+    700: pa.float32(),
+    701: pa.float64(),
+    1082: pa.date32(),
+    1083: pa.time64("us"),
+    1114: pa.timestamp("us"),
+    1184: pa.timestamp("us", tz="UTC"),
+}
+NUMERIC_OID = 1700
+
+
+def unload_to_s3(source, prefix, split_column=None, splits=1, method="copy", workers=UNLOAD_WORKERS,
+                 batch_rows=BATCH_ROWS, row_group_rows=ROW_GROUP_ROWS, compression="zstd",
+                 s3=None, bucket=None):
+    """Stream a Postgres table or query to RustFS/S3 as Parquet
+
+    Rows are never collected in Python lists: 'copy' pipes
+    COPY (query) TO STDOUT into pyarrow's streaming CSV reader, typed from
+    the query's column types, and 'cursor' fetches batch_rows at a time from
+    a server-side named cursor. Batches are gathered into row groups of
+    row_group_rows and written through a multipart upload, so memory holds
+    about one row group and one upload part whatever the size of the table.
+
+    With split_column, the range of that integer column is cut into splits
+    key ranges, each unloaded to its own file on its own pooled connection.
+    All of them read one exported snapshot, so the files add up to a
+    consistent copy of the source even while it is being written to.
+
+    Args:
+        source: Table name (e.g., 'employees' or 'public.employees') or a
+                SELECT query (e.g., 'SELECT * FROM employees WHERE salary > 50000')
+        prefix: Key prefix the files are written under as part-00000.parquet, ...
+                (e.g., 'exports/employees')
+        split_column: Integer column to split the unload on (default: None,
+                      a single file)
+        splits: Number of key ranges when split_column is set (default: 1)
+        method: 'copy' or 'cursor' (default: 'copy')
+        workers: Splits unloaded concurrently (default: UNLOAD_WORKERS or 4),
+                 at most POSTGRES_POOL_MAX - 1 since the coordinating
+                 transaction holds one pooled connection throughout
+        batch_rows: Rows per fetch when method='cursor' (default: 50,000)
+        row_group_rows: Rows per Parquet row group (default: 131072)
+        compression: Parquet compression codec (default: 'zstd')
+        s3: S3 client to write with (default: the RustFS client)
+        bucket: Bucket to write to (default: RUSTFS_BUCKET)
+
+    Returns:
+        Dict with the 'uri' of the prefix, the 'rows' written, the object
+        keys of the 'files' and their total 'bytes'
+
+    Example usage:
+        # One file, streamed through COPY
+        unload_to_s3('employees', 'exports/employees')
+
+        # Eight files over id ranges, four at a time
+        unload_to_s3('claims', 'exports/claims', split_column='claim_id', splits=8)
+    """
+    if method not in UNLOAD_METHODS:
+        raise ValueError(f"Unknown unload method '{method}', expected 'copy' or 'cursor'")
+    if splits > 1 and not split_column:
+        raise ValueError("splits > 1 needs a split_column")
+
+    # The pool raises instead of waiting when it is exhausted, so the splits
+    # must fit beside the coordinating connection before anything is exported
+    max_workers = get_postgres_pool().maxconn - 1
+    if splits > 1 and max_workers < 1:
+        raise ValueError("A split unload needs POSTGRES_POOL_MAX of at least 2, one connection for the "
+                         "snapshot and one per concurrent split")
+    if splits > 1 and workers > max_workers:
+        logger.warning(f"Unloading {max_workers} split(s) at a time instead of {workers}, "
+                       f"to stay within POSTGRES_POOL_MAX")
+        workers = max_workers
+
+    s3 = s3 or get_rustfs_client()
+    bucket = bucket or os.getenv("RUSTFS_BUCKET")
+    prefix = prefix.strip("/")
+    query = source if source.lstrip().lower().startswith(("select", "with")) else f"SELECT * FROM {source}"
+
+    # The coordinating transaction exports its snapshot and stays open until
+    # every split has read from it
+    with postgres_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        cur.execute("SELECT pg_export_snapshot()")
+        snapshot = cur.fetchone()[0]
+        schema = _arrow_schema(cur, query)
+        ranges = _key_ranges(cur, query, split_column, splits) if split_column else [None]
+        cur.close()
+
+        def unload_range(index, key_range):
+            key = f"{prefix}/part-{index:05d}.parquet"
+            return key, _unload_split(query, split_column, key_range, snapshot, schema, s3, bucket, key,
+                                      method, batch_rows, row_group_rows, compression)
+
+        with span("unload", source=source) as attributes:
+            if len(ranges) == 1:
+                results = [unload_range(0, ranges[0])]
+            else:
+                with ThreadPoolExecutor(max_workers=max(1, min(workers, len(ranges)))) as executor:
+                    futures = [submit_in_context(executor, unload_range, index, key_range)
+                               for index, key_range in enumerate(ranges)]
+                    results = [future.result() for future in futures]
+            attributes["files"] = len(results)
+        conn.rollback()
+
+    rows = sum(written_rows for _, (written_rows, _) in results)
+    size = sum(written_bytes for _, (_, written_bytes) in results)
+    keys = [key for key, _ in results]
+    with span("prune"):
+        removed = _remove_stale(s3, bucket, prefix, set(keys))
+
+    count("rows_written", rows)
+    logger.info(f"Unloaded {rows:,} rows of {source} to s3://{bucket}/{prefix} as {len(keys)} Parquet "
+                f"file(s), {size:,} bytes" + (f" ({removed} stale removed)" if removed else ""))
+    return {"uri": f"s3://{bucket}/{prefix}", "rows": rows, "files": keys, "bytes": size}
+
+
+def _unload_split(query, split_column, key_range, snapshot, schema, s3, bucket, key, method,
+                  batch_rows, row_group_rows, compression):
+    """Write the rows of one key range to one Parquet object; returns (rows, bytes)"""
+    if key_range is not None:
+        column = quote_identifier(split_column)
+        low, high, with_nulls = key_range
+        query = (f"SELECT * FROM ({query}) AS source WHERE ({column} >= {low} AND {column} < {high})"
+                 + (f" OR {column} IS NULL" if with_nulls else ""))
+
+    with postgres_connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+        cur.execute("SET TRANSACTION SNAPSHOT %s", (snapshot,))
+        cur.close()
+        batches = (_copy_batches(conn, query, schema) if method == "copy"
+                   else _cursor_batches(conn, query, schema, batch_rows))
+
+        rows = 0
+        with span("write", key=key), \
+                MultipartUploadWriter(s3, bucket, key, ContentType="application/vnd.apache.parquet") as out:
+            with pq.ParquetWriter(out, schema, compression=compression) as writer:
+                pending, pending_rows = [], 0
+                for batch in batches:
+                    pending.append(batch)
+                    pending_rows += batch.num_rows
+                    if pending_rows >= row_group_rows:
+                        writer.write_table(pa.Table.from_batches(pending, schema), row_group_size=row_group_rows)
+                        rows += pending_rows
+                        pending, pending_rows = [], 0
+                if pending:
+                    writer.write_table(pa.Table.from_batches(pending, schema), row_group_size=row_group_rows)
+                    rows += pending_rows
+            written = out.tell()
+        conn.rollback()
+
+    logger.info(f"Wrote {rows:,} rows to s3://{bucket}/{key}")
+    return rows, written
+
+
+def _copy_batches(conn, query, schema):
+    """Yield RecordBatches parsed from COPY (query) TO STDOUT as it streams in
+
+    COPY runs on a thread writing into an OS pipe that pyarrow reads from,
+    so the pipe's buffer and one parse block are all that is held at once.
+    """
+    read_fd, write_fd = os.pipe()
+    errors = []
+
+    def copy_out():
+        try:
+            with os.fdopen(write_fd, "wb") as pipe, conn.cursor() as cur:
+                cur.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv)", pipe)
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=contextvars.copy_context().run, args=(copy_out,), daemon=True)
+    thread.start()
+    try:
+        with os.fdopen(read_fd, "rb") as pipe:
+            try:
+                reader = pa_csv.open_csv(
+                    pipe,
+                    read_options=pa_csv.ReadOptions(column_names=schema.names, block_size=COPY_BLOCK_BYTES),
+                    convert_options=pa_csv.ConvertOptions(
+                        column_types=schema, true_values=["t"], false_values=["f"],
+                        # COPY writes NULL unquoted and an empty string as ""
+                        strings_can_be_null=True, quoted_strings_can_be_null=False,
+                    ),
+                )
+            except pa.ArrowInvalid as e:
+                if "Empty CSV" not in str(e):
+                    raise
+                reader = iter(())
+            for batch in reader:
+                yield batch
+    except Exception:
+        thread.join()
+        # A failed COPY cuts the stream short; its error explains the parse failure
+        if errors:
+            raise errors[0]
+        raise
+    finally:
+        # Closing the read end stops a COPY the reader gave up on with a broken pipe
+        thread.join()
+    if errors:
+        raise errors[0]
+
+
+def _cursor_batches(conn, query, schema, batch_rows):
+    """Yield RecordBatches of batch_rows rows fetched from a server-side cursor"""
+    # Text and unbounded NUMERIC columns are cast in Postgres, so they read exactly as COPY writes them
+    casts = {pa.string(): "text", pa.float64(): "float8"}
+    select_list = ', '.join(f"{quote_identifier(field.name)}::{casts[field.type]} AS {quote_identifier(field.name)}"
+                            if field.type in casts else quote_identifier(field.name) for field in schema)
+    with conn.cursor(name=f"unload_{uuid.uuid4().hex}") as cur:
+        cur.itersize = batch_rows
+        cur.execute(f"SELECT {select_list} FROM ({query}) AS source")
+        while True:
+            rows = cur.fetchmany(batch_rows)
+            if not rows:
+                return
+            yield pa.RecordBatch.from_arrays(
+                [pa.array(values, pa.string()) if field.type == pa.string()
+                 else pa.array(values).cast(field.type, safe=False)
+                 for values, field in zip(zip(*rows), schema)],
+                schema=schema,
+            )
+
+
+def _arrow_schema(cur, query):
+    """Arrow schema of a query's result, from the column types Postgres reports"""
+    cur.execute(f"SELECT * FROM ({query}) AS source LIMIT 0")
+    fields = []
+    for column in cur.description:
+        if column.type_code == NUMERIC_OID:
+            arrow_type = (pa.decimal128(column.precision, column.scale)
+                          if column.precision and column.precision <= 38 else pa.float64())
+        else:
+            arrow_type = ARROW_TYPES.get(column.type_code, pa.string())
+        fields.append(pa.field(column.name, arrow_type))
+    return pa.schema(fields)
+
+
+def _key_ranges(cur, query, split_column, splits):
+    """Cut [min, max] of split_column into splits half-open (low, high, with_nulls) ranges"""
+    column = quote_identifier(split_column)
+    cur.execute(f"SELECT MIN({column}), MAX({column}) FROM ({query}) AS source")
+    low, high = cur.fetchone()
+    if low is None:
+        return [None]
+    if not isinstance(low, int):
+        raise ValueError(f"split_column '{split_column}' must be an integer column, got {type(low).__name__}")
+    step = max(1, math.ceil((high - low + 1) / max(1, splits)))
+    # Rows with a null key go with the first range
+    return [(start, start + step, start == low) for start in range(low, high + 1, step)]
+
+
+def _remove_stale(s3, bucket, prefix, keys):
+    """Delete part files under the prefix left by an earlier unload with more splits"""
+    stale = []
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=f"{prefix}/part-"):
+        stale.extend(obj["Key"] for obj in page.get("Contents", []) if obj["Key"] not in keys)
+    for offset in range(0, len(stale), 1000):
+        s3.delete_objects(Bucket=bucket,
+                          Delete={"Objects": [{"Key": key} for key in stale[offset:offset + 1000]]})
+    return len(stale)
+
+
+if __name__ == "__main__":
+    unload_to_s3("employees", "exports/employees")
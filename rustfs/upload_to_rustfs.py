@@ -1,13 +1,30 @@
 import os
-import boto3
-from botocore.client import Config
+import glob
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from boto3.s3.transfer import TransferConfig
+from botocore.exceptions import ClientError
 from dotenv import load_dotenv
 from logger import logger
+from resources import get_rustfs_client
+from metrics import span, count, submit_in_context
+from object_codec import UPLOAD_CODEC, UPLOAD_LEVEL, check_codec, compress_file, compressed_key, upload_args
 
 load_dotenv()
 
+# Multipart defaults, matching boto3's own defaults
+DEFAULT_PART_SIZE = 8 * 1024 * 1024
+DEFAULT_CONCURRENCY = 10
 
-def upload_data(local_file_path, s3_key=None, create_bucket_if_needed=True):
+# Buckets already verified in this process
+_known_buckets = set()
+_bucket_lock = threading.Lock()
+
+
+def upload_data(local_file_path, s3_key=None, create_bucket_if_needed=True,
+                list_after=True, list_prefix=None, skip_unchanged=False,
+                codec=UPLOAD_CODEC, level=UPLOAD_LEVEL):
     """Upload CSV data to RustFS bucket
 
     Args:
@@ -15,6 +32,21 @@ def upload_data(local_file_path, s3_key=None, create_bucket_if_needed=True):
         s3_key: Name to use for the file in S3 (e.g., 'employee_data.csv')
                 If not provided, uses the basename of local_file_path
         create_bucket_if_needed: Whether to attempt creating the bucket if it doesn't exist (default: True)
+                                 The bucket is only checked once per process
+        list_after: Whether to log the bucket contents after the upload (default: True)
+        list_prefix: Only list keys under this prefix (default: the whole bucket)
+        skip_unchanged: Skip the upload when the object's ETag already matches
+                        the local file (default: False)
+        codec: Compress the file with 'zstd' or 'gzip' on the way up
+               (default: OBJECT_CODEC, unset = send it as it is). The key
+               gets a '.zst' or '.gz' suffix and the codec is recorded in
+               the object's metadata; every loader decompresses such
+               objects as it reads them.
+        level: Compression level, trading CPU for bytes (default:
+               OBJECT_CODEC_LEVEL, else 3 for zstd and 6 for gzip)
+
+    Returns:
+        The S3 key the file was uploaded to
 
     Example usage:
         # Upload with custom S3 key name
@@ -23,62 +55,226 @@ def upload_data(local_file_path, s3_key=None, create_bucket_if_needed=True):
         # Upload using the same filename
         upload_data('customers.csv')  # Will be uploaded as 'customers.csv'
 
-        # Upload multiple files
-        files = [
+        # Send a large CSV zstd-compressed, as 'nppes_full.csv.zst'
+        upload_data('nppes_full.csv', codec='zstd', level=6)
+
+        # Upload multiple files concurrently (see upload_many)
+        upload_many([
             ('sample_data.csv', 'employee_data.csv'),
             ('products.csv', 'product_data.csv'),
             ('orders.csv', 'order_data.csv')
-        ]
-        for local_file, s3_name in files:
-            upload_data(local_file, s3_name)
+        ])
     """
 
-    # Initialize S3 client for RustFS using credentials from environment variables
-    s3 = boto3.client(
-        "s3",
-        endpoint_url=os.getenv("RUSTFS_ENDPOINT"),
-        aws_access_key_id=os.getenv("RUSTFS_ROOT_USER"),
-        aws_secret_access_key=os.getenv("RUSTFS_ROOT_PASSWORD"),
-        config=Config(signature_version="s3v4"),
-        region_name="us-east-1",
-    )
+    # Shared S3 client for RustFS using credentials from environment variables
+    s3 = get_rustfs_client()
 
     bucket = os.getenv("RUSTFS_BUCKET")
 
     # Create bucket if needed and if create_bucket_if_needed is True
     if create_bucket_if_needed:
-        try:
-            s3.create_bucket(Bucket=bucket)
-            logger.info(f"Created bucket: {bucket}")
-        except:
-            logger.info(f"Bucket {bucket} already exists")
+        ensure_bucket(s3, bucket)
 
     # If s3_key is not provided, use the basename of the local file
     if s3_key is None:
         s3_key = os.path.basename(local_file_path)
+    s3_key = compressed_key(s3_key, check_codec(codec))
 
     # Upload the file using the provided parameters
-    s3.upload_file(local_file_path, bucket, s3_key)
-    logger.info(f"Uploaded {s3_key} from {local_file_path}")
+    _upload_one(s3, bucket, local_file_path, s3_key, _transfer_config(), skip_unchanged, codec, level)
 
     # List files
-    objects = s3.list_objects_v2(Bucket=bucket)
-    file_count = len(objects.get("Contents", []))
-    logger.info(f"Bucket contains {file_count} file(s)")
-    for obj in objects.get("Contents", []):
-        logger.info(f"  - {obj['Key']}")
+    if list_after:
+        log_bucket_contents(s3, bucket, list_prefix)
+    return s3_key
+
+
+def upload_many(sources, prefix='', create_bucket_if_needed=True, skip_unchanged=True,
+                max_workers=8, part_size=DEFAULT_PART_SIZE, max_concurrency=DEFAULT_CONCURRENCY,
+                list_after=False, codec=UPLOAD_CODEC, level=UPLOAD_LEVEL):
+    """Upload many files to RustFS concurrently
+
+    Args:
+        sources: A directory, a glob pattern (e.g., 'exports/*.csv'), a list of
+                 paths/patterns, or a list of (local_file_path, s3_key) tuples
+        prefix: Key prefix for files given without an explicit key. Files found
+                under a directory keep their relative path below the prefix.
+        create_bucket_if_needed: Check/create the bucket once before uploading (default: True)
+        skip_unchanged: Skip files whose MD5/multipart ETag already matches the
+                        object in the bucket (default: True)
+        max_workers: Number of files uploaded at the same time (default: 8)
+        part_size: Multipart threshold and part size in bytes (default: 8 MiB)
+        max_concurrency: Concurrent part uploads per file (default: 10)
+        list_after: Log the keys under prefix after the batch (default: False)
+        codec: Compress each file with 'zstd' or 'gzip' and suffix its key, as in
+               upload_data (default: OBJECT_CODEC, unset = send them as they are)
+        level: Compression level (default: OBJECT_CODEC_LEVEL, else the codec's default)
+
+    Returns:
+        Dict with the 'uploaded' and 'skipped' S3 keys
+
+    Example usage:
+        upload_many('exports/*.csv', prefix='daily/2024-06-01')
+        upload_many([('sample_data.csv', 'employee_data.csv')], skip_unchanged=False)
+    """
+    files = [(path, compressed_key(key, check_codec(codec))) for path, key in _resolve_sources(sources, prefix)]
+    if not files:
+        logger.info("No files matched, nothing to upload")
+        return {"uploaded": [], "skipped": []}
+
+    # Every worker can hold max_concurrency connections at once
+    s3 = get_rustfs_client(max_pool_connections=max(32, max_workers * max_concurrency))
+    bucket = os.getenv("RUSTFS_BUCKET")
+    if create_bucket_if_needed:
+        ensure_bucket(s3, bucket)
+
+    config = _transfer_config(part_size, max_concurrency)
+    logger.info(f"Uploading {len(files)} file(s) with {max_workers} worker(s), "
+                f"{part_size:,} byte parts, {max_concurrency} part(s) in flight per file")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [submit_in_context(pool, _upload_one, s3, bucket, local_file_path, s3_key, config,
+                                     skip_unchanged, codec, level)
+                   for local_file_path, s3_key in files]
+        uploaded = [future.result() for future in futures]
+
+    result = {
+        "uploaded": [key for (_, key), done in zip(files, uploaded) if done],
+        "skipped": [key for (_, key), done in zip(files, uploaded) if not done],
+    }
+    logger.info(f"Uploaded {len(result['uploaded'])} file(s), skipped {len(result['skipped'])} unchanged")
+
+    if list_after:
+        log_bucket_contents(s3, bucket, prefix)
+    return result
+
+
+def ensure_bucket(s3, bucket):
+    """Create the bucket if it does not exist; checked once per process"""
+    with _bucket_lock:
+        if bucket in _known_buckets:
+            return
+        try:
+            s3.head_bucket(Bucket=bucket)
+            logger.info(f"Bucket {bucket} already exists")
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") not in ("404", "NoSuchBucket", "NotFound"):
+                raise
+            s3.create_bucket(Bucket=bucket)
+            logger.info(f"Created bucket: {bucket}")
+        _known_buckets.add(bucket)
+
+
+def log_bucket_contents(s3, bucket, prefix=None):
+    """Log every key under prefix, following list_objects_v2 pagination"""
+    paginator = s3.get_paginator("list_objects_v2")
+    params = {"Bucket": bucket}
+    if prefix:
+        params["Prefix"] = prefix
+
+    keys = [obj["Key"]
+            for page in paginator.paginate(**params)
+            for obj in page.get("Contents", [])]
+    scope = f" under '{prefix}'" if prefix else ""
+    logger.info(f"Bucket contains {len(keys)} file(s){scope}")
+    for key in keys:
+        logger.info(f"  - {key}")
+    return keys
+
+
+def local_etag(local_file_path, part_size=DEFAULT_PART_SIZE):
+    """Compute the ETag S3 assigns to this file when uploaded with part_size
+
+    Single-part uploads get the MD5 of the content; multipart uploads get the
+    MD5 of the concatenated part MD5s followed by '-<part count>'.
+    """
+    size = os.path.getsize(local_file_path)
+    # boto3 grows the part size so an upload never exceeds 10,000 parts
+    while size > part_size * 10000:
+        part_size *= 2
+
+    with open(local_file_path, "rb") as f:
+        if size < part_size:
+            return hashlib.md5(f.read()).hexdigest()
+        digests = [hashlib.md5(chunk).digest() for chunk in iter(lambda: f.read(part_size), b"")]
+    return f"{hashlib.md5(b''.join(digests)).hexdigest()}-{len(digests)}"
+
+
+def _transfer_config(part_size=DEFAULT_PART_SIZE, max_concurrency=DEFAULT_CONCURRENCY):
+    return TransferConfig(
+        multipart_threshold=part_size,
+        multipart_chunksize=part_size,
+        max_concurrency=max_concurrency,
+        use_threads=True,
+    )
+
+
+def _upload_one(s3, bucket, local_file_path, s3_key, config, skip_unchanged, codec=None, level=None):
+    """Upload one file, compressed with codec if given; returns False when it was skipped as unchanged"""
+    upload_path, extra_args = local_file_path, None
+    if codec:
+        with span("compress", key=s3_key):
+            upload_path = compress_file(local_file_path, codec, level)
+        extra_args = upload_args(codec, level)
+
+    try:
+        if skip_unchanged:
+            try:
+                remote_etag = s3.head_object(Bucket=bucket, Key=s3_key)["ETag"].strip('"')
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") not in ("404", "NoSuchKey", "NotFound"):
+                    raise
+                remote_etag = None
+            if remote_etag and remote_etag == local_etag(upload_path, config.multipart_chunksize):
+                logger.info(f"Skipped {s3_key}, unchanged since the last upload")
+                return False
+
+        with span("upload", key=s3_key):
+            s3.upload_file(upload_path, bucket, s3_key, Config=config, ExtraArgs=extra_args)
+        count("bytes_uploaded", os.path.getsize(upload_path))
+        logger.info(f"Uploaded {s3_key} from {local_file_path}" + (f" ({codec})" if codec else ""))
+        return True
+    finally:
+        if upload_path != local_file_path:
+            os.remove(upload_path)
+
+
+def _resolve_sources(sources, prefix):
+    """Expand directories and glob patterns into (local_file_path, s3_key) pairs"""
+    if isinstance(sources, (str, os.PathLike)):
+        sources = [sources]
+
+    def key_for(relative_path):
+        relative_path = relative_path.replace(os.sep, "/")
+        return f"{prefix.rstrip('/')}/{relative_path}" if prefix else relative_path
+
+    files = []
+    for source in sources:
+        if isinstance(source, tuple):
+            files.append(source)
+        elif os.path.isdir(source):
+            for root, _, names in os.walk(source):
+                for name in sorted(names):
+                    path = os.path.join(root, name)
+                    files.append((path, key_for(os.path.relpath(path, source))))
+        else:
+            matches = sorted(glob.glob(source, recursive=True)) if glob.has_magic(source) else [source]
+            files.extend((path, key_for(os.path.basename(path)))
+                         for path in matches if os.path.isfile(path))
+    return files
 
 
 if __name__ == "__main__":
     # Example 1: Upload with custom S3 key name
     upload_data('sample_data.csv', 'employee_data.csv')
 
-    # Example 2: Upload multiple files in a loop
+    # Example 2: Upload multiple files concurrently, skipping unchanged ones
     # Uncomment the code below to upload multiple files
-    # files_to_upload = [
+    # upload_many([
     #     ('sample_data.csv', 'employee_data.csv'),
     #     ('customers.csv', 'customer_data.csv'),
     #     ('products.csv', 'product_data.csv')
-    # ]
-    # for local_file, s3_name in files_to_upload:
-    #     upload_data(local_file, s3_name, create_bucket_if_needed=False)  # Only create bucket once
+    # ])
+
+    # Example 3: Upload every CSV in a directory under a prefix
+    # upload_many('exports/*.csv', prefix='daily', max_workers=16, part_size=16 * 1024 * 1024)
@@ -0,0 +1,272 @@
+import os
+import mmap
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+import polars as pl
+from dotenv import load_dotenv
+from logger import logger
+from metrics import span, count
+from object_codec import detect_codec, open_decompressed
+from s3_download import download_to_file
+
+load_dotenv()
+
+# Object bodies kept mapped in memory, bytes kept on disk, and parsed frames kept in memory
+MEMORY_MAX_BYTES = int(os.getenv("S3_CACHE_MEMORY_BYTES", str(512 * 1024 * 1024)))
+DISK_MAX_BYTES = int(os.getenv("S3_CACHE_MAX_BYTES", str(2 * 1024 * 1024 * 1024)))
+MAX_FRAMES = int(os.getenv("S3_CACHE_MAX_FRAMES", "8"))
+CACHE_DIR = os.path.expanduser(os.getenv("S3_CACHE_DIR", "~/.cache/de_review2/s3"))
+# Files still being written next to the entries: downloads, their resume
+# state and temp files renamed into place once complete
+IN_PROGRESS_SUFFIXES = (".download", ".part", ".part.json", ".tmp")
+# Bytes decompressed per read when caching a compressed object
+COPY_SIZE = 1024 * 1024
+
+_lock = threading.Lock()
+_inflight = {}
+_memory = OrderedDict()
+_memory_bytes = 0
+_frames = OrderedDict()
+_stats = {
+    "memory_hits": 0,
+    "disk_hits": 0,
+    "misses": 0,
+    "frame_hits": 0,
+    "frame_misses": 0,
+    "evictions": 0,
+    "bytes_downloaded": 0,
+    "bytes_served_from_cache": 0,
+}
+
+
+def object_version(s3_client, bucket, key):
+    """Return a content address for the object from its ETag, size and Last-Modified"""
+    head = s3_client.head_object(Bucket=bucket, Key=key)
+    etag = head["ETag"].strip('"')
+    raw = f"{etag}:{head['ContentLength']}:{head['LastModified'].isoformat()}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def get_object_bytes(s3_client, bucket, key, version=None):
+    """Return the object body, served from memory or disk when the ETag is unchanged
+
+    Objects uploaded with a codec (see object_codec) are returned
+    decompressed. The body is a read-only mmap of the cached file, not a
+    copy in Python bytes: it supports len(), slicing and the buffer
+    protocol, and its pages are shared with the OS page cache. Every call
+    costs one HEAD request.
+    """
+    version = version or object_version(s3_client, bucket, key)
+
+    data = _memory_get(version)
+    if data is not None:
+        _count("memory_hits", bytes_served=len(data))
+        logger.info(f"Cache hit (memory) for s3://{bucket}/{key}: {len(data):,} bytes")
+        return data
+
+    data = _map(get_object_path(s3_client, bucket, key, version))
+    _memory_put(version, data)
+    return data
+
+
+def get_object_path(s3_client, bucket, key, version=None):
+    """Return the path of the object in the on-disk cache, downloading it on a miss
+
+    Objects uploaded with a codec are stored decompressed. Pass the path to
+    pl.read_csv, which maps the file itself, so the body never becomes a
+    Python bytes object. Concurrent callers asking for the same object share
+    one download.
+    """
+    version = version or object_version(s3_client, bucket, key)
+
+    with _lock:
+        inflight = _inflight.setdefault(version, threading.Lock())
+
+    try:
+        with inflight:
+            return _fetch(s3_client, bucket, key, version)
+    finally:
+        with _lock:
+            _inflight.pop(version, None)
+
+
+def _fetch(s3_client, bucket, key, version):
+    path = _disk_path(version)
+    try:
+        # mtime doubles as the LRU timestamp
+        os.utime(path)
+        size = os.path.getsize(path)
+    except FileNotFoundError:
+        pass
+    else:
+        _count("disk_hits", bytes_served=size)
+        logger.info(f"Cache hit (disk) for s3://{bucket}/{key}: {size:,} bytes")
+        return path
+
+    # Ranges are written straight into the file that becomes the cache entry;
+    # an interrupted download resumes from it on the next call
+    codec_path = f"{path}.download"
+    logger.info(f"Downloading s3://{bucket}/{key} to {path}")
+    head = s3_client.head_object(Bucket=bucket, Key=key)
+    codec = detect_codec(key, head.get("Metadata"))
+    download_to_file(s3_client, bucket, key, codec_path if codec else path, head=head)
+    _count("misses", bytes_downloaded=head["ContentLength"])
+
+    if codec:
+        # Compressed objects are cached decompressed, ready to parse, one
+        # COPY_SIZE block at a time
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with span("decompress", key=key), open(codec_path, "rb") as f, \
+                    open_decompressed(f, codec) as stream, open(tmp_path, "wb") as out:
+                shutil.copyfileobj(stream, out, COPY_SIZE)
+            os.replace(tmp_path, path)
+        finally:
+            for leftover in (codec_path, tmp_path):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+        logger.info(f"Decompressed {codec} to {os.path.getsize(path):,} bytes")
+
+    _evict_disk(keep=path)
+    return path
+
+
+def read_csv_cached(s3_client, bucket, key, version=None, **read_options):
+    """Return pl.read_csv of an S3 object, reusing parsed frames for unchanged objects
+
+    Frames are cached per object version and read options. Polars frames are
+    immutable, so callers can share the cached frame safely. Pass version when
+    it is already known to save the HEAD request.
+    """
+    version = version or object_version(s3_client, bucket, key)
+    frame_key = (version, tuple(sorted((name, repr(value)) for name, value in read_options.items())))
+
+    with _lock:
+        df = _frames.get(frame_key)
+        if df is not None:
+            _frames.move_to_end(frame_key)
+            _stats["frame_hits"] += 1
+    if df is not None:
+        logger.info(f"Cache hit (parsed frame) for s3://{bucket}/{key}")
+        return df
+
+    path = get_object_path(s3_client, bucket, key, version)
+    with span("parse", key=key) as attributes:
+        df = pl.read_csv(path, **read_options)
+        attributes["rows"] = len(df)
+    count("rows_parsed", len(df))
+    with _lock:
+        _stats["frame_misses"] += 1
+        _frames[frame_key] = df
+        while len(_frames) > MAX_FRAMES:
+            _frames.popitem(last=False)
+            _stats["evictions"] += 1
+    return df
+
+
+def cache_stats():
+    """Return a snapshot of the hit/miss/eviction counters and current sizes"""
+    with _lock:
+        stats = dict(_stats)
+        stats["memory_bytes"] = _memory_bytes
+        stats["frames"] = len(_frames)
+    stats["disk_bytes"] = sum(size for _, size, _ in _disk_entries())
+    return stats
+
+
+def clear_cache(disk=False):
+    """Drop the in-memory caches, and the on-disk store too if disk=True"""
+    global _memory_bytes
+    with _lock:
+        _memory.clear()
+        _frames.clear()
+        _memory_bytes = 0
+    if disk:
+        for path, _, _ in _disk_entries():
+            os.remove(path)
+
+
+def _count(name, bytes_downloaded=0, bytes_served=0):
+    with _lock:
+        _stats[name] += 1
+        _stats["bytes_downloaded"] += bytes_downloaded
+        _stats["bytes_served_from_cache"] += bytes_served
+
+
+def _memory_get(version):
+    with _lock:
+        data = _memory.get(version)
+        if data is not None:
+            _memory.move_to_end(version)
+        return data
+
+
+def _memory_put(version, data):
+    global _memory_bytes
+    if len(data) > MEMORY_MAX_BYTES:
+        return
+    with _lock:
+        if version in _memory:
+            return
+        _memory[version] = data
+        _memory_bytes += len(data)
+        while _memory_bytes > MEMORY_MAX_BYTES:
+            _, evicted = _memory.popitem(last=False)
+            _memory_bytes -= len(evicted)
+            _stats["evictions"] += 1
+
+
+def _disk_path(version):
+    return os.path.join(CACHE_DIR, version[:2], version)
+
+
+def _disk_entries():
+    """Yield (path, size, last_used) for every finished object in the on-disk store
+
+    Files another step is still writing are skipped, so eviction and
+    clear_cache never pull a download out from under it.
+    """
+    if not os.path.isdir(CACHE_DIR):
+        return
+    for root, _, files in os.walk(CACHE_DIR):
+        for name in files:
+            if name.endswith(IN_PROGRESS_SUFFIXES):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            yield path, stat.st_size, stat.st_mtime
+
+
+def _map(path):
+    """Map a cached file read-only; the mapping outlives the file if it is evicted"""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _evict_disk(keep=None):
+    """Remove the least recently used entries over DISK_MAX_BYTES, never keep
+
+    keep is the entry just handed to a caller, so an object larger than the
+    whole budget is still served and only evicted by the next download.
+    """
+    entries = sorted(_disk_entries(), key=lambda entry: entry[2])
+    total = sum(size for _, size, _ in entries)
+    for path, size, _ in entries:
+        if total <= DISK_MAX_BYTES:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            continue
+        total -= size
+        with _lock:
+            _stats["evictions"] += 1
@@ -0,0 +1,154 @@
+import os
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import BotoCoreError, ClientError
+from dotenv import load_dotenv
+from logger import logger
+from metrics import span, count, submit_in_context
+
+load_dotenv()
+
+# Bytes per ranged GET, concurrent GETs per object, and retries of one range
+RANGE_SIZE = int(os.getenv("S3_RANGE_BYTES", str(8 * 1024 * 1024)))
+RANGE_WORKERS = int(os.getenv("S3_RANGE_WORKERS", "8"))
+RANGE_RETRIES = int(os.getenv("S3_RANGE_RETRIES", "3"))
+# Bytes copied from a response body into the file at a time
+READ_SIZE = 256 * 1024
+
+_state_lock = threading.Lock()
+
+
+def download_to_file(s3_client, bucket, key, path, head=None, range_size=RANGE_SIZE, workers=RANGE_WORKERS,
+                     retries=RANGE_RETRIES):
+    """Download an object into a preallocated file with concurrent ranged GETs
+
+    Each range is written at its offset of {path}.part, so no part of the
+    object is held in memory, and the file is renamed to path once
+    complete. Finished ranges are recorded in {path}.part.json, so a
+    download that was interrupted resumes with the missing ranges as long
+    as the object's ETag has not changed. Returns the head_object response.
+
+    Args:
+        s3_client: boto3 S3 client
+        bucket: Bucket of the object
+        key: Key of the object (e.g., 'Raines/nppes_sample.csv')
+        path: Local file to write
+        head: head_object response of the object, when already fetched
+        range_size: Bytes per ranged GET (default: S3_RANGE_BYTES or 8 MiB)
+        workers: Concurrent ranged GETs (default: S3_RANGE_WORKERS or 8)
+        retries: Retries of a failed range before giving up (default: S3_RANGE_RETRIES or 3)
+    """
+    head = head or s3_client.head_object(Bucket=bucket, Key=key)
+    size = head["ContentLength"]
+    part_path, state_path = f"{path}.part", f"{path}.part.json"
+    state = {"etag": head["ETag"], "size": size, "range_size": range_size, "done": []}
+
+    previous = _read_state(state_path)
+    if previous and os.path.exists(part_path) and all(previous.get(name) == state[name]
+                                                      for name in ("etag", "size", "range_size")):
+        state["done"] = previous["done"]
+        logger.info(f"Resuming s3://{bucket}/{key}: {len(state['done'])} range(s) already downloaded")
+    else:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(part_path, "wb") as f:
+            f.truncate(size)
+        _write_state(state_path, state)
+
+    fd = os.open(part_path, os.O_WRONLY)
+    try:
+        _download_ranges(s3_client, bucket, key, head, lambda offset, chunk: os.pwrite(fd, chunk, offset),
+                         range_size, workers, retries, done=state["done"],
+                         on_range=lambda start: _record(state_path, state, start))
+    finally:
+        os.close(fd)
+
+    os.replace(part_path, path)
+    os.remove(state_path)
+    return head
+
+
+def _download_ranges(s3_client, bucket, key, head, write, range_size, workers, retries, done=(), on_range=None):
+    size = head["ContentLength"]
+    done = set(done)
+    starts = [start for start in range(0, size, range_size) if start not in done]
+
+    def fetch(start):
+        fetched = _fetch_range(s3_client, bucket, key, head["ETag"], write, start,
+                               min(start + range_size, size), retries)
+        if on_range:
+            on_range(start)
+        return fetched
+
+    with span("download", key=key) as attributes:
+        if len(starts) <= 1 or workers <= 1:
+            fetched = sum(fetch(start) for start in starts)
+        else:
+            with ThreadPoolExecutor(max_workers=min(workers, len(starts))) as executor:
+                futures = [submit_in_context(executor, fetch, start) for start in starts]
+                fetched = sum(future.result() for future in futures)
+        attributes["ranges"] = len(starts)
+    count("bytes_downloaded", fetched)
+    logger.info(f"Downloaded {fetched:,} of {size:,} bytes of s3://{bucket}/{key} "
+                f"in {len(starts)} range(s)")
+    return fetched
+
+
+def _fetch_range(s3_client, bucket, key, etag, write, start, end, retries):
+    """Pass bytes start..end-1 of the object to write(offset, chunk)
+
+    A failed attempt is retried from the first byte not yet received, so
+    only the remainder of the range is requested again. IfMatch makes a
+    range fail rather than mix two versions of an object that changed
+    mid-download.
+    """
+    offset, attempt = start, 0
+    while True:
+        try:
+            response = s3_client.get_object(Bucket=bucket, Key=key, Range=f"bytes={offset}-{end - 1}",
+                                            IfMatch=etag)
+            body = response["Body"]
+            while offset < end:
+                chunk = body.read(min(READ_SIZE, end - offset))
+                if not chunk:
+                    raise IOError(f"Range of s3://{bucket}/{key} ended at byte {offset:,} of {end:,}")
+                write(offset, chunk)
+                offset += len(chunk)
+            return end - start
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("PreconditionFailed", "412"):
+                raise
+            error = e
+        except (BotoCoreError, OSError) as e:
+            error = e
+        attempt += 1
+        if attempt > retries:
+            raise error
+        count("retries")
+        logger.warning(f"Range {start:,}-{end - 1:,} of s3://{bucket}/{key} failed at byte {offset:,} "
+                       f"({error}); retry {attempt} of {retries}")
+        time.sleep(min(0.5 * 2 ** (attempt - 1), 10))
+
+
+def _record(state_path, state, start):
+    # Written ranges are in the page cache once pwrite returns, so they
+    # survive the process being killed; only a machine crash can lose them
+    with _state_lock:
+        state["done"].append(start)
+        _write_state(state_path, state)
+
+
+def _read_state(state_path):
+    try:
+        with open(state_path) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write_state(state_path, state):
+    tmp_path = f"{state_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, state_path)
@@ -1,15 +1,35 @@
 import os
-import io
-import boto3
-from dotenv import load_dotenv
+import fnmatch
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from urllib.parse import urlparse
 import polars as pl
-import duckdb
+from dotenv import load_dotenv
 from logger import logger
+from resources import get_aws_session, get_s3_client, get_duckdb_connection
+from schema_registry import resolve_schema
+from s3_stream import DEFAULT_CHUNK_BYTES
+from compaction import compact_frame
+from data_quality import check_frame
+from metrics import span, count, submit_in_context
+from sql_quoting import sql_literal
+from object_codec import detect_codec, head_codec, decompress_bytes, EXTENSIONS
+from connectors import FrameSource, S3CsvSource, DuckDBSink, transfer
+from connectors.sinks import write_table, add_missing_columns
 
 load_dotenv()
 
+WRITE_MODES = ('create', 'replace', 'append', 'upsert')
+PREFIX_WRITE_MODES = ('replace', 'append', 'upsert')
+# Keys and ETags of the objects load_s3_prefix_to_duckdb has written, per table
+MANIFEST_TABLE = 's3_ingest_manifest'
+PREFIX_WORKERS = int(os.getenv('S3_PREFIX_WORKERS', '8'))
+SHARD_SUFFIXES = ('.csv', '.parquet') + tuple(f'.csv{extension}' for extension in EXTENSIONS)
+
 
-def load_s3_to_duckdb(filename, table_name, db_path=None, use_prefix=True):
+def load_s3_to_duckdb(filename, table_name, db_path=None, use_prefix=True,
+                      engine='polars', mode='create', key_columns=None, df=None,
+                      use_registry=True, on_drift='raise', compact=False, stream=False,
+                      chunk_bytes=DEFAULT_CHUNK_BYTES, quality_model=None, on_quality='fail'):
     """
     Retrieve CSV from S3, load into memory with Polars, and write to DuckDB
 
@@ -23,6 +43,50 @@ def load_s3_to_duckdb(filename, table_name, db_path=None, use_prefix=True):
         Path to the DuckDB database file. If None, uses 's3_duckdb/{table_name}.duckdb'
     use_prefix : bool, optional
         Whether to use the S3_FOLDER_PREFIX from env vars (default: True)
+    engine : str, optional
+        'polars' downloads the object into memory and parses it with Polars.
+        'duckdb' lets DuckDB read the object straight from S3 through httpfs
+        with its own parallel CSV/Parquet reader (default: 'polars')
+    mode : str, optional
+        How rows are written to the table (default: 'create')
+        'create'  - create the table from the data only if it does not exist
+        'replace' - drop and recreate the table from the data
+        'append'  - insert the data into the table, creating it if needed
+        'upsert'  - replace rows whose key_columns match, insert the rest
+    key_columns : list of str, optional
+        Columns identifying a row, required when mode='upsert'
+    df : polars.DataFrame, optional
+        A frame that is already in memory. It is handed to DuckDB as Arrow
+        without copying and nothing is downloaded from S3.
+    use_registry : bool, optional
+        Parse with the types registered for this file's header in the schema
+        registry instead of scanning the whole file to infer them; only a new
+        header is inferred, from a sample (default: True)
+    on_drift : str, optional
+        What to do when the header differs from the registered one
+        (default: 'raise'). 'evolve' registers the new header and, for
+        mode='append' or 'upsert', adds the new columns to the table.
+    compact : bool, optional
+        Narrow the frame's dtypes before the Arrow handoff and, when the load
+        creates or replaces the table, use the column types this finds,
+        e.g. INTEGER or DECIMAL(38,2) (default: False). key_columns keep
+        their type. Only applies to frames.
+    stream : bool, optional
+        Read the object in chunks and write each parsed batch as it arrives
+        instead of materializing the whole file, so files larger than memory
+        can be loaded (default: False). Download, parsing and writing run
+        concurrently with bounded queues in between. Polars engine only.
+    chunk_bytes : int, optional
+        Bytes of CSV per batch when stream=True (default: 64 MiB)
+    quality_model : str, optional
+        dbt model whose schema.yml tests the frame must pass before it is
+        written, e.g. 'stg_nppes_providers' (default: None, no checks).
+        Only applies to frames, so not to engine='duckdb' or stream=True.
+    on_quality : str, optional
+        What happens to rows failing those tests (default: 'fail')
+        'fail'       - raise DataQualityError and write nothing
+        'quarantine' - write them to DATA_QUALITY_QUARANTINE_DIR and load the rest
+        'warn'       - log them and load every row
 
     Examples:
     ---------
@@ -34,7 +98,32 @@ def load_s3_to_duckdb(filename, table_name, db_path=None, use_prefix=True):
 
     # Specify custom database path
     load_s3_to_duckdb('products.csv', 'products', db_path='data/my_products.duckdb')
+
+    # Let DuckDB scan S3 directly and refresh the table on every run
+    load_s3_to_duckdb('nppes_sample.csv', 'nppes_sample', engine='duckdb', mode='replace')
+
+    # Merge a new drop into an existing table by NPI
+    load_s3_to_duckdb('nppes_update.csv', 'nppes_sample', mode='upsert', key_columns=['NPI'])
+
+    # Load the full NPPES file in 128 MiB batches without holding it in memory
+    load_s3_to_duckdb('nppes_full.csv', 'nppes', stream=True, chunk_bytes=128 * 1024 * 1024)
+
+    # Refuse a drop that would fail the dbt tests of the staging model
+    load_s3_to_duckdb('nppes_sample.csv', 'nppes_sample', quality_model='stg_nppes_providers')
     """
+    if engine not in ('polars', 'duckdb'):
+        raise ValueError(f"Unknown engine '{engine}', expected 'polars' or 'duckdb'")
+    if mode not in WRITE_MODES:
+        raise ValueError(f"Unknown write mode '{mode}', expected one of {', '.join(WRITE_MODES)}")
+    if mode == 'upsert' and not key_columns:
+        raise ValueError("key_columns is required when mode='upsert'")
+    if stream and (engine != 'polars' or df is not None or compact):
+        raise ValueError("stream=True reads the object with Polars and cannot be combined with "
+                         "engine='duckdb', df or compact")
+    if quality_model and (engine != 'polars' or stream):
+        raise ValueError("quality_model checks a frame and cannot be combined with "
+                         "engine='duckdb' or stream=True")
+
     # Default database path if not provided
     if db_path is None:
         db_path = f's3_duckdb/{table_name}.duckdb'
@@ -50,36 +139,343 @@ def load_s3_to_duckdb(filename, table_name, db_path=None, use_prefix=True):
     else:
         s3_key = filename
 
-    # Download from S3 to memory
-    session = boto3.Session(profile_name=aws_profile)
-    s3_client = session.client('s3')
-
-    logger.info(f"Downloading s3://{s3_bucket}/{s3_key} to memory")
+    # Write to DuckDB through a cursor on the shared connection
+    conn = get_duckdb_connection(db_path).cursor()
 
-    csv_buffer = io.BytesIO()
-    s3_client.download_fileobj(s3_bucket, s3_key, csv_buffer)
-    csv_buffer.seek(0)
-
-    logger.info(f"Downloaded {csv_buffer.getbuffer().nbytes:,} bytes")
-
-    # Read CSV with Polars
-    # Use infer_schema_length=None to scan entire file for accurate type detection
-    df = pl.read_csv(csv_buffer, infer_schema_length=None)
-    logger.info(f"Loaded {len(df):,} rows x {len(df.columns)} columns")
-    logger.info(
-        f"Columns: {', '.join(df.columns[:5])}{'...' if len(df.columns) > 5 else ''}")
+    if engine == 'duckdb' and df is None:
+        configure_s3_access(conn, get_aws_session(aws_profile))
+        source_sql = s3_scan_sql(f"s3://{s3_bucket}/{s3_key}",
+                                 codec=head_codec(get_s3_client(aws_profile), s3_bucket, s3_key))
+        logger.info(f"Scanning s3://{s3_bucket}/{s3_key} with DuckDB httpfs")
+        with span('write', table=table_name, mode=mode):
+            written = write_table(conn, table_name, source_sql, mode, key_columns)
+        if written is not None:
+            count('rows_written', written)
+            logger.info(f"Wrote {written:,} rows to '{table_name}' (mode={mode})")
+    else:
+        # Polars reads the object (reusing the cached download and parsed frame
+        # when its ETag has not changed) and DuckDB scans its Arrow batches
+        source = FrameSource(df) if df is not None else S3CsvSource(
+            get_s3_client(aws_profile), s3_bucket, s3_key,
+            dataset=os.path.splitext(filename)[0] if use_registry else None, on_drift=on_drift,
+            stream=stream, chunk_bytes=chunk_bytes)
 
-    # Write to DuckDB
-    conn = duckdb.connect(db_path)
+        type_hints = None
+        if not stream:
+            df = source.frame()
+            logger.info(
+                f"Columns: {', '.join(df.columns[:5])}{'...' if len(df.columns) > 5 else ''}")
+            if quality_model:
+                df, _ = check_frame(df, quality_model, on_quality)
+            if compact:
+                with span('compact'):
+                    df, type_hints = compact_frame(df, keep=key_columns or ())
+            source = FrameSource(df)
 
-    conn.execute(f"CREATE TABLE IF NOT EXISTS {table_name} AS SELECT * FROM df")
+        transfer(source, DuckDBSink(conn, table_name, mode, key_columns, type_hints,
+                                    evolve=use_registry and on_drift == 'evolve'))
 
     row_count = conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
-    logger.info(f"Wrote {row_count:,} rows to DuckDB table '{table_name}'")
+    logger.info(f"DuckDB table '{table_name}' now holds {row_count:,} rows")
 
     conn.close()
     logger.info(f"Data saved to {db_path}")
 
 
+def load_s3_prefix_to_duckdb(pattern, table_name, db_path=None, use_prefix=True, mode='append',
+                             key_columns=None, dataset=None, use_registry=True, on_drift='raise',
+                             workers=PREFIX_WORKERS):
+    """
+    Load every S3 object under a prefix or glob into one DuckDB table
+
+    The prefix is listed page by page, objects are downloaded and parsed by a
+    pool of worker threads, and each parsed shard is written by the calling
+    thread as an Arrow handoff as soon as it is ready. Every written object is
+    recorded with its ETag in the s3_ingest_manifest table of the same
+    database, so a rerun only loads new or changed objects. A changed object
+    is appended again in full; use mode='upsert' for shards that get rewritten.
+
+    Parameters:
+    -----------
+    pattern : str
+        A key prefix ending in '/' (e.g., 'daily/') or a glob (e.g.,
+        'daily/nppes_2024-*.csv'). As with fnmatch, '*' also matches '/'.
+        CSV (also .csv.gz / .csv.zst) and Parquet objects are loaded;
+        other keys are skipped.
+    table_name : str
+        The name of the DuckDB table to load into
+    db_path : str, optional
+        Path to the DuckDB database file. If None, uses 's3_duckdb/{table_name}.duckdb'
+    use_prefix : bool, optional
+        Whether to put the S3_FOLDER_PREFIX from env vars in front of the pattern (default: True)
+    mode : str, optional
+        How shards are written to the table (default: 'append')
+        'append'  - insert new shards, creating the table if needed
+        'upsert'  - replace rows whose key_columns match, insert the rest
+        'replace' - drop the table and its manifest entries, then load every
+                    shard, all in one transaction, so a failed listing or
+                    shard leaves the old table and manifest in place
+    key_columns : list of str, optional
+        Columns identifying a row, required when mode='upsert'
+    dataset : str, optional
+        Schema registry dataset the CSV shards are parsed with (default: table_name)
+    use_registry : bool, optional
+        Parse CSV shards with the registered types instead of inferring each
+        one separately, so all shards agree on their column types (default: True)
+    on_drift : str, optional
+        What to do when a shard's header differs from the registered one
+        (default: 'raise'). 'evolve' adds the new columns to the table.
+    workers : int, optional
+        Objects downloaded and parsed concurrently (default: S3_PREFIX_WORKERS or 8)
+
+    Returns:
+    --------
+    dict
+        'loaded' and 'skipped' object keys and the number of 'rows' written
+
+    Examples:
+    ---------
+    # Pick up the daily NPPES shards that have not been loaded yet
+    load_s3_prefix_to_duckdb('daily/nppes_*.csv', 'nppes')
+
+    # Reload everything under a prefix with 16 download threads
+    load_s3_prefix_to_duckdb('exports/2024/', 'claims', mode='replace', workers=16)
+    """
+    if mode not in PREFIX_WRITE_MODES:
+        raise ValueError(f"Unknown write mode '{mode}', expected one of {', '.join(PREFIX_WRITE_MODES)}")
+    if mode == 'upsert' and not key_columns:
+        raise ValueError("key_columns is required when mode='upsert'")
+
+    if db_path is None:
+        db_path = f's3_duckdb/{table_name}.duckdb'
+
+    aws_profile = os.getenv('AWS_PROFILE')
+    s3_bucket = os.getenv('S3_BUCKET_NAME')
+    s3_prefix = os.getenv('S3_FOLDER_PREFIX', '')
+    if use_prefix and s3_prefix:
+        pattern = f"{s3_prefix}/{pattern}"
+
+    workers = max(1, workers)
+    s3 = get_s3_client(aws_profile, max_pool_connections=max(32, workers))
+    conn = get_duckdb_connection(db_path).cursor()
+    ensure_manifest(conn)
+
+    replace = mode == 'replace'
+    if replace:
+        conn.execute("BEGIN TRANSACTION")
+        conn.execute(f"DROP TABLE IF EXISTS {table_name}")
+        conn.execute(f"DELETE FROM {MANIFEST_TABLE} WHERE table_name = ?", [table_name])
+    try:
+        result = _load_objects(conn, s3, s3_bucket, pattern, table_name, mode, key_columns,
+                               dataset or table_name, use_registry, on_drift, workers)
+        if replace:
+            conn.execute("COMMIT")
+    except Exception:
+        if replace:
+            conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+    count('rows_written', result['rows'])
+    logger.info(f"Wrote {result['rows']:,} rows from {len(result['loaded'])} object(s) to '{table_name}' "
+                f"(mode={mode}), skipped {len(result['skipped'])} already loaded")
+    return result
+
+
+def _load_objects(conn, s3, s3_bucket, pattern, table_name, mode, key_columns, dataset, use_registry,
+                  on_drift, workers):
+    """List the objects matching pattern and write the ones the manifest does not hold yet"""
+    with span('list', pattern=pattern) as attributes:
+        objects = list_objects(s3, s3_bucket, pattern)
+        attributes['objects'] = len(objects)
+    ingested = dict(conn.execute(
+        f"SELECT key, etag FROM {MANIFEST_TABLE} WHERE table_name = ?", [table_name]
+    ).fetchall())
+    pending_objects = [obj for obj in objects if ingested.get(obj['Key']) != obj['ETag']]
+    result = {
+        'loaded': [],
+        'skipped': [obj['Key'] for obj in objects if ingested.get(obj['Key']) == obj['ETag']],
+        'rows': 0,
+    }
+    logger.info(f"Matched {len(objects)} object(s) for s3://{s3_bucket}/{pattern}, "
+                f"{len(pending_objects)} not loaded yet")
+    if not pending_objects:
+        return result
+
+    with span('write', table=table_name, mode=mode):
+        # At most 2 * workers parsed shards wait for the writer at a time
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            objects_left = iter(pending_objects)
+            pending = set()
+            while True:
+                for obj in objects_left:
+                    pending.add(submit_in_context(pool, read_shard, s3, s3_bucket, obj,
+                                                  dataset if use_registry else None, on_drift))
+                    if len(pending) >= 2 * workers:
+                        break
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    # result() re-raises a failed download or parse
+                    obj, df, drift = future.result()
+                    written = write_shard(conn, table_name, obj, df, mode, key_columns,
+                                          evolve=bool(drift and drift['added']),
+                                          in_transaction=mode == 'replace')
+                    result['loaded'].append(obj['Key'])
+                    result['rows'] += written
+                    logger.info(f"Loaded s3://{s3_bucket}/{obj['Key']}: {written:,} rows "
+                                f"({len(result['loaded'])} of {len(pending_objects)})")
+    return result
+
+
+def list_objects(s3_client, bucket, pattern):
+    """List the CSV and Parquet objects matching a key prefix or glob, following every page"""
+    wildcard = min((pattern.index(char) for char in '*?[' if char in pattern), default=None)
+    prefix = pattern if wildcard is None else pattern[:wildcard]
+
+    objects = []
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            key = obj['Key']
+            if wildcard is not None and not fnmatch.fnmatchcase(key, pattern):
+                continue
+            if not key.endswith(SHARD_SUFFIXES):
+                continue
+            objects.append({'Key': key, 'ETag': obj['ETag'].strip('"'), 'Size': obj['Size']})
+    return objects
+
+
+def read_shard(s3_client, bucket, obj, dataset=None, on_drift='raise'):
+    """Download and parse one object; runs on a worker thread
+
+    Shards are read once, so they bypass s3_cache rather than evicting
+    objects that are reused. Returns (obj, DataFrame, drift).
+    """
+    key = obj['Key']
+    with span('download', key=key):
+        response = s3_client.get_object(Bucket=bucket, Key=key, IfMatch=obj['ETag'])
+        data = response['Body'].read()
+    count('bytes_downloaded', len(data))
+    codec = detect_codec(key, response.get('Metadata'))
+    if codec:
+        with span('decompress', key=key):
+            data = decompress_bytes(data, codec)
+
+    drift = None
+    with span('parse', key=key) as attributes:
+        if key.endswith('.parquet'):
+            df = pl.read_parquet(data)
+        elif dataset:
+            entry, drift = resolve_schema(dataset, data, on_drift)
+            try:
+                df = pl.read_csv(data, schema_overrides=entry['schema'])
+            except pl.exceptions.ComputeError as e:
+                logger.warning(f"Registered schema {entry['fingerprint']} does not fit s3://{bucket}/{key}, "
+                               f"inferring from the whole shard: {str(e).splitlines()[0]}")
+                df = pl.read_csv(data, infer_schema_length=None)
+        else:
+            df = pl.read_csv(data, infer_schema_length=None)
+        attributes['rows'] = len(df)
+    count('rows_parsed', len(df))
+    return obj, df, drift
+
+
+def ensure_manifest(conn):
+    """Create the table recording which object versions were loaded into which table"""
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {MANIFEST_TABLE} (
+            table_name VARCHAR,
+            key VARCHAR,
+            etag VARCHAR,
+            size BIGINT,
+            rows BIGINT,
+            loaded_at TIMESTAMP,
+            PRIMARY KEY (table_name, key)
+        )
+    """)
+
+
+def write_shard(conn, table_name, obj, df, mode, key_columns=None, evolve=False, in_transaction=False):
+    """Write one parsed shard and record it in the manifest
+
+    For mode='append' the rows and the manifest entry are committed
+    together. An upsert commits its rows on its own first; a crash before
+    the manifest entry only means the shard is upserted again on the next
+    run, which leaves the same rows. With in_transaction the caller has
+    already begun a transaction and commits it.
+    """
+    conn.register('source_data', df.to_arrow())
+    try:
+        if evolve:
+            add_missing_columns(conn, table_name, 'SELECT * FROM source_data')
+        if mode == 'upsert':
+            written = write_table(conn, table_name, 'SELECT * FROM source_data', mode, key_columns)
+        if not in_transaction:
+            conn.execute("BEGIN TRANSACTION")
+        try:
+            if mode != 'upsert':
+                written = write_table(conn, table_name, 'SELECT * FROM source_data', 'append')
+            conn.execute(
+                f"INSERT OR REPLACE INTO {MANIFEST_TABLE} VALUES (?, ?, ?, ?, ?, current_timestamp)",
+                [table_name, obj['Key'], obj['ETag'], obj['Size'], written]
+            )
+            if not in_transaction:
+                conn.execute("COMMIT")
+        except Exception:
+            if not in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.unregister('source_data')
+    return written
+
+
+def configure_s3_access(conn, session):
+    """Load httpfs and create an S3 secret from the boto3 session credentials
+
+    The endpoint comes from AWS_ENDPOINT_URL_S3 / AWS_ENDPOINT_URL, the same
+    variables boto3 honours, so a RustFS or other S3-compatible endpoint is
+    picked up the same way for both engines.
+    """
+    conn.execute("INSTALL httpfs")
+    conn.execute("LOAD httpfs")
+
+    options = {}
+    credentials = session.get_credentials()
+    if credentials is not None:
+        frozen = credentials.get_frozen_credentials()
+        options['KEY_ID'] = frozen.access_key
+        options['SECRET'] = frozen.secret_key
+        if frozen.token:
+            options['SESSION_TOKEN'] = frozen.token
+    if session.region_name:
+        options['REGION'] = session.region_name
+
+    endpoint = os.getenv('AWS_ENDPOINT_URL_S3') or os.getenv('AWS_ENDPOINT_URL')
+    if endpoint:
+        parsed = urlparse(endpoint)
+        options['ENDPOINT'] = parsed.netloc or parsed.path
+        options['URL_STYLE'] = 'path'
+        options['USE_SSL'] = parsed.scheme != 'http'
+
+    settings = ', '.join(f"{name} {sql_literal(value)}" for name, value in options.items())
+    conn.execute(f"CREATE OR REPLACE SECRET s3_loader (TYPE s3{', ' + settings if settings else ''})")
+
+
+def s3_scan_sql(uri, codec=None):
+    """Return a SELECT that reads an S3 object with DuckDB's native readers
+
+    codec names the compression of a CSV uploaded with one (see
+    object_codec); DuckDB decompresses it while scanning.
+    """
+    if uri.endswith('.parquet'):
+        return f"SELECT * FROM read_parquet({sql_literal(uri)})"
+    compression = f", compression = {sql_literal(codec)}" if codec else ''
+    return f"SELECT * FROM read_csv({sql_literal(uri)}, header = true{compression})"
+
+
 if __name__ == "__main__":
     load_s3_to_duckdb('nppes_sample.csv', 'nppes_sample')
@@ -0,0 +1,213 @@
+import io
+import os
+import time
+import queue
+import threading
+import polars as pl
+from dotenv import load_dotenv
+from logger import logger
+from metrics import count
+from object_codec import detect_codec, open_decompressed
+
+load_dotenv()
+
+# Bytes of CSV per parsed batch, and batches waiting between stages. Memory
+# stays around (2 * queue depth + 3) batches no matter how large the object is.
+DEFAULT_CHUNK_BYTES = int(os.getenv("S3_STREAM_CHUNK_BYTES", str(64 * 1024 * 1024)))
+DEFAULT_QUEUE_DEPTH = int(os.getenv("S3_STREAM_QUEUE_DEPTH", "2"))
+# Bytes requested from the S3 body per read
+READ_SIZE = 8 * 1024 * 1024
+PROGRESS_SECONDS = 5
+
+_DONE = object()
+
+
+class CsvStream:
+    """Stream a CSV object from S3 as a sequence of Polars frames
+
+    A download thread reads the body, decompressing it if it was uploaded
+    with a codec, and cuts it at record boundaries (newlines outside quoted
+    fields), a parse thread turns each piece into a DataFrame, and the
+    caller writes the frames as they arrive. The stages
+    are joined by bounded queues, so they overlap and a slow writer holds
+    back the download instead of letting it fill memory.
+
+    Example:
+        with CsvStream(s3, bucket, 'Raines/nppes_full.csv') as csv_stream:
+            for batch in csv_stream.batches():
+                write(batch)
+        logger.info(csv_stream.stats())
+    """
+
+    def __init__(self, s3_client, bucket, key, chunk_bytes=DEFAULT_CHUNK_BYTES,
+                 queue_depth=DEFAULT_QUEUE_DEPTH):
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.chunk_bytes = chunk_bytes
+        self._pieces = queue.Queue(maxsize=max(1, queue_depth))
+        self._frames = queue.Queue(maxsize=max(1, queue_depth))
+        self._stop = threading.Event()
+        self._first = None
+        self._threads = []
+        self.bytes_read = 0
+        self.bytes_downloaded = 0
+        self.rows = 0
+        self._started = None
+
+    def __enter__(self):
+        self._started = time.monotonic()
+        self._start(self._download)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def close(self):
+        """Stop the background stages; safe to call more than once"""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    @property
+    def first_chunk(self):
+        """The first piece of the object, header included, for schema inference"""
+        if self._first is None:
+            self._first = self._get(self._pieces)
+            if self._first is _DONE:
+                raise ValueError(f"s3://{self.bucket}/{self.key} is empty")
+        return self._first
+
+    def batches(self, schema=None):
+        """Yield DataFrames in file order
+
+        Every batch is parsed with the same schema: the one given, or the one
+        inferred from all rows of the first chunk. A later value that does
+        not fit it raises polars.exceptions.ComputeError.
+        """
+        first = self.first_chunk
+        if schema is None:
+            schema = pl.scan_csv(io.BytesIO(first), infer_schema_length=None).collect_schema()
+        schema = dict(schema)
+        self._start(self._parse, first, schema)
+
+        last_report = time.monotonic()
+        while True:
+            frame = self._get(self._frames)
+            if frame is _DONE:
+                break
+            self.rows += len(frame)
+            yield frame
+            if time.monotonic() - last_report >= PROGRESS_SECONDS:
+                last_report = time.monotonic()
+                logger.info(self.progress())
+        # Recorded here, in the caller's step, not in the background threads
+        count('bytes_downloaded', self.bytes_downloaded)
+        count('rows_parsed', self.rows)
+
+    def stats(self):
+        """Return rows, bytes, elapsed seconds and throughput so far"""
+        seconds = max(time.monotonic() - (self._started or time.monotonic()), 1e-9)
+        return {
+            "rows": self.rows,
+            "bytes": self.bytes_read,
+            "seconds": round(seconds, 3),
+            "rows_per_second": round(self.rows / seconds),
+            "bytes_per_second": round(self.bytes_read / seconds),
+        }
+
+    def progress(self):
+        stats = self.stats()
+        return (f"Streamed {stats['rows']:,} rows, {stats['bytes'] / 1e6:,.1f} MB of "
+                f"s3://{self.bucket}/{self.key} in {stats['seconds']:.1f}s "
+                f"({stats['rows_per_second']:,} rows/s, {stats['bytes_per_second'] / 1e6:,.1f} MB/s)")
+
+    def _start(self, target, *args):
+        thread = threading.Thread(target=self._run, args=(target, args), daemon=True,
+                                  name=f"csv-stream-{target.__name__.strip('_')}")
+        thread.start()
+        self._threads.append(thread)
+
+    def _run(self, target, args):
+        # Errors travel down the pipeline to the caller in place of data
+        try:
+            target(*args)
+        except BaseException as e:
+            output = self._pieces if target == self._download else self._frames
+            self._put(output, e)
+
+    def _download(self):
+        response = self.s3.get_object(Bucket=self.bucket, Key=self.key)
+        # Compressed objects are decompressed as they stream in
+        body = open_decompressed(response["Body"], detect_codec(self.key, response.get("Metadata")))
+        buffer = bytearray()
+        try:
+            while not self._stop.is_set():
+                data = body.read(min(READ_SIZE, self.chunk_bytes))
+                if not data:
+                    break
+                self.bytes_read += len(data)
+                self.bytes_downloaded = body.compressed_bytes_read
+                buffer += data
+                if len(buffer) >= self.chunk_bytes:
+                    cut = record_boundary(buffer)
+                    if cut > 0:
+                        if not self._put(self._pieces, bytes(buffer[:cut])):
+                            return
+                        del buffer[:cut]
+            self.bytes_downloaded = body.compressed_bytes_read
+            if buffer:
+                self._put(self._pieces, bytes(buffer))
+            self._put(self._pieces, _DONE)
+        finally:
+            body.close()
+
+    def _parse(self, first, schema):
+        piece, has_header = first, True
+        while piece is not _DONE:
+            frame = pl.read_csv(io.BytesIO(piece), has_header=has_header, schema=schema)
+            if not self._put(self._frames, frame):
+                return
+            piece, has_header = self._get(self._pieces), False
+        self._put(self._frames, _DONE)
+
+    def _put(self, target, item):
+        while not self._stop.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, source):
+        while not self._stop.is_set():
+            try:
+                item = source.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if isinstance(item, BaseException):
+                raise item
+            return item
+        return _DONE
+
+
+def record_boundary(buffer):
+    """Return the offset just past the last newline that ends a CSV record, or -1
+
+    The buffer must start at a record boundary. A newline ends a record when
+    the number of quote characters before it is even, which also holds for
+    doubled ("") quotes inside quoted fields.
+    """
+    total = buffer.count(b'"')
+    end = len(buffer)
+    quotes_after = 0
+    while True:
+        newline = buffer.rfind(b"\n", 0, end)
+        if newline < 0:
+            return -1
+        quotes_after += buffer.count(b'"', newline, end)
+        if (total - quotes_after) % 2 == 0:
+            return newline + 1
+        end = newline
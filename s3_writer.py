@@ -0,0 +1,101 @@
+import io
+from logger import logger
+from metrics import count
+
+# S3 requires every part except the last to be at least 5 MiB
+MIN_PART_SIZE = 5 * 1024 * 1024
+DEFAULT_PART_SIZE = 16 * 1024 * 1024
+
+
+class MultipartUploadWriter(io.RawIOBase):
+    """Writable file object that streams into an S3 multipart upload
+
+    Bytes are buffered until a part is full and then sent with upload_part,
+    so memory stays at about one part no matter how much is written. close()
+    completes the upload; an exception inside a `with` block aborts it
+    instead. Small objects that never fill a part are sent with one
+    put_object call.
+
+    Example:
+        with MultipartUploadWriter(s3, bucket, 'exports/data.ndjson') as f:
+            for line in lines:
+                f.write(line)
+    """
+
+    def __init__(self, s3_client, bucket, key, part_size=DEFAULT_PART_SIZE, **extra_args):
+        super().__init__()
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.extra_args = extra_args
+        self._buffer = bytearray()
+        self._parts = []
+        self._upload_id = None
+        self._written = 0
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self._written
+
+    def write(self, data):
+        if self.closed:
+            raise ValueError("write to closed MultipartUploadWriter")
+        self._buffer += data
+        self._written += len(data)
+        while len(self._buffer) >= self.part_size:
+            self._upload_part(bytes(self._buffer[:self.part_size]))
+            del self._buffer[:self.part_size]
+        return len(data)
+
+    def close(self):
+        if self.closed:
+            return
+        try:
+            if self._upload_id is None:
+                self.s3.put_object(Bucket=self.bucket, Key=self.key, Body=bytes(self._buffer),
+                                   **self.extra_args)
+            else:
+                if self._buffer:
+                    self._upload_part(bytes(self._buffer))
+                self.s3.complete_multipart_upload(
+                    Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                    MultipartUpload={"Parts": self._parts},
+                )
+            self._buffer.clear()
+            count("bytes_uploaded", self._written)
+            logger.info(f"Wrote {self._written:,} bytes to s3://{self.bucket}/{self.key} "
+                        f"in {max(1, len(self._parts))} part(s)")
+        finally:
+            super().close()
+
+    def abort(self):
+        """Abandon the upload; parts already sent are discarded by S3"""
+        if self._upload_id is not None:
+            self.s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+            logger.warning(f"Aborted multipart upload of s3://{self.bucket}/{self.key}")
+        self._buffer.clear()
+        super().close()
+
+    def __del__(self):
+        # Never complete a half-written object from the garbage collector
+        if not self.closed:
+            self.abort()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+    def _upload_part(self, data):
+        if self._upload_id is None:
+            response = self.s3.create_multipart_upload(Bucket=self.bucket, Key=self.key,
+                                                       **self.extra_args)
+            self._upload_id = response["UploadId"]
+        number = len(self._parts) + 1
+        response = self.s3.upload_part(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                                       PartNumber=number, Body=data)
+        self._parts.append({"PartNumber": number, "ETag": response["ETag"]})
@@ -0,0 +1,257 @@
+import time
+import importlib
+from dataclasses import dataclass, field
+from concurrent.futures import (ThreadPoolExecutor, ProcessPoolExecutor,
+                                FIRST_COMPLETED, wait)
+from logger import logger
+from metrics import run_step
+
+# Final states a step can end in
+SUCCEEDED = 'succeeded'
+FAILED = 'failed'
+TIMED_OUT = 'timed out'
+SKIPPED = 'skipped'
+CANCELLED = 'cancelled'
+
+
+@dataclass
+class Step:
+    """One unit of pipeline work and the steps it has to wait for
+
+    Args:
+        name: Unique step name used for --only/--skip and in the summary
+        func: Module-level callable (must be picklable for the process executor),
+              or a 'package.module:function' string that is only imported when
+              the step runs
+        args, kwargs: Arguments passed to func
+        depends_on: Names of steps that must succeed before this one starts
+        timeout: Seconds the step may run before it is reported as timed out
+        description: Human readable title for the logs
+        optional: Only run when named in only=..., never as part of a full run
+    """
+    name: str
+    func: object
+    args: tuple = ()
+    kwargs: dict = field(default_factory=dict)
+    depends_on: tuple = ()
+    timeout: float = None
+    description: str = ''
+    optional: bool = False
+
+
+@dataclass
+class StepResult:
+    name: str
+    status: str
+    started: float = None
+    finished: float = None
+    error: BaseException = None
+    value: object = None
+    metrics: dict = None
+
+    @property
+    def duration(self):
+        if self.started is None or self.finished is None:
+            return 0.0
+        return self.finished - self.started
+
+
+def select_steps(steps, only=None, skip=None):
+    """Filter the graph for a partial run
+
+    Dependencies on steps that were filtered out are dropped, so e.g.
+    only=['load_postgres'] reruns that step against whatever step 1 left
+    behind instead of refusing to start. Optional steps are left out
+    unless only names them.
+    """
+    names = [step.name for step in steps]
+    unknown = sorted(set(only or []).union(skip or []) - set(names))
+    if unknown:
+        raise ValueError(f"Unknown step(s): {', '.join(unknown)}. Known steps: {', '.join(names)}")
+
+    selected = [step for step in steps
+                if (step.name in only if only else not step.optional) and step.name not in (skip or [])]
+    kept = {step.name for step in selected}
+    return [Step(step.name, step.func, step.args, step.kwargs,
+                 tuple(dep for dep in step.depends_on if dep in kept),
+                 step.timeout, step.description, step.optional)
+            for step in selected]
+
+
+def plan_waves(steps):
+    """Group steps into waves; every step only depends on earlier waves"""
+    by_name = {step.name: step for step in steps}
+    for step in steps:
+        missing = [dep for dep in step.depends_on if dep not in by_name]
+        if missing:
+            raise ValueError(f"Step '{step.name}' depends on unknown step(s): {', '.join(missing)}")
+
+    waves, placed = [], set()
+    while len(placed) < len(steps):
+        wave = [step for step in steps
+                if step.name not in placed and set(step.depends_on) <= placed]
+        if not wave:
+            cycle = [step.name for step in steps if step.name not in placed]
+            raise ValueError(f"Dependency cycle between steps: {', '.join(cycle)}")
+        waves.append(wave)
+        placed.update(step.name for step in wave)
+    return waves
+
+
+def describe_plan(steps, max_workers, executor):
+    """Return the planned schedule as printable lines (used for --dry-run)"""
+    lines = [f"Planned schedule ({executor} executor, {max_workers} worker(s)):"]
+    for number, wave in enumerate(plan_waves(steps), start=1):
+        lines.append(f"  wave {number}:")
+        for step in wave:
+            after = f" after {', '.join(step.depends_on)}" if step.depends_on else ''
+            limit = f", timeout {step.timeout:g}s" if step.timeout else ''
+            lines.append(f"    - {step.name}: {step.description or target_name(step.func)}{after}{limit}")
+    return lines
+
+
+def run_steps(steps, max_workers=4, executor='thread', fail_fast=True):
+    """Run the step graph, starting every step as soon as its dependencies succeed
+
+    Args:
+        steps: List of Step objects
+        max_workers: Maximum number of steps running at the same time
+        executor: 'thread' or 'process'
+        fail_fast: Stop scheduling new steps after the first failure or timeout.
+                   With False, independent branches keep running and only
+                   dependants of the failed step are skipped.
+
+    Returns:
+        Dict of step name -> StepResult, in step order
+
+    A timed-out step is reported and its dependants are skipped, but Python
+    cannot interrupt a running thread; with the thread executor the step
+    keeps running in the background until it returns.
+    """
+    plan_waves(steps)  # validates names and rejects cycles
+    if executor not in ('thread', 'process'):
+        raise ValueError(f"Unknown executor '{executor}', expected 'thread' or 'process'")
+
+    pool_class = ThreadPoolExecutor if executor == 'thread' else ProcessPoolExecutor
+    pool = pool_class(max_workers=max_workers)
+    by_name = {step.name: step for step in steps}
+    results = {}
+    running = {}
+    stopping = False
+
+    try:
+        while len(results) < len(steps):
+            # Resolve steps whose dependencies can no longer succeed
+            for step in steps:
+                if step.name in results or step.name in running.values():
+                    continue
+                blocked = [dep for dep in step.depends_on
+                           if dep in results and results[dep].status != SUCCEEDED]
+                if blocked or stopping:
+                    results[step.name] = StepResult(step.name, CANCELLED if stopping else SKIPPED)
+                    reason = 'fail-fast' if stopping else f"{', '.join(blocked)} did not succeed"
+                    logger.warning(f"Skipping step '{step.name}' ({reason})")
+
+            # Start every step whose dependencies all succeeded
+            for step in steps:
+                if step.name in results or step.name in running.values():
+                    continue
+                if len(running) >= max_workers:
+                    break
+                if all(dep in results for dep in step.depends_on):
+                    logger.info(f"STARTING STEP '{step.name}': {step.description}")
+                    # Spans and counters come back with the result, also from a process pool
+                    future = pool.submit(_run, step.name, step.func, step.args, step.kwargs)
+                    future.started = time.monotonic()
+                    running[future] = step.name
+
+            if not running:
+                continue
+
+            now = time.monotonic()
+            deadlines = [future.started + by_name[name].timeout - now
+                         for future, name in running.items() if by_name[name].timeout]
+            done, _ = wait(list(running), timeout=max(0.0, min(deadlines)) if deadlines else None,
+                           return_when=FIRST_COMPLETED)
+
+            now = time.monotonic()
+            for future in list(running):
+                name = running[future]
+                step = by_name[name]
+                if future in done:
+                    error = future.exception()
+                    value, step_metrics = (None, None) if error else future.result()
+                    result = StepResult(name, FAILED if error else SUCCEEDED, future.started, now,
+                                        error=error, value=value, metrics=step_metrics)
+                elif step.timeout and now - future.started >= step.timeout:
+                    future.cancel()
+                    result = StepResult(name, TIMED_OUT, future.started, now,
+                                        error=TimeoutError(f"step exceeded {step.timeout:g}s"))
+                else:
+                    continue
+
+                del running[future]
+                results[name] = result
+                if result.status == SUCCEEDED:
+                    logger.info(f"FINISHED STEP '{name}' in {result.duration:.2f}s")
+                else:
+                    logger.error(f"STEP '{name}' {result.status} after {result.duration:.2f}s: {result.error}",
+                                 exc_info=result.error if result.status == FAILED else None)
+                    stopping = stopping or fail_fast
+    finally:
+        # Timed-out steps may still be running; do not block on them here
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    return {step.name: results[step.name] for step in steps}
+
+
+def resolve(func):
+    """Return the callable for a step's func, importing 'module:function' targets"""
+    if not isinstance(func, str):
+        return func
+    module_name, _, attribute = func.partition(':')
+    if not attribute:
+        raise ValueError(f"Step target '{func}' must look like 'package.module:function'")
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+def target_name(func):
+    """Printable name of a step's func without importing it"""
+    return func if isinstance(func, str) else func.__name__
+
+
+def _run(name, func, args, kwargs):
+    # Resolved in the worker, so a process pool only ships the string and an
+    # import error fails this step alone
+    return run_step(name, resolve(func), args, kwargs)
+
+
+def critical_path(steps, results):
+    """Return (names, seconds) of the longest dependency chain by measured duration"""
+    by_name = {step.name: step for step in steps}
+    memo = {}
+
+    def longest(name):
+        if name not in memo:
+            chains = [longest(dep) for dep in by_name[name].depends_on]
+            names, seconds = max(chains, key=lambda chain: chain[1], default=([], 0.0))
+            memo[name] = (names + [name], seconds + results[name].duration)
+        return memo[name]
+
+    return max((longest(step.name) for step in steps), key=lambda chain: chain[1], default=([], 0.0))
+
+
+def summarize(steps, results, wall_seconds):
+    """Return the timing summary as printable lines"""
+    width = max([len(step.name) for step in steps] + [4])
+    lines = [f"{'STEP':<{width}}  {'STATUS':<10}  {'SECONDS':>8}"]
+    for step in steps:
+        result = results[step.name]
+        lines.append(f"{step.name:<{width}}  {result.status:<10}  {result.duration:>8.2f}")
+
+    path, path_seconds = critical_path(steps, results)
+    serial_seconds = sum(result.duration for result in results.values())
+    lines.append(f"Wall clock: {wall_seconds:.2f}s (sum of step times {serial_seconds:.2f}s)")
+    if path:
+        lines.append(f"Critical path: {' -> '.join(path)} ({path_seconds:.2f}s)")
+    return lines
@@ -0,0 +1,182 @@
+import io
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime, timezone
+import polars as pl
+from dotenv import load_dotenv
+from logger import logger
+from s3_cache import object_version, get_object_bytes, read_csv_cached
+from type_maps import column_definitions
+
+load_dotenv()
+
+REGISTRY_DIR = os.path.expanduser(os.getenv("SCHEMA_REGISTRY_DIR", "~/.cache/de_review2/schemas"))
+# Rows used to infer the schema of a header that has not been seen before
+SAMPLE_ROWS = int(os.getenv("SCHEMA_SAMPLE_ROWS", "10000"))
+DRIFT_POLICIES = ('raise', 'evolve')
+DIALECTS = ('postgres', 'snowflake', 'duckdb')
+
+_lock = threading.Lock()
+
+
+class SchemaDriftError(ValueError):
+    """The header of a file no longer matches the registered schema of its dataset"""
+
+
+def header_fingerprint(columns):
+    """Return a short stable hash of an ordered list of column names"""
+    return hashlib.sha256('\x1f'.join(columns).encode()).hexdigest()[:16]
+
+
+def read_header(data, separator=','):
+    """Return the column names of a CSV held in memory without parsing its rows"""
+    return pl.scan_csv(io.BytesIO(data), separator=separator).collect_schema().names()
+
+
+def lookup(dataset, fingerprint):
+    """Return the registered entry for this dataset and header, or None"""
+    try:
+        with open(_entry_path(dataset, fingerprint)) as f:
+            return _decode(json.load(f))
+    except FileNotFoundError:
+        return None
+
+
+def latest(dataset):
+    """Return the most recently registered entry of a dataset, or None"""
+    directory = os.path.join(REGISTRY_DIR, dataset)
+    if not os.path.isdir(directory):
+        return None
+    entries = []
+    for name in os.listdir(directory):
+        if name.endswith('.json'):
+            with open(os.path.join(directory, name)) as f:
+                entries.append(_decode(json.load(f)))
+    return max(entries, key=lambda entry: entry['registered_at'], default=None)
+
+
+def register(dataset, schema):
+    """Persist a Polars schema for a dataset together with its DDL column definitions
+
+    The entry is keyed by the fingerprint of the schema's column names, so a
+    new header registers a new entry and leaves the earlier ones in place.
+    """
+    schema = dict(schema)
+    fingerprint = header_fingerprint(list(schema))
+    entry = {
+        'dataset': dataset,
+        'fingerprint': fingerprint,
+        'registered_at': datetime.now(timezone.utc).isoformat(),
+        'schema': schema,
+        'ddl': {dialect: column_definitions(schema, dialect) for dialect in DIALECTS},
+    }
+
+    path = _entry_path(dataset, fingerprint)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(_encode(entry), f, indent=2)
+    os.replace(tmp_path, path)
+    logger.info(f"Registered schema {fingerprint} for '{dataset}' ({len(schema)} columns)")
+    return entry
+
+
+def resolve_schema(dataset, data, on_drift='raise', sample_rows=None, separator=','):
+    """Return the registered schema for a CSV held in memory, inferring it on first sight
+
+    A header seen before is answered from the registry without touching the
+    rows. An unknown header is inferred from the first sample_rows rows and
+    registered. When the dataset already has a schema with a different set
+    of columns, on_drift decides: 'raise' raises SchemaDriftError, 'evolve'
+    registers the new header and reports the change so the caller can add
+    the new columns to its table.
+
+    Returns:
+        Tuple of (registry entry, drift) where drift is None or a dict with
+        the 'added' and 'removed' column names
+    """
+    if on_drift not in DRIFT_POLICIES:
+        raise ValueError(f"Unknown drift policy '{on_drift}', expected 'raise' or 'evolve'")
+
+    columns = read_header(data, separator)
+    fingerprint = header_fingerprint(columns)
+
+    with _lock:
+        entry = lookup(dataset, fingerprint)
+        if entry is not None:
+            logger.info(f"Using registered schema {fingerprint} for '{dataset}'")
+            return entry, None
+
+        drift = None
+        previous = latest(dataset)
+        if previous is not None:
+            added = [col for col in columns if col not in previous['schema']]
+            removed = [col for col in previous['schema'] if col not in columns]
+            if added or removed:
+                drift = {'added': added, 'removed': removed}
+                message = (f"Header of '{dataset}' changed since schema {previous['fingerprint']}: "
+                           f"added {added or 'none'}, removed {removed or 'none'}")
+                if on_drift == 'raise':
+                    raise SchemaDriftError(message)
+                logger.warning(f"{message}; evolving")
+
+        # Only the first sample_rows rows are looked at; nothing is parsed into a frame
+        schema = pl.scan_csv(io.BytesIO(data), infer_schema_length=sample_rows or SAMPLE_ROWS,
+                             separator=separator).collect_schema()
+        return register(dataset, schema), drift
+
+
+def read_csv_registered(s3_client, bucket, key, dataset, on_drift='raise', sample_rows=None):
+    """Read a CSV from S3 with the registry's schema instead of a full inference scan
+
+    If the file no longer parses with the registered types (a value the
+    sample never showed), the whole file is inferred once and the widened
+    schema replaces the registered one.
+
+    Returns:
+        Tuple of (DataFrame, drift) as described in resolve_schema
+    """
+    version = object_version(s3_client, bucket, key)
+    data = get_object_bytes(s3_client, bucket, key, version)
+    entry, drift = resolve_schema(dataset, data, on_drift, sample_rows)
+
+    try:
+        df = read_csv_cached(s3_client, bucket, key, version=version,
+                             schema_overrides=entry['schema'])
+    except pl.exceptions.ComputeError as e:
+        logger.warning(f"Registered schema {entry['fingerprint']} no longer fits "
+                       f"s3://{bucket}/{key}, re-inferring from the whole file: {str(e).splitlines()[0]}")
+        df = read_csv_cached(s3_client, bucket, key, version=version, infer_schema_length=None)
+        with _lock:
+            register(dataset, df.schema)
+    return df, drift
+
+
+def _entry_path(dataset, fingerprint):
+    return os.path.join(REGISTRY_DIR, dataset, f"{fingerprint}.json")
+
+
+def _encode(entry):
+    return {**entry, 'schema': [[name, _dtype_name(dtype)] for name, dtype in entry['schema'].items()]}
+
+
+def _decode(entry):
+    return {**entry, 'schema': {name: _dtype_from_name(dtype) for name, dtype in entry['schema']}}
+
+
+def _dtype_name(dtype):
+    if isinstance(dtype, pl.Datetime):
+        return f"Datetime[{dtype.time_unit}{', ' + dtype.time_zone if dtype.time_zone else ''}]"
+    return str(dtype)
+
+
+def _dtype_from_name(name):
+    if name.startswith('Datetime['):
+        time_unit, _, time_zone = name[len('Datetime['):-1].partition(', ')
+        return pl.Datetime(time_unit, time_zone or None)
+    dtype = getattr(pl, name, None)
+    if dtype is None:
+        raise ValueError(f"Unsupported dtype '{name}' in schema registry")
+    return dtype
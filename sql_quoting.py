@@ -0,0 +1,10 @@
+def quote_identifier(identifier):
+    """Quote a table or column name for Postgres and DuckDB, doubling embedded quotes"""
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def sql_literal(value):
+    """Render a Python value as a SQL literal for Postgres and DuckDB options and secrets"""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return "'" + str(value).replace("'", "''") + "'"
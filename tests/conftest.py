@@ -0,0 +1,141 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+import pytest
+from aiohttp import web
+
+# The loaders import each other as top-level modules (logger, resources, ...)
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_DIR not in sys.path:
+    sys.path.insert(0, REPO_DIR)
+
+S3_BUCKET = 'test-bucket'
+RUSTFS_BUCKET = 'test-rustfs'
+# Records of the stand-in API and records per list page
+RECORDS = 7
+PAGE_SIZE = 3
+
+
+@pytest.fixture
+def s3(monkeypatch, tmp_path):
+    """An in-process moto S3 behind both shared clients, with empty caches
+
+    Returns the S3 client; the S3_BUCKET_NAME and RUSTFS_BUCKET buckets exist.
+    """
+    from moto import mock_aws
+    import resources
+    import s3_cache
+    import schema_registry
+
+    for name in ('AWS_ENDPOINT_URL', 'AWS_PROFILE', 'RUSTFS_ENDPOINT', 'S3_FOLDER_PREFIX'):
+        monkeypatch.delenv(name, raising=False)
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'test')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'test')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    monkeypatch.setenv('S3_BUCKET_NAME', S3_BUCKET)
+    monkeypatch.setenv('RUSTFS_BUCKET', RUSTFS_BUCKET)
+    monkeypatch.setattr(s3_cache, 'CACHE_DIR', str(tmp_path / 's3_cache'))
+    monkeypatch.setattr(schema_registry, 'REGISTRY_DIR', str(tmp_path / 'schemas'))
+
+    with mock_aws():
+        resources.close_all()
+        s3_cache.clear_cache()
+        client = resources.get_s3_client()
+        client.create_bucket(Bucket=S3_BUCKET)
+        client.create_bucket(Bucket=RUSTFS_BUCKET)
+        yield client
+        resources.close_all()
+        s3_cache.clear_cache()
+
+
+class StandInApi:
+    """A paginated list endpoint with detail URLs, served by aiohttp on a local port
+
+    Every response carries an ETag and If-None-Match is answered with 304.
+    Detail requests take a moment so concurrent ones overlap; the most in
+    flight at once is kept in max_in_flight. The first request for each
+    path in rate_limited is answered 429 with Retry-After.
+    """
+
+    def __init__(self, rate_limited=(), retry_after=1):
+        self.rate_limited = set(rate_limited)
+        self.retry_after = retry_after
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.base_url = None
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get('/pokemon', self.list_page)
+        app.router.add_get('/pokemon/{id}', self.detail)
+        return app
+
+    def respond(self, request, body):
+        etag = f'"{request.path_qs}"'
+        if request.headers.get('If-None-Match') == etag:
+            self.requests.append((request.path_qs, 304, time.monotonic()))
+            return web.Response(status=304)
+        if request.path_qs in self.rate_limited:
+            self.rate_limited.discard(request.path_qs)
+            self.requests.append((request.path_qs, 429, time.monotonic()))
+            return web.Response(status=429, headers={'Retry-After': str(self.retry_after)})
+        self.requests.append((request.path_qs, 200, time.monotonic()))
+        return web.json_response(body, headers={'ETag': etag})
+
+    async def list_page(self, request):
+        offset = int(request.query.get('offset', 0))
+        ids = range(offset + 1, min(offset + PAGE_SIZE, RECORDS) + 1)
+        next_offset = offset + PAGE_SIZE
+        return self.respond(request, {
+            'count': RECORDS,
+            'next': f"{self.base_url}/pokemon?offset={next_offset}" if next_offset < RECORDS else None,
+            'results': [{'name': f'mon{i}', 'url': f"{self.base_url}/pokemon/{i}"} for i in ids],
+        })
+
+    async def detail(self, request):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.05)
+        finally:
+            self.in_flight -= 1
+        record_id = int(request.match_info['id'])
+        body = {'id': record_id, 'name': f'mon{record_id}', 'types': [{'slot': 1}]}
+        if record_id == RECORDS:
+            # Only the last record has this key
+            body['held_item'] = {'name': 'berry'}
+        return self.respond(request, body)
+
+    def statuses(self, path=None):
+        return [status for request_path, status, _ in self.requests if path in (None, request_path)]
+
+
+@pytest.fixture
+def serve():
+    """Start a StandInApi on its own event loop thread; returns a function taking the api"""
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    runners = []
+
+    def start(api):
+        async def setup():
+            runner = web.AppRunner(api.app())
+            await runner.setup()
+            site = web.TCPSite(runner, '127.0.0.1', 0)
+            await site.start()
+            return runner, runner.addresses[0][1]
+
+        runner, port = asyncio.run_coroutine_threadsafe(setup(), loop).result()
+        runners.append(runner)
+        api.base_url = f"http://127.0.0.1:{port}"
+        return api
+
+    yield start
+    for runner in runners:
+        asyncio.run_coroutine_threadsafe(runner.cleanup(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
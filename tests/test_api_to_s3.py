@@ -0,0 +1,46 @@
+import io
+import json
+import pyarrow.parquet as pq
+import pytest
+from API.api_to_s3 import fetch_and_upload_pokemon_data
+from conftest import RECORDS, S3_BUCKET, StandInApi
+
+
+@pytest.fixture
+def api(serve, s3, monkeypatch, tmp_path):
+    monkeypatch.setenv('S3_FOLDER_PREFIX', 'Raines')
+    monkeypatch.setenv('API_CACHE_DIR', str(tmp_path / 'http'))
+    return serve(StandInApi())
+
+
+def fetch(s3, api, output_format):
+    key = fetch_and_upload_pokemon_data(f"{api.base_url}/pokemon", mode='detail', max_records=None,
+                                        rate_per_second=1000, output_format=output_format)
+    return key, s3.get_object(Bucket=S3_BUCKET, Key=key)['Body'].read()
+
+
+def test_ndjson_writes_one_flattened_record_per_line(s3, api):
+    key, body = fetch(s3, api, 'ndjson')
+
+    assert key.startswith('Raines/pokemon_details/dt=') and key.endswith('_pokemon_details.ndjson')
+    rows = [json.loads(line) for line in body.decode().splitlines()]
+    assert [row['id'] for row in rows] == list(range(1, RECORDS + 1))
+    assert rows[0]['types'] == '[{"slot":1}]'
+    # A key that only the last record has still becomes a column
+    assert [row['held_item_name'] for row in rows] == [None] * (RECORDS - 1) + ['berry']
+
+
+def test_parquet_writes_zstd_row_groups(s3, api):
+    key, body = fetch(s3, api, 'parquet')
+
+    parquet_file = pq.ParquetFile(io.BytesIO(body))
+    assert key.endswith('_pokemon_details.parquet')
+    assert parquet_file.metadata.row_group(0).column(0).compression == 'ZSTD'
+    table = parquet_file.read()
+    assert table.column('id').to_pylist() == list(range(1, RECORDS + 1))
+    assert table.column('held_item_name').to_pylist()[-1] == 'berry'
+
+
+def test_unknown_output_format_is_rejected(s3, api):
+    with pytest.raises(ValueError, match="Unknown output format 'csv'"):
+        fetch_and_upload_pokemon_data(f"{api.base_url}/pokemon", output_format='csv')
@@ -0,0 +1,57 @@
+import time
+import asyncio
+from API.async_fetch import TokenBucket, fetch_details
+from conftest import RECORDS, StandInApi
+
+
+def test_follows_pagination_and_bounds_concurrent_detail_requests(serve, tmp_path):
+    api = serve(StandInApi())
+    total, details = fetch_details(f"{api.base_url}/pokemon", max_records=None, concurrency=2,
+                                   rate_per_second=1000, cache_dir=str(tmp_path))
+
+    assert total == RECORDS
+    assert [detail['id'] for detail in details] == list(range(1, RECORDS + 1))
+    assert [path for path, _, _ in api.requests if not path.startswith('/pokemon/')] == [
+        '/pokemon', '/pokemon?offset=3', '/pokemon?offset=6']
+    assert api.max_in_flight == 2
+
+
+def test_max_records_stops_listing(serve):
+    api = serve(StandInApi())
+    _, details = fetch_details(f"{api.base_url}/pokemon", max_records=4, rate_per_second=1000)
+
+    assert [detail['id'] for detail in details] == [1, 2, 3, 4]
+    assert '/pokemon?offset=6' not in [path for path, _, _ in api.requests]
+
+
+def test_retries_after_429_honouring_retry_after(serve):
+    api = serve(StandInApi(rate_limited={'/pokemon/2'}, retry_after=1))
+    _, details = fetch_details(f"{api.base_url}/pokemon", max_records=3, rate_per_second=1000)
+
+    assert [detail['id'] for detail in details] == [1, 2, 3]
+    assert api.statuses('/pokemon/2') == [429, 200]
+    first, retry = [at for path, _, at in api.requests if path == '/pokemon/2']
+    assert retry - first >= 1.0
+
+
+def test_second_run_is_served_from_the_etag_cache(serve, tmp_path):
+    api = serve(StandInApi())
+    first = fetch_details(f"{api.base_url}/pokemon", max_records=None, rate_per_second=1000,
+                          cache_dir=str(tmp_path))
+    requests_before = len(api.requests)
+    second = fetch_details(f"{api.base_url}/pokemon", max_records=None, rate_per_second=1000,
+                           cache_dir=str(tmp_path))
+
+    assert second == first
+    assert api.statuses()[requests_before:] == [304] * (RECORDS + 3)
+
+
+def test_token_bucket_spaces_requests_after_the_burst():
+    async def acquire_all(bucket, times):
+        started = time.monotonic()
+        for _ in range(times):
+            await bucket.acquire()
+        return time.monotonic() - started
+
+    # A burst of one, then 20 per second: four more tokens take 0.2 s
+    assert asyncio.run(acquire_all(TokenBucket(20, capacity=1), 5)) >= 0.19
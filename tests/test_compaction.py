@@ -0,0 +1,59 @@
+import duckdb
+import polars as pl
+from compaction import compact_frame
+from connectors import FrameSource, DuckDBSink, transfer
+
+
+def frame():
+    return pl.DataFrame({
+        'id': [1, 2, 3, 4],
+        'age': [30, 41, 52, 63],
+        'salary': [50000.5, 61000.25, 72000.0, 83000.75],
+        'state': ['NY', 'CA', 'NY', 'CA'],
+        'note': ['a', 'b', 'c', 'd'],
+    })
+
+
+def test_dtypes_narrow_but_hints_follow_the_source_dtypes():
+    df, hints = compact_frame(frame(), keep=['id'])
+    assert df.schema['id'] == pl.Int64
+    assert df.schema['age'] == pl.Int8
+    assert df.schema['state'] == pl.Enum(['CA', 'NY'])
+    # Unique strings stay strings
+    assert df.schema['note'] == pl.String
+    assert df['state'].to_list() == ['NY', 'CA', 'NY', 'CA']
+    assert hints == {'age': 'BIGINT', 'salary': 'DECIMAL(38,2)', 'state': 'VARCHAR'}
+
+
+def test_integer_hint_is_integer_below_64_bits():
+    _, hints = compact_frame(pl.DataFrame({'age': pl.Series([30, 41], dtype=pl.Int32)}))
+    assert hints == {'age': 'INTEGER'}
+
+
+def test_empty_frame_is_left_alone():
+    df, hints = compact_frame(frame().clear())
+    assert df.schema == frame().schema
+    assert hints == {}
+
+
+def test_duckdb_hints_only_shape_a_table_the_load_creates():
+    conn = duckdb.connect()
+    df, hints = compact_frame(frame())
+    transfer(FrameSource(df), DuckDBSink(conn, 'people', 'append', type_hints=hints))
+    created = dict(conn.execute("SELECT column_name, data_type FROM information_schema.columns "
+                                "WHERE table_name = 'people'").fetchall())
+    assert created['age'] == 'BIGINT'
+    assert created['salary'] == 'DECIMAL(38,2)'
+    assert created['state'] == 'VARCHAR'
+
+    # A later file with wider values appends to the table it found
+    later = pl.DataFrame({'id': [5], 'age': [3_000_000_000], 'salary': [1.5], 'state': ['Texas'],
+                          'note': ['e']})
+    df, hints = compact_frame(later)
+    transfer(FrameSource(df), DuckDBSink(conn, 'people', 'append', type_hints=hints))
+    assert conn.execute("SELECT age, state FROM people WHERE id = 5").fetchone() == (3_000_000_000, 'Texas')
+
+    # Replacing the table takes the hints of the new file
+    transfer(FrameSource(df), DuckDBSink(conn, 'people', 'replace', type_hints={'salary': 'DECIMAL(38,1)'}))
+    assert conn.execute("SELECT data_type FROM information_schema.columns "
+                        "WHERE table_name = 'people' AND column_name = 'salary'").fetchone() == ('DECIMAL(38,1)',)
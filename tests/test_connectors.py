@@ -0,0 +1,114 @@
+from concurrent.futures import ThreadPoolExecutor
+import polars as pl
+import pyarrow as pa
+import pytest
+import metrics
+from metrics import count, span, submit_in_context
+from connectors import Source, Sink, FrameSource, transfer, rebatch, regroup
+
+
+def batch(start, rows):
+    return pa.RecordBatch.from_pydict({'id': list(range(start, start + rows))})
+
+
+class GeneratorSource(Source):
+    """Yields batches of the given sizes, recording a span and a counter per batch"""
+
+    def __init__(self, sizes, fail_after=None):
+        self.sizes = sizes
+        self.fail_after = fail_after
+        self.closed = False
+
+    def batches(self):
+        start = 0
+        try:
+            for index, rows in enumerate(self.sizes):
+                if index == self.fail_after:
+                    raise IOError('source broke')
+                with span('read'):
+                    count('rows_parsed', rows)
+                yield batch(start, rows)
+                start += rows
+        finally:
+            self.closed = True
+
+
+class ListSink(Sink):
+    def __init__(self, stop_after=None):
+        self.stop_after = stop_after
+        self.sizes = []
+        self.ids = []
+
+    def write(self, batches):
+        for item in batches:
+            self.sizes.append(item.num_rows)
+            self.ids += item.column(0).to_pylist()
+            if len(self.sizes) == self.stop_after:
+                break
+        return sum(self.sizes)
+
+
+def test_rebatch_slices_long_batches_without_copying():
+    long_batch = batch(0, 10)
+    out = list(rebatch([batch(100, 3), long_batch], batch_rows=4))
+    assert [item.num_rows for item in out] == [3, 4, 4, 2]
+    assert out[1].column(0).buffers()[1].address == long_batch.column(0).buffers()[1].address
+
+
+def test_regroup_gathers_exact_sizes_and_keeps_an_empty_stream_typed():
+    tables = list(regroup([batch(0, 3), batch(3, 5), batch(8, 4)], rows=5))
+    assert [table.num_rows for table in tables] == [5, 5, 2]
+    assert pa.concat_tables(tables).column('id').to_pylist() == list(range(12))
+
+    empty = list(regroup([batch(0, 0)], rows=5))
+    assert [table.num_rows for table in empty] == [0]
+    assert empty[0].schema.names == ['id']
+    assert list(regroup([], rows=5)) == []
+
+
+@pytest.mark.parametrize('queue_depth', [0, 2])
+def test_transfer_streams_every_row_in_order(queue_depth):
+    sink = ListSink()
+    assert transfer(GeneratorSource([3, 7, 2]), sink, batch_rows=4, queue_depth=queue_depth) == 12
+    assert sink.sizes == [3, 4, 3, 2]
+    assert sink.ids == list(range(12))
+
+
+def test_transfer_of_a_frame():
+    df = pl.DataFrame({'id': range(10), 'name': [str(i) for i in range(10)]})
+    sink = ListSink()
+    transfer(FrameSource(df), sink, batch_rows=3)
+    assert sink.sizes == [3, 3, 3, 1]
+
+
+def test_source_thread_records_into_the_callers_step():
+    with metrics.step('load') as recorded:
+        transfer(GeneratorSource([3, 7]), ListSink(), queue_depth=2)
+    assert recorded.counters == {'rows_parsed': 10}
+    assert recorded.spans['read'][0] == 2
+
+
+def test_source_error_reaches_the_sink_and_early_stop_closes_the_source():
+    with pytest.raises(IOError, match='source broke'):
+        transfer(GeneratorSource([1, 1, 1], fail_after=2), ListSink(), queue_depth=1)
+
+    source = GeneratorSource([1] * 100)
+    sink = ListSink(stop_after=2)
+    transfer(source, sink, queue_depth=1)
+    assert sink.sizes == [1, 1]
+    assert source.closed
+
+
+def test_submit_in_context_records_pool_work_into_the_callers_step():
+    def work(rows):
+        with span('work'):
+            count('rows_written', rows)
+        return rows
+
+    with metrics.step('load') as recorded, ThreadPoolExecutor(max_workers=2) as pool:
+        with span('write'):
+            futures = [submit_in_context(pool, work, rows) for rows in (1, 2, 3)]
+            assert [future.result() for future in futures] == [1, 2, 3]
+        pool.submit(work, 100).result()
+    assert recorded.counters == {'rows_written': 6}
+    assert recorded.spans['write/work'][0] == 3
@@ -0,0 +1,103 @@
+import polars as pl
+import pytest
+import data_quality
+from data_quality import DataQualityError, check_frame
+
+SCHEMA_YML = """
+version: 2
+models:
+  - name: stg_employees
+    columns:
+      - name: employee_id
+        data_tests: [unique, not_null]
+      - name: department
+        data_tests:
+          - accepted_values:
+              arguments:
+                values: ['HR', 'IT']
+      - name: email
+        data_tests:
+          - not_null:
+              config:
+                severity: warn
+      - name: manager_id
+        data_tests:
+          - relationships:
+              to: ref('stg_managers')
+              field: manager_id
+"""
+
+
+@pytest.fixture(autouse=True)
+def models(monkeypatch, tmp_path):
+    (tmp_path / 'models').mkdir()
+    (tmp_path / 'models' / 'schema.yml').write_text(SCHEMA_YML)
+    monkeypatch.setattr(data_quality, 'MODEL_DIRS', [str(tmp_path / 'models')])
+    monkeypatch.setattr(data_quality, 'QUARANTINE_DIR', str(tmp_path / 'quarantine'))
+    data_quality._declared_tests.cache_clear()
+    yield
+    data_quality._declared_tests.cache_clear()
+
+
+def employees():
+    # Rows 1 and 2 share an id, row 3 has none, row 4 has an unknown
+    # department and row 0 an unknown manager and no email (severity warn)
+    return pl.DataFrame({
+        'Employee ID': [1, 2, 2, None, 5],
+        'Department': ['HR', 'IT', 'IT', 'HR', 'Sales'],
+        'email': [None, 'b@x', 'c@x', 'd@x', 'e@x'],
+        'manager_id': [99, 10, 10, 10, 10],
+    })
+
+
+def test_fail_raises_and_names_the_failed_tests():
+    with pytest.raises(DataQualityError, match=r"4 row\(s\) fail .*unique_stg_employees_employee_id"):
+        check_frame(employees(), 'stg_employees')
+
+
+def test_quarantine_drops_failing_rows_and_writes_them_with_their_tests():
+    references = {'stg_managers': pl.DataFrame({'manager_id': [10]})}
+    df, report = check_frame(employees(), 'stg_employees', 'quarantine', references)
+
+    assert df['Employee ID'].to_list() == []
+    assert report['failed_rows'] == 5
+    quarantined = pl.read_parquet(report['quarantine'])
+    assert quarantined['_failed_tests'].to_list() == [
+        ['relationships_stg_employees_manager_id'],
+        ['unique_stg_employees_employee_id'],
+        ['unique_stg_employees_employee_id'],
+        ['not_null_stg_employees_employee_id'],
+        ['accepted_values_stg_employees_department'],
+    ]
+    # Severity warn never blocks a row
+    assert 'not_null_stg_employees_email' not in quarantined['_failed_tests'].explode().to_list()
+
+
+def test_quarantine_keeps_passing_rows():
+    frame = employees().with_columns(pl.Series('Employee ID', [1, 2, 3, 4, 5]),
+                                     pl.Series('Department', ['HR', 'IT', 'IT', 'HR', 'HR']))
+    df, report = check_frame(frame, 'stg_employees', 'quarantine')
+    assert df.equals(frame)
+    assert 'quarantine' not in report
+    results = {result['name']: result for result in report['tests']}
+    assert results['not_null_stg_employees_email']['status'] == 'warn'
+    # Without the referenced rows the relationships test is skipped
+    assert results['relationships_stg_employees_manager_id']['status'] == 'skipped'
+
+
+def test_warn_loads_every_row_and_reports_the_failures():
+    df, report = check_frame(employees(), 'stg_employees', 'warn')
+    assert df.equals(employees())
+    assert report['failed_rows'] == 0
+    failures = {result['name']: result['failures'] for result in report['tests']}
+    assert failures['unique_stg_employees_employee_id'] == 2
+    assert failures['not_null_stg_employees_employee_id'] == 1
+    assert failures['accepted_values_stg_employees_department'] == 1
+    assert failures['not_null_stg_employees_email'] == 1
+
+
+def test_unknown_policy_and_model_raise():
+    with pytest.raises(ValueError, match="Unknown data quality policy"):
+        check_frame(employees(), 'stg_employees', 'drop')
+    with pytest.raises(ValueError, match="No dbt model 'stg_missing'"):
+        check_frame(employees(), 'stg_missing')
@@ -0,0 +1,67 @@
+import os
+import mmap
+import polars as pl
+import pytest
+import s3_cache
+from object_codec import compress_bytes, upload_args
+from s3_download import download_to_file
+from conftest import S3_BUCKET
+
+BODY = bytes(range(256)) * 40
+
+
+class FlakyClient:
+    """Passes calls to the S3 client, failing the ranged GETs that start at fail_at"""
+
+    def __init__(self, s3, fail_at=()):
+        self._s3 = s3
+        self.fail_at = set(fail_at)
+        self.ranges = []
+
+    def __getattr__(self, name):
+        return getattr(self._s3, name)
+
+    def get_object(self, **kwargs):
+        start = int(kwargs['Range'].split('=')[1].split('-')[0])
+        self.ranges.append(start)
+        if start in self.fail_at:
+            raise ConnectionResetError(f"connection reset at byte {start}")
+        return self._s3.get_object(**kwargs)
+
+
+def test_resumed_download_only_fetches_the_failed_range(s3, tmp_path):
+    s3.put_object(Bucket=S3_BUCKET, Key='blob.bin', Body=BODY)
+    path = str(tmp_path / 'blob.bin')
+
+    flaky = FlakyClient(s3, fail_at={4000})
+    with pytest.raises(ConnectionResetError):
+        download_to_file(flaky, S3_BUCKET, 'blob.bin', path, range_size=1000, workers=1, retries=0)
+    assert not os.path.exists(path)
+    assert os.path.exists(f'{path}.part') and os.path.exists(f'{path}.part.json')
+
+    resumed = FlakyClient(s3)
+    download_to_file(resumed, S3_BUCKET, 'blob.bin', path, range_size=1000, workers=3, retries=0)
+    # Ranges before the failure were kept; the failed one and the ones never started are fetched
+    assert sorted(resumed.ranges) == [4000, 5000, 6000, 7000, 8000, 9000, 10000]
+    with open(path, 'rb') as f:
+        assert f.read() == BODY
+    assert not os.path.exists(f'{path}.part.json')
+
+
+def test_cache_maps_the_downloaded_file_instead_of_copying_it(s3):
+    csv = b'id,name\n' + b''.join(b'%d,name%d\n' % (i, i) for i in range(1000))
+    s3.put_object(Bucket=S3_BUCKET, Key='people.csv.zst', Body=compress_bytes(csv, 'zstd'),
+                  **upload_args('zstd'))
+
+    data = s3_cache.get_object_bytes(s3, S3_BUCKET, 'people.csv.zst')
+    assert isinstance(data, mmap.mmap)
+    assert data[:] == csv
+    # The entry on disk is stored decompressed and nothing else is left behind
+    path = s3_cache.get_object_path(s3, S3_BUCKET, 'people.csv.zst')
+    assert os.listdir(os.path.dirname(path)) == [os.path.basename(path)]
+
+    df = s3_cache.read_csv_cached(s3, S3_BUCKET, 'people.csv.zst')
+    assert df.equals(pl.read_csv(csv))
+    assert s3_cache.get_object_bytes(s3, S3_BUCKET, 'people.csv.zst') is data
+    stats = s3_cache.cache_stats()
+    assert (stats['misses'], stats['memory_hits'], stats['disk_hits']) == (1, 1, 2)
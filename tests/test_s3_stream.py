@@ -0,0 +1,32 @@
+import polars as pl
+from s3_stream import CsvStream, record_boundary
+from conftest import S3_BUCKET
+
+# Quoted fields holding newlines, commas and doubled quotes
+CSV = b'id,name,bio\n' + (
+    b'1,Ann,"likes\nnewlines"\n'
+    b'2,Bob,"says ""hi"",\nthen leaves"\n'
+    b'3,Cy,plain\n'
+) * 50
+
+
+def test_boundary_skips_newlines_inside_quotes():
+    assert record_boundary(bytearray(b'id,bio\n1,"a\nb')) == len(b'id,bio\n')
+    assert record_boundary(bytearray(b'id,bio\n1,"a\nb"\n2,"c')) == len(b'id,bio\n1,"a\nb"\n')
+    assert record_boundary(bytearray(b'1,"say ""x"""\n')) == len(b'1,"say ""x"""\n')
+    assert record_boundary(bytearray(b'1,"open\n')) == -1
+    assert record_boundary(bytearray(b'no newline')) == -1
+
+
+def test_small_chunks_parse_like_the_whole_file(s3):
+    s3.put_object(Bucket=S3_BUCKET, Key='people.csv', Body=CSV)
+    expected = pl.read_csv(CSV)
+
+    # Chunks much smaller than a record force cuts next to quoted newlines
+    with CsvStream(s3, S3_BUCKET, 'people.csv', chunk_bytes=40) as csv_stream:
+        batches = list(csv_stream.batches())
+
+    assert len(batches) > 10
+    assert pl.concat(batches).equals(expected)
+    assert csv_stream.rows == expected.height
+    assert csv_stream.bytes_read == len(CSV)
@@ -0,0 +1,51 @@
+import pytest
+from resources import get_duckdb_connection
+from s3_duckdb.s3_to_duckdb import load_s3_prefix_to_duckdb, MANIFEST_TABLE
+from conftest import S3_BUCKET
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'claims.duckdb')
+
+
+def put_shard(s3, key, rows):
+    body = 'id,amount\n' + ''.join(f'{i},{i * 10}\n' for i in rows)
+    s3.put_object(Bucket=S3_BUCKET, Key=key, Body=body.encode())
+
+
+def table_state(db_path):
+    conn = get_duckdb_connection(db_path).cursor()
+    rows = conn.execute("SELECT COUNT(*) FROM claims").fetchone()[0]
+    keys = sorted(key for (key,) in conn.execute(
+        f"SELECT key FROM {MANIFEST_TABLE} WHERE table_name = 'claims'").fetchall())
+    conn.close()
+    return rows, keys
+
+
+def test_rerun_only_loads_new_shards(s3, db_path):
+    put_shard(s3, 'daily/a.csv', range(3))
+    assert load_s3_prefix_to_duckdb('daily/', 'claims', db_path, workers=2)['rows'] == 3
+
+    put_shard(s3, 'daily/b.csv', range(3, 5))
+    result = load_s3_prefix_to_duckdb('daily/', 'claims', db_path, workers=2)
+    assert result['loaded'] == ['daily/b.csv']
+    assert result['skipped'] == ['daily/a.csv']
+    assert table_state(db_path) == (5, ['daily/a.csv', 'daily/b.csv'])
+
+
+def test_failed_replace_keeps_the_old_table_and_manifest(s3, db_path):
+    put_shard(s3, 'daily/a.csv', range(3))
+    put_shard(s3, 'daily/b.csv', range(3, 5))
+    load_s3_prefix_to_duckdb('daily/', 'claims', db_path, workers=2)
+
+    s3.put_object(Bucket=S3_BUCKET, Key='daily/c.parquet', Body=b'not parquet')
+    with pytest.raises(Exception):
+        load_s3_prefix_to_duckdb('daily/', 'claims', db_path, mode='replace', workers=2)
+    assert table_state(db_path) == (5, ['daily/a.csv', 'daily/b.csv'])
+
+    s3.delete_object(Bucket=S3_BUCKET, Key='daily/c.parquet')
+    put_shard(s3, 'daily/b.csv', range(3, 4))
+    result = load_s3_prefix_to_duckdb('daily/', 'claims', db_path, mode='replace', workers=2)
+    assert sorted(result['loaded']) == ['daily/a.csv', 'daily/b.csv']
+    assert table_state(db_path) == (4, ['daily/a.csv', 'daily/b.csv'])
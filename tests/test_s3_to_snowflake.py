@@ -0,0 +1,58 @@
+import re
+import polars as pl
+import pytest
+from benchmarks.stub_snowflake import StubConnection
+from Snowflake.s3_to_snowflake import load_s3_to_snowflake
+from conftest import S3_BUCKET
+
+ROWS = 25
+
+
+@pytest.fixture
+def employees(s3):
+    df = pl.DataFrame({
+        'id': list(range(1, ROWS + 1)),
+        'name': [f'Employee {i}' for i in range(1, ROWS + 1)],
+        'salary': [50000.0 + i for i in range(ROWS)],
+    })
+    s3.put_object(Bucket=S3_BUCKET, Key='employees.csv', Body=df.write_csv().encode())
+    return df
+
+
+def test_stage_puts_chunks_in_parallel_and_copies_once(employees):
+    conn = StubConnection(put_seconds=0.05)
+    results = load_s3_to_snowflake('employees.csv', 'EMPLOYEES', method='stage', chunk_rows=10, parallel=3,
+                                   conn=conn, use_registry=False)
+
+    puts = [re.match(r"PUT file://([0-9a-f]{32})_(\d{5})[.]parquet @%EMPLOYEES ", statement)
+            for statement in conn.log if statement.startswith('PUT')]
+    assert len(puts) == 3
+    assert all(puts)
+    run_ids = {put.group(1) for put in puts}
+    assert len(run_ids) == 1
+    assert sorted(put.group(2) for put in puts) == ['00000', '00001', '00002']
+    assert 1 < conn.max_puts_in_flight <= 3
+
+    copies = [statement for statement in conn.log if statement.startswith('COPY INTO')]
+    assert len(copies) == 1
+    assert f"PATTERN = '.*{run_ids.pop()}_[0-9]+[.]parquet'" in copies[0]
+    assert 'PURGE = TRUE' in copies[0]
+    assert conn.log.index(copies[0]) > max(i for i, s in enumerate(conn.log) if s.startswith('PUT'))
+
+    assert [result['status'] for result in results] == ['LOADED'] * 3
+    assert [result['rows_loaded'] for result in results] == [10, 10, 5]
+    assert conn.rows == ROWS
+
+
+def test_stage_raises_when_a_chunk_fails_to_load(employees):
+    conn = StubConnection(fail_chunks={1})
+    with pytest.raises(ValueError, match=r"1 of 3 staged chunk\(s\) did not load.*_00001[.]parquet"):
+        load_s3_to_snowflake('employees.csv', 'EMPLOYEES', method='stage', chunk_rows=10, conn=conn,
+                             use_registry=False)
+
+
+def test_insert_binds_every_row_without_staging(employees):
+    conn = StubConnection()
+    assert load_s3_to_snowflake('employees.csv', 'EMPLOYEES', conn=conn, use_registry=False) is None
+    assert not any(statement.startswith(('PUT', 'COPY INTO')) for statement in conn.log)
+    assert conn.rows == ROWS
@@ -0,0 +1,66 @@
+import pytest
+from scheduler import (Step, StepResult, SUCCEEDED, FAILED, SKIPPED, plan_waves, critical_path,
+                       select_steps, run_steps)
+
+
+def noop():
+    return 'done'
+
+
+def fail():
+    raise RuntimeError('boom')
+
+
+def graph():
+    return [
+        Step('upload', noop),
+        Step('api', noop),
+        Step('load_postgres', noop, depends_on=('upload',)),
+        Step('load_duckdb', noop, depends_on=('upload',)),
+        Step('dbt', noop, depends_on=('load_postgres', 'load_duckdb')),
+    ]
+
+
+def names(waves):
+    return [[step.name for step in wave] for wave in waves]
+
+
+def test_plan_waves_puts_every_step_after_its_dependencies():
+    assert names(plan_waves(graph())) == [['upload', 'api'], ['load_postgres', 'load_duckdb'], ['dbt']]
+
+
+def test_plan_waves_rejects_unknown_dependencies_and_cycles():
+    with pytest.raises(ValueError, match="depends on unknown step"):
+        plan_waves([Step('a', noop, depends_on=('missing',))])
+    with pytest.raises(ValueError, match="Dependency cycle between steps: a, b"):
+        plan_waves([Step('a', noop, depends_on=('b',)), Step('b', noop, depends_on=('a',)), Step('c', noop)])
+
+
+def test_select_steps_drops_dependencies_on_filtered_steps():
+    selected = select_steps(graph(), only=['load_postgres', 'dbt'])
+    assert [(step.name, step.depends_on) for step in selected] == [
+        ('load_postgres', ()), ('dbt', ('load_postgres',))]
+
+
+def test_optional_steps_only_run_when_named():
+    steps = graph() + [Step('export', noop, depends_on=('upload',), optional=True)]
+    assert 'export' not in [step.name for step in select_steps(steps)]
+    assert 'export' not in [step.name for step in select_steps(steps, skip=['api'])]
+    assert [step.name for step in select_steps(steps, only=['upload', 'export'])] == ['upload', 'export']
+
+
+def test_critical_path_follows_the_longest_chain():
+    durations = {'upload': 2.0, 'api': 4.0, 'load_postgres': 3.0, 'load_duckdb': 1.0, 'dbt': 0.5}
+    results = {name: StepResult(name, SUCCEEDED, 0.0, seconds) for name, seconds in durations.items()}
+    assert critical_path(graph(), results) == (['upload', 'load_postgres', 'dbt'], 5.5)
+    assert critical_path([], {}) == ([], 0.0)
+
+
+def test_run_steps_skips_dependants_of_a_failed_step():
+    steps = graph()
+    steps[2] = Step('load_postgres', fail, depends_on=('upload',))
+    results = run_steps(steps, max_workers=2, fail_fast=False)
+    assert {name: result.status for name, result in results.items()} == {
+        'upload': SUCCEEDED, 'api': SUCCEEDED, 'load_postgres': FAILED, 'load_duckdb': SUCCEEDED,
+        'dbt': SKIPPED}
+    assert results['upload'].value == 'done'
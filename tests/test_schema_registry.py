@@ -0,0 +1,55 @@
+import polars as pl
+import pytest
+import schema_registry
+from schema_registry import SchemaDriftError, resolve_schema, read_csv_registered, latest
+from conftest import S3_BUCKET
+
+
+@pytest.fixture(autouse=True)
+def registry(monkeypatch, tmp_path):
+    monkeypatch.setattr(schema_registry, 'REGISTRY_DIR', str(tmp_path / 'schemas'))
+
+
+def test_first_header_is_inferred_and_registered_then_reused():
+    entry, drift = resolve_schema('employees', b'id,name,salary\n1,Ann,50000.5\n')
+    assert drift is None
+    assert entry['schema'] == {'id': pl.Int64, 'name': pl.String, 'salary': pl.Float64}
+    assert entry['ddl']['postgres'][0] == 'id INTEGER'
+
+    # The same header answers from the registry, whatever the rows hold now
+    again, drift = resolve_schema('employees', b'id,name,salary\nx,Bob,y\n')
+    assert drift is None
+    assert again['fingerprint'] == entry['fingerprint']
+    assert again['schema'] == entry['schema']
+
+
+def test_changed_header_raises_by_default():
+    resolve_schema('employees', b'id,name\n1,Ann\n')
+    with pytest.raises(SchemaDriftError, match=r"added \['dept'\], removed none"):
+        resolve_schema('employees', b'id,name,dept\n1,Ann,HR\n')
+    assert list(latest('employees')['schema']) == ['id', 'name']
+
+
+def test_changed_header_evolves_and_reports_the_drift():
+    resolve_schema('employees', b'id,name,legacy\n1,Ann,x\n')
+    entry, drift = resolve_schema('employees', b'id,name,dept\n1,Ann,HR\n', on_drift='evolve')
+    assert drift == {'added': ['dept'], 'removed': ['legacy']}
+    assert list(entry['schema']) == ['id', 'name', 'dept']
+    assert latest('employees')['fingerprint'] == entry['fingerprint']
+
+
+def test_unknown_drift_policy_is_rejected():
+    with pytest.raises(ValueError, match="Unknown drift policy 'ignore'"):
+        resolve_schema('employees', b'id\n1\n', on_drift='ignore')
+
+
+def test_registered_types_widen_when_a_later_file_no_longer_fits(s3):
+    s3.put_object(Bucket=S3_BUCKET, Key='a.csv', Body=b'id,code\n1,7\n2,8\n')
+    df, _ = read_csv_registered(s3, S3_BUCKET, 'a.csv', 'codes')
+    assert df.schema['code'] == pl.Int64
+
+    # Same header, but a value the sample never showed
+    s3.put_object(Bucket=S3_BUCKET, Key='b.csv', Body=b'id,code\n3,9\n4,X1\n')
+    df, _ = read_csv_registered(s3, S3_BUCKET, 'b.csv', 'codes')
+    assert df['code'].to_list() == ['9', 'X1']
+    assert latest('codes')['schema']['code'] == pl.String
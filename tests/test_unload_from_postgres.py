@@ -0,0 +1,44 @@
+import duckdb
+import pytest
+from rustfs.unload_from_postgres import _key_ranges
+
+
+@pytest.fixture
+def cur():
+    conn = duckdb.connect()
+    conn.execute('CREATE TABLE employees ("Employee ID" INTEGER, name VARCHAR)')
+    yield conn.cursor()
+    conn.close()
+
+
+def covered(cur, ranges):
+    """Which range picks up each row, as _unload_split filters them"""
+    rows = cur.execute('SELECT "Employee ID" FROM employees').fetchall()
+    return {key: [index for index, (low, high, with_nulls) in enumerate(ranges)
+                  if (key is None and with_nulls) or (key is not None and low <= key < high)]
+            for (key,) in rows}
+
+
+def test_ranges_cover_every_key_once_and_nulls_go_first(cur):
+    cur.execute("INSERT INTO employees SELECT range, 'x' FROM range(3, 104)")
+    cur.execute("INSERT INTO employees VALUES (NULL, 'no id')")
+    ranges = _key_ranges(cur, 'SELECT * FROM employees', 'Employee ID', 4)
+    assert ranges == [(3, 29, True), (29, 55, False), (55, 81, False), (81, 107, False)]
+    assert all(len(indexes) == 1 for indexes in covered(cur, ranges).values())
+    assert covered(cur, ranges)[None] == [0]
+
+
+def test_more_splits_than_keys_gives_one_range_per_key(cur):
+    cur.execute("INSERT INTO employees VALUES (7, 'a'), (9, 'b')")
+    assert _key_ranges(cur, 'SELECT * FROM employees', 'Employee ID', 8) == [
+        (7, 8, True), (8, 9, False), (9, 10, False)]
+
+
+def test_empty_source_is_one_unsplit_range(cur):
+    assert _key_ranges(cur, 'SELECT * FROM employees', 'Employee ID', 4) == [None]
+
+
+def test_non_integer_split_column_raises(cur):
+    cur.execute("INSERT INTO employees VALUES (1, 'a')")
+    with pytest.raises(ValueError, match="must be an integer column, got str"):
+        _key_ranges(cur, 'SELECT * FROM employees', 'name', 4)
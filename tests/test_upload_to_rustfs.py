@@ -0,0 +1,34 @@
+import polars as pl
+import pytest
+from object_codec import detect_codec
+from connectors import S3DownloadSource
+from rustfs.upload_to_rustfs import upload_data, upload_many
+from conftest import RUSTFS_BUCKET
+
+
+@pytest.fixture
+def employees(tmp_path):
+    path = tmp_path / 'employees.csv'
+    pl.DataFrame({'id': range(500), 'dept': ['HR', 'IT'] * 250}).write_csv(path)
+    return path
+
+
+@pytest.mark.parametrize('codec, suffix', [('zstd', '.zst'), ('gzip', '.gz')])
+def test_codec_goes_in_the_key_and_metadata_only(s3, employees, tmp_path, codec, suffix):
+    key = upload_data(str(employees), 'employee_data.csv', list_after=False, codec=codec)
+    assert key == f'employee_data.csv{suffix}'
+
+    head = s3.head_object(Bucket=RUSTFS_BUCKET, Key=key)
+    assert 'ContentEncoding' not in head
+    assert head['Metadata']['codec'] == codec
+    assert head['ContentLength'] < employees.stat().st_size
+    assert detect_codec(key, head['Metadata']) == codec
+
+    df = S3DownloadSource(s3, RUSTFS_BUCKET, key, str(tmp_path / 'download' / key)).frame()
+    assert df.equals(pl.read_csv(employees))
+
+
+def test_uncompressed_and_already_suffixed_keys_are_kept(s3, employees):
+    assert upload_data(str(employees), 'employee_data.csv', list_after=False, codec=None) == 'employee_data.csv'
+    result = upload_many([(str(employees), 'daily/employees.csv.zst')], codec='zstd')
+    assert result['uploaded'] == ['daily/employees.csv.zst']
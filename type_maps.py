@@ -0,0 +1,99 @@
+import polars as pl
+
+# Polars dtype name fragments -> Snowflake types, matched in order
+SNOWFLAKE_TYPES = {
+    'Int64': 'INTEGER',
+    'Int32': 'INTEGER',
+    'Int16': 'SMALLINT',
+    'Int8': 'SMALLINT',
+    'Float64': 'FLOAT',
+    'Float32': 'FLOAT',
+    'Boolean': 'BOOLEAN',
+    'Utf8': 'VARCHAR',
+    'String': 'VARCHAR',
+    'Date': 'DATE',
+    'Datetime': 'TIMESTAMP'
+}
+
+# Polars dtypes -> DuckDB types
+DUCKDB_TYPES = {
+    pl.Int8: 'TINYINT',
+    pl.Int16: 'SMALLINT',
+    pl.Int32: 'INTEGER',
+    pl.Int64: 'BIGINT',
+    pl.UInt8: 'UTINYINT',
+    pl.UInt16: 'USMALLINT',
+    pl.UInt32: 'UINTEGER',
+    pl.UInt64: 'UBIGINT',
+    pl.Float32: 'FLOAT',
+    pl.Float64: 'DOUBLE',
+    pl.Boolean: 'BOOLEAN',
+    pl.String: 'VARCHAR',
+    pl.Date: 'DATE',
+    pl.Datetime: 'TIMESTAMP',
+    pl.Time: 'TIME',
+}
+
+
+def postgres_type(dtype):
+    """Map a Polars dtype to the PostgreSQL column type used by the loaders"""
+    if dtype == pl.Int64 or dtype == pl.Int32:
+        return "INTEGER"
+    elif dtype == pl.Int16 or dtype == pl.Int8:
+        return "SMALLINT"
+    elif isinstance(dtype, pl.Decimal):
+        return f"NUMERIC({dtype.precision},{dtype.scale})"
+    elif dtype == pl.Float64 or dtype == pl.Float32:
+        return "NUMERIC"
+    elif dtype == pl.Date:
+        return "DATE"
+    elif dtype == pl.Datetime:
+        return "TIMESTAMP"
+    elif dtype == pl.Boolean:
+        return "BOOLEAN"
+    return "TEXT"
+
+
+def snowflake_type(dtype):
+    """Map a Polars dtype to the Snowflake column type used by the loaders"""
+    # The repr of an Enum lists its categories, which must not be matched below
+    if isinstance(dtype, (pl.Enum, pl.Categorical)):
+        return 'VARCHAR'
+    if isinstance(dtype, pl.Decimal):
+        return f'NUMBER({dtype.precision},{dtype.scale})'
+    dtype_str = str(dtype)
+    for pl_type, sf_type in SNOWFLAKE_TYPES.items():
+        if pl_type in dtype_str:
+            return sf_type
+    return 'VARCHAR'
+
+
+def duckdb_type(dtype):
+    """Map a Polars dtype to a DuckDB column type"""
+    if isinstance(dtype, pl.Decimal):
+        return f'DECIMAL({dtype.precision},{dtype.scale})'
+    for pl_type, duck_type in DUCKDB_TYPES.items():
+        if dtype == pl_type:
+            return duck_type
+    return 'VARCHAR'
+
+
+def column_definitions(schema, dialect, type_hints=None):
+    """Return '"name" TYPE' column definitions for a Polars schema
+
+    dialect is 'postgres', 'snowflake' or 'duckdb'. Postgres names are left
+    unquoted to match the tables load_data creates. type_hints maps column
+    names to SQL types (e.g. from compaction.compact_frame) that take
+    precedence over the dtype mapping.
+    """
+    type_hints = type_hints or {}
+    if dialect == 'postgres':
+        return [f"{name} {type_hints.get(name) or postgres_type(dtype)}"
+                for name, dtype in schema.items()]
+    if dialect == 'snowflake':
+        return [f'"{name}" {type_hints.get(name) or snowflake_type(dtype)}'
+                for name, dtype in schema.items()]
+    if dialect == 'duckdb':
+        return [f'"{name}" {type_hints.get(name) or duckdb_type(dtype)}'
+                for name, dtype in schema.items()]
+    raise ValueError(f"Unknown SQL dialect '{dialect}'")